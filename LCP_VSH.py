@@ -4,13 +4,15 @@ import math
 import os
 from tqdm import tqdm
 import fiona
-from shapely.geometry import Point, LineString, mapping, shape
+from shapely.geometry import LineString, mapping, shape
 from shapely.ops import unary_union
 from numba import njit
 from datetime import datetime
 from skimage.draw import disk
 from rasterio.enums import Resampling
 from rasterio.features import rasterize
+from lcp.pathfinder import heap_push, heap_pop, dijkstra_multi_target
+from lcp.data_loader import load_point_set, validate_points
 
 # --- 1. CONFIGURACIÓN DEL PROYECTO Y PARÁMETROS ---
 BASE_PATH = R"C:\Users\User\Desktop\SofiHanna"
@@ -35,29 +37,11 @@ MASK_SHAPEFILE_PATH = os.path.join(BASE_PATH, 'poligono_extendido_cortado_disuel
 DOWNSAMPLING_FACTORS = [32, 20, 10] # Factores a probar, en orden
 CORRIDOR_BUFFER_PIXELS = 150
 HEURISTIC_WEIGHT = 1.0
+# Con este número de destinos o más se calcula todo con una sola búsqueda Dijkstra
+ONE_TO_ALL_MIN_DESTINATIONS = 11
 
 # --- 2. FUNCIONES AUXILIARES ---
 
-def load_all_points(shapefile_path, id_field):
-    """Carga todos los puntos y sus IDs desde un shapefile a un diccionario."""
-    points = {}
-    crs = None
-    try:
-        with fiona.open(shapefile_path, 'r') as collection:
-            crs = collection.crs
-            if len(collection) == 0:
-                print(f"Error: El shapefile '{os.path.basename(shapefile_path)}' está vacío.")
-                return None, None
-            for feature in collection:
-                # Asegurarse de que el ID es un tipo de dato consistente (entero)
-                point_id = int(feature['properties'][id_field])
-                coords = feature['geometry']['coordinates']
-                points[point_id] = coords
-        return points, crs
-    except Exception as e:
-        print(f"Error cargando los puntos desde {shapefile_path}: {e}")
-        return None, None
-
 def load_polygon_geometry(shapefile_path):
     """Carga y disuelve la geometría de un shapefile de polígonos."""
     if not shapefile_path or not os.path.exists(shapefile_path):
@@ -73,9 +57,6 @@ def load_polygon_geometry(shapefile_path):
         print(f"Error cargando la geometría del polígono desde {shapefile_path}: {e}")
         return None
 
-def world_to_pixel(transform, x, y):
-    col, row = ~transform * (x, y); return int(row), int(col)
-
 def create_mask_from_vector(vector_path, raster_src):
     """
     Rasteriza un archivo vectorial para crear una máscara booleana.
@@ -114,17 +95,15 @@ def a_star_numba_compiled(cost_array, nodata_value, start_pixel, end_pixel, dx,
     height, width = cost_array.shape
     g_cost = np.full(cost_array.shape, np.inf, dtype=np.float64)
     came_from = np.full(cost_array.shape, -1, dtype=np.int16)
-    open_set = np.zeros((1, 4), dtype=np.float64)
+    heap = np.empty((max(64, 4 * (height + width)), 5), dtype=np.float64)
     h_initial = heuristic_numba(start_pixel[0], start_pixel[1], end_pixel[0], end_pixel[1], dx, dy)
-    open_set[0] = [h_initial * weight, 0.0, start_pixel[0], start_pixel[1]]
+    heap, size = heap_push(heap, 0, h_initial * weight, 0.0, 0.0, start_pixel[0], start_pixel[1])
+    order = 1.0
     g_cost[start_pixel] = 0
     path_found = False
     
-    while open_set.shape[0] > 0:
-        min_idx = np.argmin(open_set[:, 0])
-        f, g, r, c = open_set[min_idx]; current_pos = (int(r), int(c))
-        if open_set.shape[0] == 1: open_set = np.zeros((0, 4), dtype=np.float64)
-        else: open_set = np.vstack((open_set[:min_idx], open_set[min_idx + 1:]))
+    while size > 0:
+        f, g, r, c, size = heap_pop(heap, size); current_pos = (r, c)
         
         if current_pos == end_pixel: path_found = True; break
         if g > g_cost[current_pos]: continue
@@ -148,9 +127,8 @@ def a_star_numba_compiled(cost_array, nodata_value, start_pixel, end_pixel, dx,
                     came_from[neighbor_pos] = direction; g_cost[neighbor_pos] = tentative_g_cost
                     h = heuristic_numba(neighbor_pos[0], neighbor_pos[1], end_pixel[0], end_pixel[1], dx, dy)
                     new_f_cost = tentative_g_cost + (h * weight)
-                    new_entry = np.array([[new_f_cost, tentative_g_cost, neighbor_pos[0], neighbor_pos[1]]], dtype=np.float64)
-                    if open_set.shape[0] == 0: open_set = new_entry
-                    else: open_set = np.vstack((open_set, new_entry))
+                    heap, size = heap_push(heap, size, new_f_cost, order, tentative_g_cost, neighbor_pos[0], neighbor_pos[1])
+                    order += 1.0
     
     return path_found, came_from, g_cost
 
@@ -206,9 +184,9 @@ if __name__ == '__main__':
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         print(f"Los resultados se guardarán en: {OUTPUT_DIR}")
         
-        all_points, points_crs = load_all_points(ALL_POINTS_SHAPEFILE, ID_FIELD_NAME)
+        point_ids, point_coords, points_crs = load_point_set(ALL_POINTS_SHAPEFILE, ID_FIELD_NAME)
 
-        if all_points:
+        if len(point_ids):
             with rasterio.open(COST_RASTER_PATH) as src:
                 if not (src.crs == points_crs):
                     print("¡ERROR CRÍTICO: El CRS de los puntos y el del ráster no coinciden!")
@@ -226,53 +204,60 @@ if __name__ == '__main__':
                             print(f"Creando máscara de búsqueda rasterizada...")
                             search_mask_hr_user = create_mask_from_vector(MASK_SHAPEFILE_PATH, src)
 
-                    # --- NUEVA VERIFICACIÓN INICIAL DE TODOS LOS PUNTOS ---
-                    if mask_polygon_geom and all_points:
-                        print("\n--- VERIFICACIÓN DE PUNTOS CONTRA LA MÁSCARA ---")
-                        for point_id, coords in all_points.items():
-                            # Verificación vectorial
-                            point_geom = Point(coords)
-                            is_inside_vector = mask_polygon_geom.contains(point_geom)
-                            vector_status = "DENTRO" if is_inside_vector else "FUERA"
-                            
-                            # Verificación raster
-                            raster_status = "N/A"
-                            if search_mask_hr_user is not None:
-                                try:
-                                    r, c = world_to_pixel(src.transform, coords[0], coords[1])
-                                    if 0 <= r < search_mask_hr_user.shape[0] and 0 <= c < search_mask_hr_user.shape[1]:
-                                        is_inside_raster = search_mask_hr_user[r, c]
-                                        raster_status = "DENTRO" if is_inside_raster else "FUERA"
-                                    else:
-                                        raster_status = "FUERA (Píxel fuera de límites)"
-                                except Exception:
-                                    raster_status = "ERROR"
-
-                            print(f"Punto ID {point_id}: Vectorial -> {vector_status}, Raster -> {raster_status}")
-                        print("--------------------------------------------------\n")
-
-
-                    origin_coords = all_points.get(ORIGIN_POINT_ID)
-                    if not origin_coords:
+                    # --- VERIFICACIÓN INICIAL DE TODOS LOS PUNTOS (vectorizada) ---
+                    validation = validate_points(point_ids, point_coords, src.transform, cost_data_high_res.shape,
+                                                 search_mask_hr_user, mask_polygon_geom if mask_polygon_geom else None)
+                    print("\n--- VERIFICACIÓN DE PUNTOS CONTRA LA MÁSCARA ---" if mask_polygon_geom else "\n--- VERIFICACIÓN DE PUNTOS ---")
+                    validation.report()
+                    print("--------------------------------------------------\n")
+                    # Solo los puntos que la validación acepta (con IDs repetidos, el primero),
+                    # para que las búsquedas coincidan con el informe
+                    point_pixels = validation.valid_pixels()
+                    # Motivo de descarte de cada ID rechazado (el de su primera aparición)
+                    rejected = {point['id']: point['motivo'] for point in reversed(validation.invalid())}
+
+                    if ORIGIN_POINT_ID not in rejected and ORIGIN_POINT_ID not in point_pixels:
                         print(f"Error: No se encontró el punto de origen con ID={ORIGIN_POINT_ID} en el shapefile.")
                     else:
-                        # --- VERIFICACIÓN CRÍTICA: Comprobar si el punto de ORIGEN está en la máscara ---
-                        if mask_polygon_geom and not mask_polygon_geom.contains(Point(origin_coords)):
-                            print(f"¡ERROR CRÍTICO! El punto de origen ID={ORIGIN_POINT_ID} está FUERA del polígono de la máscara. Abortando proceso.")
+                        # --- VERIFICACIÓN CRÍTICA: Comprobar si el punto de ORIGEN es válido (p. ej. dentro de la máscara) ---
+                        if ORIGIN_POINT_ID not in point_pixels:
+                            print(f"¡ERROR CRÍTICO! El punto de origen ID={ORIGIN_POINT_ID} no es válido ({rejected[ORIGIN_POINT_ID]}). Abortando proceso.")
                         else:
-                            start_pixel_hr = world_to_pixel(src.transform, origin_coords[0], origin_coords[1])
+                            start_pixel_hr = point_pixels[ORIGIN_POINT_ID]
                             print(f"\nOrigen Fijo: Punto ID {ORIGIN_POINT_ID} -> Píxel {start_pixel_hr}")
+
+                            # --- MODO UNO A TODOS: una única búsqueda Dijkstra para todos los destinos válidos ---
+                            came_from_all = None
+                            destination_pixels = {dest_id: pixel for dest_id, pixel in point_pixels.items() if dest_id != ORIGIN_POINT_ID}
+                            if len(destination_pixels) >= ONE_TO_ALL_MIN_DESTINATIONS:
+                                print(f"Calculando {len(destination_pixels)} destinos con una sola búsqueda Dijkstra...")
+                                search_mask_all = search_mask_hr_user if search_mask_hr_user is not None else np.ones(cost_data_high_res.shape, dtype=bool)
+                                targets = np.array(list(destination_pixels.values()), dtype=np.int64)
+                                found_all, came_from_all, _ = dijkstra_multi_target(
+                                    cost_data_high_res, src.nodata, start_pixel_hr, targets, src.res[0], abs(src.res[1]), search_mask_all
+                                )
+                                found_all = dict(zip(destination_pixels, found_all.tolist()))
                             
-                            for dest_id, dest_coords in tqdm(all_points.items(), desc="Calculando rutas"):
+                            for dest_id in tqdm(dict.fromkeys(point_ids.tolist()), desc="Calculando rutas"):
                                 if dest_id == ORIGIN_POINT_ID:
                                     continue
 
-                                # --- VERIFICACIÓN: Omitir si el punto de DESTINO está fuera de la máscara ---
-                                if mask_polygon_geom and not mask_polygon_geom.contains(Point(dest_coords)):
-                                    tqdm.write(f"  -> Omitiendo punto de destino ID={dest_id} por estar FUERA del polígono de la máscara.")
+                                # --- VERIFICACIÓN: Omitir los destinos que la validación rechazó (p. ej. fuera de la máscara) ---
+                                if dest_id not in point_pixels:
+                                    tqdm.write(f"  -> Omitiendo punto de destino ID={dest_id} ({rejected[dest_id]}).")
                                     continue
                                 
-                                end_pixel_hr = world_to_pixel(src.transform, dest_coords[0], dest_coords[1])
+                                end_pixel_hr = point_pixels[dest_id]
+
+                                if came_from_all is not None:
+                                    # Los destinos fuera del raster o inalcanzables vuelven como no encontrados
+                                    path_pixels_hr = reconstruct_path_pixels_numba(came_from_all, start_pixel_hr, end_pixel_hr) if found_all[dest_id] else None
+                                    if path_pixels_hr is None:
+                                        tqdm.write(f"  ADVERTENCIA: No se encontró ruta para {ORIGIN_POINT_ID}->{dest_id}")
+                                    else:
+                                        output_shp_final = os.path.join(OUTPUT_DIR, f"ruta_final_desde_{ORIGIN_POINT_ID}_a_{dest_id}.shp")
+                                        save_path_to_shapefile(path_pixels_hr, src.transform, src.crs, output_shp_final)
+                                    continue
                                 
                                 path_found_lr = False
                                 path_pixels_lr = None
@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+# Benchmarks del paquete lcp. Se ejecutan como módulos desde la raíz del repositorio, p. ej.:
+#   python -m benchmarks.bench_corridor
@@ -0,0 +1,56 @@
+# benchmarks/bench_corridor.py
+# Compara el constructor de corredores original (un disco de skimage por píxel de la ruta)
+# con el constructor por bloques 'build_search_corridor'.
+
+import argparse
+import time
+import numpy as np
+
+import lcp.processing as proc
+
+def random_low_res_path(low_res_shape, length, seed):
+    """Ruta 8-conexa de baja resolución (paseo aleatorio con deriva) dentro del raster."""
+    rng = np.random.default_rng(seed)
+    steps = rng.integers(-1, 2, size=(length, 2))
+    steps[:, 1] = np.where(rng.random(length) < 0.7, 1, steps[:, 1])  # Deriva hacia el este
+    path = np.cumsum(steps, axis=0) + (low_res_shape[0] // 2, 0)
+    path[:, 0] = np.clip(path[:, 0], 0, low_res_shape[0] - 1)
+    path[:, 1] = np.clip(path[:, 1], 0, low_res_shape[1] - 1)
+    return path.astype(np.int32)
+
+def best_time(func, repeat):
+    """Menor tiempo de 'repeat' ejecuciones y el último resultado."""
+    best, result = np.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del constructor de corredores de búsqueda.")
+    parser.add_argument('--shape', type=int, nargs=2, default=(8000, 8000), help="Forma del raster de alta resolución.")
+    parser.add_argument('--factors', type=int, nargs='+', default=[32, 20, 10])
+    parser.add_argument('--buffer', type=float, default=150)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    shape = tuple(args.shape)
+
+    # Compilar el núcleo Numba antes de medir
+    proc.build_search_corridor(np.array([[0, 0], [1, 1]], dtype=np.int32), (64, 64), 4, 3)
+
+    print(f"Raster {shape[0]}x{shape[1]}, buffer {args.buffer} px")
+    print(f"{'factor':>6} {'puntos':>7} {'original (s)':>13} {'por bloques (s)':>16} {'aceleración':>12} {'idénticos':>10}")
+    for factor in args.factors:
+        low_res_shape = (shape[0] // factor, shape[1] // factor)
+        path = random_low_res_path(low_res_shape, low_res_shape[1], seed=factor)
+
+        t_old, old_mask = best_time(lambda: proc.create_search_corridor(path, shape, factor, args.buffer), args.repeat)
+        t_new, (new_mask, window) = best_time(lambda: proc.build_search_corridor(path, shape, factor, args.buffer), args.repeat)
+
+        rows, cols = window.toslices()
+        identical = old_mask[rows, cols].sum() == old_mask.sum() and np.array_equal(old_mask[rows, cols], new_mask)
+        print(f"{factor:>6} {len(path):>7} {t_old:>13.3f} {t_new:>16.3f} {t_old / t_new:>11.1f}x {str(identical):>10}")
+
+if __name__ == '__main__':
+    main()
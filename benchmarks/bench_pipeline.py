@@ -0,0 +1,224 @@
+# benchmarks/bench_pipeline.py
+# Mide cada etapa del flujo en dos fases sobre superficies sintéticas (benchmarks/synthetic.py):
+# tiempo, memoria máxima (RSS) y nodos expandidos (extraídos de la cola), y guarda los resultados en JSON. Si se indica
+# una línea base, marca como regresión toda etapa que empeore más que el umbral.
+#   python -m benchmarks.bench_pipeline --sizes 1000 2000
+#   python -m benchmarks.bench_pipeline --sizes 1000 --save-baseline
+#   python -m benchmarks.bench_pipeline --sizes 1000 --baseline benchmarks/results/baseline.json --threshold 0.15
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import multiprocessing
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # Windows no tiene 'resource': la memoria máxima se aproxima con el pico de tracemalloc
+    resource = None
+    import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ENGINES = ('heap', 'bucket', 'bidireccional')
+
+def rss_mb():
+    """
+    Memoria residente máxima del proceso hasta ahora (MB). Sin 'resource' devuelve el pico de
+    memoria reservada desde Python (incluye los arreglos de NumPy), que no cuenta el intérprete
+    ni las bibliotecas cargadas.
+    """
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1] / 2**20 if tracemalloc.is_tracing() else 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def expanded(stats):
+    """Nodos expandidos por una búsqueda: extracciones de la cola que no eran obsoletas."""
+    import lcp.pathfinder as pf
+    return int(stats[pf.STAT_POPPED] - stats[pf.STAT_STALE])
+
+class StageTimer:
+    """Acumula tiempo, nodos y RSS máxima por etapa."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def measure(self, name, func, nodes=None):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        stage = self.stages.setdefault(name, {'segundos': 0.0, 'nodos_expandidos': 0, 'rss_max_mb': 0.0})
+        stage['segundos'] += elapsed
+        if nodes is not None:
+            stage['nodos_expandidos'] += nodes(result)
+        stage['rss_max_mb'] = max(stage['rss_max_mb'], rss_mb())
+        return result
+
+def search(engine, cost, nodata, start, end, dx, dy, mask):
+    """Búsqueda de alta resolución con el motor indicado; devuelve (encontrada, nodos expandidos)."""
+    import lcp.pathfinder as pf
+    stats = pf.new_search_stats()
+    if engine == 'bidireccional':
+        found = pf.bidirectional_a_star_search(cost, nodata, start, end, dx, dy, 1.0, mask, stats=stats)[0]
+    else:
+        found = pf.a_star_search(cost, nodata, start, end, dx, dy, 1.0, mask, queue=engine, stats=stats)[0]
+    return found, expanded(stats)
+
+# Lado del raster con el que se compilan los núcleos Numba antes de medir
+WARM_UP_SIZE = 300
+
+def run_size(size, seed, data_dir, factors, buffer_pixels, engines, tile_size):
+    """Ejecuta todas las etapas para un tamaño (en un proceso propio, para medir su RSS)."""
+    from benchmarks.synthetic import generate_surface
+
+    if resource is None:
+        tracemalloc.start()
+    # Una pasada completa sobre un raster pequeño compila todo lo que se mide después
+    warm_up = generate_surface(data_dir, WARM_UP_SIZE, seed)
+    run_stages(StageTimer(), warm_up, factors, buffer_pixels, engines, tile_size)
+
+    timer = StageTimer()
+    surface = timer.measure('generar', lambda: generate_surface(data_dir, size, seed))
+    failed = run_stages(timer, surface, factors, buffer_pixels, engines, tile_size)
+    return {'tamano': size, 'rutas': len(surface['destinos']), 'busquedas_fallidas': failed, 'etapas': timer.stages}
+
+def run_stages(timer, surface, factors, buffer_pixels, engines, tile_size):
+    """Mide cada etapa del flujo para las rutas de 'surface'; devuelve el número de búsquedas fallidas."""
+    import rasterio
+    import lcp.pathfinder as pf
+    import lcp.processing as proc
+    import lcp.pyramid as pyr
+    import lcp.tiles as tiles
+    import lcp.hierarchy as hier
+
+    with rasterio.open(surface['costo']) as src:
+        dx, dy = src.res[0], abs(src.res[1])
+        window = proc.vector_window(surface['mascara'], src)
+        mask = timer.measure('mascara', lambda: proc.create_mask_from_vector(surface['mascara'], src, window=window))
+        offset = (int(window.row_off), int(window.col_off))
+        start = (surface['origen'][0] - offset[0], surface['origen'][1] - offset[1])
+        ends = [(r - offset[0], c - offset[1]) for r, c in surface['destinos']]
+        raster = tiles.TiledRaster(src)
+        pyramid = pyr.CostPyramid(src, mask, window=window)
+
+        for factor in factors:
+            timer.measure('remuestreo', lambda: pyramid.level(factor))
+
+        failed = 0
+        for end in ends:
+            # Fase 1: reintentos de remuestreo, como en lcp.py
+            path_lr, successful_factor = None, None
+            for factor in factors:
+                cost_lr, _, dx_lr, dy_lr, mask_lr = pyramid.level(factor)
+                start_lr, end_lr = proc.low_res_pixel(start, mask.shape, mask_lr.shape), proc.low_res_pixel(end, mask.shape, mask_lr.shape)
+                stats = pf.new_search_stats()
+                found, came_from_lr = timer.measure('fase1', lambda: pf.a_star_search(cost_lr, src.nodata, start_lr, end_lr, dx_lr, abs(dy_lr), 1.0, mask_lr, stats=stats),
+                                                    nodes=lambda result: expanded(stats))
+                if found:
+                    path_lr, successful_factor = pf.reconstruct_path(came_from_lr, start_lr, end_lr), factor
+                    break
+            if path_lr is None:
+                failed += 1
+                continue
+
+            corridor, corridor_window = timer.measure('corredor', lambda: proc.build_search_corridor(
+                path_lr, mask.shape, successful_factor, buffer_pixels, include_pixels=(start, end)))
+            rows, cols = corridor_window.toslices()
+            corridor_mask = corridor & mask[rows, cols]
+            cost_crop = timer.measure('lectura', lambda: raster.read_window(proc.offset_window(corridor_window, window)))
+            crop_offset = (corridor_window.row_off, corridor_window.col_off)
+            start_crop = (start[0] - crop_offset[0], start[1] - crop_offset[1])
+            end_crop = (end[0] - crop_offset[0], end[1] - crop_offset[1])
+            for engine in engines:
+                found, _ = timer.measure(f"fase2_{engine}", lambda: search(engine, cost_crop, src.nodata, start_crop, end_crop, dx, dy, corridor_mask),
+                                         nodes=lambda result: result[1])
+                failed += not found
+
+        graph = timer.measure('grafo_teselas', lambda: hier.TileGraph(raster, mask, window, tile_size=tile_size))
+        for end in ends:
+            timer.measure('fase1_jerarquica', lambda: graph.coarse_path(start, end))
+    return failed
+
+def compare(results, baseline, threshold, min_seconds):
+    """Compara tiempos y nodos con la línea base; devuelve la lista de regresiones."""
+    regressions = []
+    print(f"\n{'tamaño':>7} {'etapa':<24} {'base (s)':>10} {'actual (s)':>11} {'cambio':>8}")
+    for size, current in results['resultados'].items():
+        reference = baseline.get('resultados', {}).get(size)
+        if reference is None:
+            continue
+        for stage, values in current['etapas'].items():
+            old = reference['etapas'].get(stage)
+            if old is None or stage == 'generar':
+                continue
+            change = values['segundos'] / old['segundos'] - 1.0 if old['segundos'] > 0 else 0.0
+            slower = change > threshold and values['segundos'] - old['segundos'] > min_seconds
+            more_nodes = values['nodos_expandidos'] > old['nodos_expandidos'] * (1.0 + threshold)
+            flag = ' <-- REGRESIÓN' if slower or more_nodes else ''
+            print(f"{size:>7} {stage:<24} {old['segundos']:>10.3f} {values['segundos']:>11.3f} {change:>+8.1%}{flag}")
+            if flag:
+                regressions.append((size, stage))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del flujo en dos fases sobre superficies sintéticas.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 2000], help="Lados de los rasters (p. ej. 1000 a 20000).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--factors', type=int, nargs='+', default=[32, 20, 10])
+    parser.add_argument('--buffer', type=float, default=150)
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=ENGINES)
+    parser.add_argument('--tile-size', type=int, default=32, help="Lado de las teselas del grafo jerárquico.")
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'))
+    parser.add_argument('--output', default=None, help="Archivo JSON de resultados (por defecto en benchmarks/results/).")
+    parser.add_argument('--baseline', default=os.path.join(BENCH_DIR, 'results', 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help="Guarda estos resultados como línea base.")
+    parser.add_argument('--threshold', type=float, default=0.15, help="Empeoramiento relativo tolerado (0.15 = 15 %%).")
+    parser.add_argument('--min-seconds', type=float, default=0.05, help="Diferencia absoluta mínima para contar una regresión.")
+    args = parser.parse_args()
+
+    import numba
+    results = {'fecha': datetime.now().isoformat(timespec='seconds'),
+               'entorno': {'python': platform.python_version(), 'numpy': np.__version__, 'numba': numba.__version__,
+                           'cpu': platform.processor() or platform.machine(), 'nucleos': os.cpu_count()},
+               'parametros': {'semilla': args.seed, 'factores': args.factors, 'buffer': args.buffer,
+                              'motores': args.engines, 'tesela': args.tile_size},
+               'resultados': {}}
+
+    # Cada tamaño corre en un proceso nuevo para que la RSS máxima sea solo suya
+    context = multiprocessing.get_context('spawn')
+    for size in args.sizes:
+        print(f"Midiendo raster {size}x{size}...")
+        with context.Pool(1) as pool:
+            result = pool.apply(run_size, (size, args.seed, args.data_dir, args.factors, args.buffer, args.engines, args.tile_size))
+        results['resultados'][str(size)] = result
+        print(f"  {result['rutas']} rutas, {result['busquedas_fallidas']} búsquedas fallidas")
+        for stage, values in result['etapas'].items():
+            print(f"  {stage:<24} {values['segundos']:>9.3f} s {values['rss_max_mb']:>9.1f} MB {values['nodos_expandidos']:>12,d} nodos")
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResultados guardados en: {output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Línea base actualizada: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\n{len(regressions)} regresiones por encima del umbral de {args.threshold:.0%}.")
+            sys.exit(1)
+        print("\nSin regresiones respecto de la línea base.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_startup.py
+# Mide el arranque de un proceso nuevo: importación de los módulos de lcp que importa lcp.py y
+# primera llamada a cada núcleo Numba (compilación o lectura de la caché en disco). Compara un arranque en frío
+# (caché vacía) con arranques en caliente (núcleos ya guardados por la ejecución anterior).
+#   python -m benchmarks.bench_startup
+#   python -m benchmarks.bench_startup --repeat 5
+
+import os
+import ast
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# Se ejecuta en un proceso nuevo con los módulos a importar como argumentos; imprime los
+# tiempos como JSON en la última línea
+PROBE = r'''
+import json, sys, time, importlib
+times = {}
+start = time.perf_counter()
+import numpy as np
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+import lcp.pathfinder as pf
+import lcp.processing as proc
+times['importar'] = time.perf_counter() - start
+times['modulos_pesados'] = sorted(m for m in ('rasterio', 'fiona', 'shapely', 'skimage') if m in sys.modules)
+
+cost = np.ones((64, 64), dtype=np.float32)
+mask = np.ones(cost.shape, dtype=bool)
+
+def first_call(name, func):
+    t = time.perf_counter()
+    result = func()
+    times[name] = time.perf_counter() - t
+    return result
+
+path = first_call('find_path', lambda: pf.find_path(cost, -9999.0, (1, 1), (60, 60), 30.0, 30.0, 1.0, mask))
+first_call('bidireccional', lambda: pf.find_path(cost, -9999.0, (1, 1), (60, 60), 30.0, 30.0, 1.0, mask, algorithm='bidireccional'))
+first_call('corredor', lambda: proc.build_search_corridor(path, cost.shape, 4, 8))
+first_call('dijkstra', lambda: pf.dijkstra_multi_target(cost, -9999.0, (1, 1), np.array([[60, 60]], dtype=np.int64), 30.0, 30.0, mask))
+times['total'] = time.perf_counter() - start
+print(json.dumps(times))
+'''
+
+def driver_modules(driver_path=os.path.join(ROOT_DIR, 'lcp.py')):
+    """Módulos del paquete lcp que importa el script principal, en el orden en que los importa."""
+    with open(driver_path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names if alias.name.startswith('lcp.')]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.module.split('.')[0] == 'lcp':
+            names.append(node.module)
+    return list(dict.fromkeys(names))
+
+def run_probe(cache_dir, modules):
+    """Ejecuta PROBE en un intérprete nuevo con la caché de Numba en 'cache_dir', importando 'modules'."""
+    env = dict(os.environ, NUMBA_CACHE_DIR=cache_dir, PYTHONPATH=ROOT_DIR)
+    output = subprocess.run([sys.executable, '-c', PROBE, *modules], env=env, cwd=ROOT_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque: importaciones y primera llamada a los núcleos Numba.")
+    parser.add_argument('--repeat', type=int, default=3, help="Arranques en caliente a medir (se informa la mediana).")
+    parser.add_argument('--output', default=None, help="Archivo JSON donde guardar los resultados.")
+    args = parser.parse_args()
+
+    modules = driver_modules()
+    print(f"Módulos importados por lcp.py: {', '.join(modules)}")
+    with tempfile.TemporaryDirectory(prefix='lcp_numba_cache_') as cache_dir:
+        print("Arranque en frío (caché de Numba vacía)...")
+        cold = run_probe(cache_dir, modules)
+        print(f"Arranques en caliente ({args.repeat})...")
+        warm_runs = [run_probe(cache_dir, modules) for _ in range(args.repeat)]
+
+    stages = [key for key in cold if key != 'modulos_pesados']
+    warm = {key: sorted(run[key] for run in warm_runs)[len(warm_runs) // 2] for key in stages}
+    print(f"\n{'etapa':<16} {'frío (s)':>10} {'caliente (s)':>13}")
+    for key in stages:
+        print(f"{key:<16} {cold[key]:>10.3f} {warm[key]:>13.3f}")
+    print(f"\nMódulos pesados cargados al importar: {', '.join(cold['modulos_pesados']) or 'ninguno'}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'frio': cold, 'caliente': warm, 'repeticiones': args.repeat}, f, indent=2)
+        print(f"Resultados guardados en: {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/synthetic.py
+# Superficies de costo sintéticas y reproducibles para los benchmarks: un campo suave de
+# fricción con ruido fino, lagos sin dato, muros verticales con pasos angostos, una máscara
+# poligonal y puntos de origen/destino a ambos lados de los muros.
+
+import os
+import numpy as np
+import rasterio
+import fiona
+from fiona.crs import CRS
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+from shapely.geometry import Point, Polygon, mapping
+
+NODATA = -9999.0
+PIXEL_SIZE = 30.0
+EPSG = 32719
+COARSE_CELL = 256 # Píxeles por celda del campo suave
+
+def _layout(size, seed):
+    """Elementos globales del raster (campo suave, lagos, muros y pasos), derivados de la semilla."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.random((size // COARSE_CELL + 2, size // COARSE_CELL + 2))
+
+    wall_cols = np.linspace(0, size, 5)[1:-1].astype(np.int64)
+    wall_width = max(2, size // 500)
+    passes = [np.sort(rng.integers(size // 10, size - size // 10, size=3)) for _ in wall_cols]
+    pass_half = max(1, size // 2000)
+
+    n_holes = max(4, (size // 1000) ** 2 * 4)
+    hole_centers = rng.integers(0, size, size=(n_holes, 2))
+    hole_radii = rng.integers(size // 200 + 2, size // 40 + 4, size=n_holes)
+    return coarse, wall_cols, wall_width, passes, pass_half, hole_centers, hole_radii
+
+def _endpoints(size, n_destinations):
+    """Origen al oeste y destinos repartidos al este (fila, columna)."""
+    origin = (size // 2, int(size * 0.08))
+    rows = np.linspace(size * 0.2, size * 0.8, n_destinations).astype(np.int64)
+    return origin, [(int(r), int(size * 0.92)) for r in rows]
+
+def _block(size, seed, layout, endpoints, row_off, col_off, height, width):
+    coarse, wall_cols, wall_width, passes, pass_half, hole_centers, hole_radii = layout
+    rows = np.arange(row_off, row_off + height)
+    cols = np.arange(col_off, col_off + width)
+
+    # Campo suave: interpolación bilineal de la grilla gruesa
+    y, x = rows / COARSE_CELL, cols / COARSE_CELL
+    i0, j0 = y.astype(np.int64), x.astype(np.int64)
+    wy, wx = (y - i0)[:, None], (x - j0)[None, :]
+    field = ((1 - wy) * ((1 - wx) * coarse[i0][:, j0] + wx * coarse[i0][:, j0 + 1]) +
+             wy * ((1 - wx) * coarse[i0 + 1][:, j0] + wx * coarse[i0 + 1][:, j0 + 1]))
+    rng = np.random.default_rng((seed, row_off, col_off))
+    cost = (1.0 + 20.0 * field**2 + 0.5 * rng.random((height, width))).astype(np.float32)
+
+    # Lagos sin dato (se evitan los puntos de origen y destino)
+    protected = np.array([endpoints[0]] + endpoints[1])
+    for (hr, hc), radius in zip(hole_centers, hole_radii):
+        if np.min(np.hypot(protected[:, 0] - hr, protected[:, 1] - hc)) <= radius + 2:
+            continue
+        if hr + radius < row_off or hr - radius >= row_off + height or hc + radius < col_off or hc - radius >= col_off + width:
+            continue
+        cost[(rows[:, None] - hr)**2 + (cols[None, :] - hc)**2 <= radius**2] = NODATA
+
+    # Muros verticales con pasos angostos
+    for wall_col, wall_passes in zip(wall_cols, passes):
+        in_wall = (cols >= wall_col) & (cols < wall_col + wall_width)
+        if not in_wall.any():
+            continue
+        blocked = np.ones(height, dtype=bool)
+        for p in wall_passes:
+            blocked &= np.abs(rows - p) > pass_half
+        cost[np.ix_(blocked, in_wall)] = NODATA
+    return cost
+
+def generate_surface(out_dir, size, seed=0, n_destinations=4, block=1024):
+    """
+    Genera (o reutiliza si ya existe) un raster de costo de size x size píxeles escrito por
+    bloques, su máscara poligonal y los puntos. Devuelve un dict con las rutas 'costo',
+    'mascara' y 'puntos', y los píxeles 'origen' y 'destinos'.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    name = f"sintetico_{size}_s{seed}"
+    paths = {'costo': os.path.join(out_dir, f"{name}.tif"),
+             'mascara': os.path.join(out_dir, f"{name}_mascara.shp"),
+             'puntos': os.path.join(out_dir, f"{name}_puntos.shp")}
+    origin, destinations = _endpoints(size, n_destinations)
+    result = dict(paths, origen=origin, destinos=destinations)
+    if all(os.path.exists(p) for p in paths.values()):
+        return result
+
+    transform = from_origin(300000.0, 7000000.0, PIXEL_SIZE, PIXEL_SIZE)
+    crs = rasterio.crs.CRS.from_epsg(EPSG)
+    layout = _layout(size, seed)
+    profile = {'driver': 'GTiff', 'height': size, 'width': size, 'count': 1, 'dtype': 'float32', 'nodata': NODATA,
+               'transform': transform, 'crs': crs, 'tiled': True, 'blockxsize': 256, 'blockysize': 256}
+    tmp_path = f"{paths['costo']}.{os.getpid()}.tmp.tif"
+    with rasterio.open(tmp_path, 'w', **profile) as dst:
+        for row_off in range(0, size, block):
+            for col_off in range(0, size, block):
+                height, width = min(block, size - row_off), min(block, size - col_off)
+                data = _block(size, seed, layout, (origin, destinations), row_off, col_off, height, width)
+                dst.write(data, 1, window=Window(col_off, row_off, width, height))
+    os.replace(tmp_path, paths['costo'])
+
+    # Máscara: octógono con un margen del 2 % (deja fuera las esquinas del raster)
+    fiona_crs = CRS.from_epsg(EPSG)
+    margin, cut = 0.02 * size, 0.2 * size
+    corners = [(margin + cut, margin), (size - margin - cut, margin), (size - margin, margin + cut),
+               (size - margin, size - margin - cut), (size - margin - cut, size - margin), (margin + cut, size - margin),
+               (margin, size - margin - cut), (margin, margin + cut)]
+    polygon = Polygon([transform * (c, r) for c, r in corners])
+    with fiona.open(paths['mascara'], 'w', 'ESRI Shapefile', {'geometry': 'Polygon', 'properties': {'id': 'int'}}, crs=fiona_crs) as dst:
+        dst.write({'geometry': mapping(polygon), 'properties': {'id': 1}})
+
+    with fiona.open(paths['puntos'], 'w', 'ESRI Shapefile', {'geometry': 'Point', 'properties': {'id': 'int'}}, crs=fiona_crs) as dst:
+        for point_id, (r, c) in enumerate([origin] + destinations, start=1):
+            x, y = transform * (c + 0.5, r + 0.5)
+            dst.write({'geometry': mapping(Point(x, y)), 'properties': {'id': point_id}})
+    return result
@@ -8,8 +8,18 @@ from datetime import datetime
 
 # Importar los módulos del paquete lcp
 import lcp.data_loader as dl
+import lcp.cache as cache
+import lcp.cost_functions as cf
 import lcp.processing as proc
 import lcp.pathfinder as pf
+import lcp.landmarks as lmk
+import lcp.metrics as mtr
+import lcp.hierarchy as hier
+import lcp.incremental as inc
+import lcp.pipeline as pipe
+import lcp.pyramid as pyr
+import lcp.surfaces as srf
+import lcp.tiles as tiles
 import lcp.utils as utils
 
 def main():
@@ -22,98 +32,399 @@ def main():
     # Crear una carpeta de sesión única para cada ejecución
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     OUTPUT_DIR = os.path.join(BASE_DIR, 'output', f'session_{timestamp}')
+    CACHE_DIR = os.path.join(BASE_DIR, 'cache') # Niveles de remuestreo reutilizables entre ejecuciones
 
     # --- Rutas a los datos de entrada ---
     COST_RASTER_PATH = os.path.join(DATA_DIR, 'cost.tif')
     ALL_POINTS_SHAPEFILE = os.path.join(DATA_DIR, 'points.shp')
     MASK_SHAPEFILE_PATH = os.path.join(DATA_DIR, 'area-mask.shp') # Puede ser None si no se usa máscara
+    PREVIOUS_COST_RASTER_PATH = None # Versión anterior de COST_RASTER_PATH: se reutilizan las rutas que no tocan las zonas editadas
+    DEM_COST_FUNCTION = None # 'tobler' o 'herzog': COST_RASTER_PATH es un MDE y el costo de cada arista depende de la pendiente y del sentido
+    DEM_MEMO_TILE = 0 # Con DEM_COST_FUNCTION: lado (px) de las teselas del memo de costos de arista (0 lo desactiva)
 
     # --- Parámetros de cálculo (¡MODIFICAR AQUÍ!) ---
     ORIGIN_POINT_ID = 5
     ID_FIELD_NAME = 'id' # Nombre del campo/columna con los IDs de los puntos
-    DOWNSAMPLING_FACTORS = [32, 20, 10]
+    COARSE_METHOD = 'remuestreo' # Fase 1: 'remuestreo' (pirámide de niveles) o 'jerarquico' (grafo de teselas precalculado)
+    TILE_GRAPH_SIZE = 32 # Lado (px) de las teselas del grafo jerárquico
+    DOWNSAMPLING_FACTORS = [32, 20, 10] # Solo con COARSE_METHOD = 'remuestreo'
+    MASK_REDUCTION = 'any' # Máscara de los niveles: 'any' (conserva pasos angostos), 'all' (no cruza huecos) o 'muestreo' (original)
+    MAX_NODATA_FRACTION = 0.5 # Descarta las celdas de baja resolución con más píxeles sin dato que esta fracción (1.0: ninguna)
     CORRIDOR_BUFFER_PIXELS = 150
+    CORRIDOR_WIDENING_STEPS = 2 # Si la fase 2 falla, se reintenta duplicando el buffer (150, 300, 600 px) antes del PLAN B
     HEURISTIC_WEIGHT = 1.0
+    ONE_TO_ALL_MIN_DESTINATIONS = 11 # Con este número de destinos o más se usa una sola búsqueda Dijkstra
+    SAVE_SURFACES = True # La búsqueda Dijkstra guarda costo acumulado y direcciones; los destinos nuevos no requieren búsqueda
+    TILE_CACHE_MB = 1024 # Memoria máxima para la caché de teselas del raster de costo (por lector: con PIPELINE_QUEUE_SIZE la preparación usa otro)
+    PIPELINE_QUEUE_SIZE = 2 # Rutas de dos fases: rutas preparadas (y terminadas) que esperan a la etapa siguiente; 0 ejecuta preparación, búsqueda y escritura una tras otra
+    COMPACT_SEARCH_STATE = False # True: estado float32/uint8 en búsquedas sin recortar (menos memoria)
+    SEARCH_ALGORITHM = 'astar' # 'astar' o 'bidireccional' (A* desde ambos extremos, mismo costo)
+    LANDMARK_COUNT = 0 # Landmarks de la heurística ALT (solo con 'astar'; 0 la desactiva). Se calculan sobre toda la ventana: compensan con muchas rutas o PLAN B frecuentes
+    LANDMARK_BLOCK = 1 # >1 guarda las distancias por bloques (menos memoria, más nodos expandidos)
+    ROUTE_CACHE_MB = 512 # Tamaño máximo de la caché de rutas (SQLite en CACHE_DIR); 0 la desactiva
+    ROUTES_FILE = 'rutas.gpkg' # Capa única con todas las rutas en OUTPUT_DIR (.gpkg o .fgb); None guarda un shapefile por ruta
+    METRICS_FILE = 'metricas.jsonl' # Tiempos por fase y contadores de búsqueda por ruta, en OUTPUT_DIR (None lo desactiva)
 
     # ==============================================================================
     # --- EJECUCIÓN DEL ANÁLISIS ---
     # ==============================================================================
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     print(f"Los resultados se guardarán en: {OUTPUT_DIR}")
+    edge_cost = cf.get_edge_cost(DEM_COST_FUNCTION) if DEM_COST_FUNCTION else None
+    if edge_cost is not None:
+        # Grafo de teselas, landmarks, superficies, Dijkstra de uno a todos, A* bidireccional y
+        # reutilización tras ediciones suponen costos simétricos por píxel: solo dos fases con A*
+        print(f"Costos sobre un MDE con la función '{edge_cost.name}': fase 1 por remuestreo y A* unidireccional.")
+        COARSE_METHOD, SEARCH_ALGORITHM, LANDMARK_COUNT, ONE_TO_ALL_MIN_DESTINATIONS = 'remuestreo', 'astar', 0, float('inf')
+        PREVIOUS_COST_RASTER_PATH = None
+    metrics_log = mtr.MetricsLog(os.path.join(OUTPUT_DIR, METRICS_FILE) if METRICS_FILE else None)
+    route_writer = None
+    prep_src = None # Dataset propio de la etapa de preparación (ver 'lcp.pipeline')
+    route_cache = cache.RouteCache(os.path.join(CACHE_DIR, 'rutas.sqlite'), max_mb=ROUTE_CACHE_MB) if ROUTE_CACHE_MB else None
 
     try:
-        all_points, points_crs = dl.load_points_as_dict(ALL_POINTS_SHAPEFILE, ID_FIELD_NAME)
+        point_ids, point_coords, points_crs = dl.load_point_set(ALL_POINTS_SHAPEFILE, ID_FIELD_NAME)
         
         with dl.load_raster(COST_RASTER_PATH) as src:
-            print("Cargando superficie de costo a memoria...")
-            cost_data_high_res = src.read(1)
-            
+            raster = tiles.TiledRaster(src, memory_budget_mb=TILE_CACHE_MB)
+            if ROUTES_FILE:
+                route_writer = utils.RouteWriter(os.path.join(OUTPUT_DIR, ROUTES_FILE), src.crs)
+
+            def save_route(path_pixels, transform, dest_id, phase='final', **attributes):
+                if route_writer is not None:
+                    route_writer.add(path_pixels, transform, ORIGIN_POINT_ID, dest_id, phase=phase, **attributes)
+                else:
+                    output_shp = os.path.join(OUTPUT_DIR, f"ruta_{phase}_{ORIGIN_POINT_ID}_a_{dest_id}.shp")
+                    utils.save_path_to_shapefile(path_pixels, transform, src.crs, output_shp)
+
+            # Solo se lee la ventana del raster que cubre la máscara; los píxeles son relativos a ella
             if MASK_SHAPEFILE_PATH and os.path.exists(MASK_SHAPEFILE_PATH):
-                main_search_mask = proc.create_mask_from_vector(MASK_SHAPEFILE_PATH, src)
+                search_window = proc.vector_window(MASK_SHAPEFILE_PATH, src)
+                main_search_mask = proc.create_mask_from_vector(MASK_SHAPEFILE_PATH, src, window=search_window)
             else:
                 print("No se proporcionó máscara de polígono; se buscará en todo el raster.")
-                main_search_mask = np.ones_like(cost_data_high_res, dtype=bool)
+                search_window = raster.full_window()
+                main_search_mask = np.ones((int(search_window.height), int(search_window.width)), dtype=bool)
+            search_transform = src.window_transform(search_window)
+            edge_memo = cf.EdgeCostMemo(main_search_mask.shape, DEM_MEMO_TILE) if edge_cost is not None and DEM_MEMO_TILE else None
+
+            def route_cost_of(cost, path_pixels):
+                if edge_cost is not None:
+                    return pf.dem_path_cost(cost, path_pixels, src.res[0], abs(src.res[1]), edge_cost)
+                return pf.path_cost(cost, path_pixels, src.res[0], abs(src.res[1]))
 
-            origin_coords = all_points.get(ORIGIN_POINT_ID)
-            if not origin_coords:
+            edit = None
+            if PREVIOUS_COST_RASTER_PATH:
+                edit = inc.diff_rasters(PREVIOUS_COST_RASTER_PATH, COST_RASTER_PATH, window=search_window)
+                print(f"{len(edit)} zonas editadas respecto a {PREVIOUS_COST_RASTER_PATH}.")
+
+            cost_data_high_res = None # La ventana completa solo se lee si una búsqueda la necesita
+            passable_hr = None # Raster de transitabilidad de la ventana completa, común a todos los PLAN B
+
+            # Los núcleos no comprueban límites: todos los puntos se validan contra la ventana de
+            # búsqueda antes de calcular nada, y los inválidos se informan y se omiten
+            validation = dl.validate_points(point_ids, point_coords, search_transform, main_search_mask.shape, main_search_mask)
+            validation.report()
+            origin_index = np.flatnonzero(point_ids == ORIGIN_POINT_ID)
+            if len(origin_index) == 0:
                 raise ValueError(f"El ID de origen '{ORIGIN_POINT_ID}' no se encontró en el archivo de puntos.")
-            
-            start_pixel_hr = proc.world_to_pixel(src.transform, origin_coords[0], origin_coords[1])
+            # El origen puede quedar fuera de la máscara (la búsqueda solo la aplica a los vecinos), no de la ventana
+            if not validation.in_raster[origin_index[0]]:
+                raise ValueError(f"El punto de origen ID {ORIGIN_POINT_ID} está fuera de la ventana de búsqueda o no tiene geometría.")
+
+            start_pixel_hr = tuple(int(p) for p in validation.pixels[origin_index[0]])
             print(f"\nAnálisis desde el punto ID {ORIGIN_POINT_ID} (Píxel de alta res: {start_pixel_hr})")
 
-            for dest_id, dest_coords in all_points.items():
-                if dest_id == ORIGIN_POINT_ID: continue
-
-                print(f"\n--- Calculando ruta: {ORIGIN_POINT_ID} -> {dest_id} ---")
-                end_pixel_hr = proc.world_to_pixel(src.transform, dest_coords[0], dest_coords[1])
-                
-                # FASE 1: Búsqueda a baja resolución
-                path_found_lr, path_pixels_lr, successful_factor, trans_low = False, None, None, None
-                print("-> FASE 1: Buscando en baja resolución...")
-                for factor in DOWNSAMPLING_FACTORS:
-                    print(f"  Intentando con factor de remuestreo {factor}x...")
-                    cost_lr, trans_lr, dx_lr, dy_lr = proc.create_low_res_data(src, factor)
-                    mask_lr = main_search_mask[::factor, ::factor]
-                    start_lr = (start_pixel_hr[0] // factor, start_pixel_hr[1] // factor)
-                    end_lr = (end_pixel_hr[0] // factor, end_pixel_hr[1] // factor)
-                    
-                    found, came_from_lr = pf.a_star_search(cost_lr, src.nodata, start_lr, end_lr, dx_lr, abs(dy_lr), HEURISTIC_WEIGHT, mask_lr)
-                    
-                    if found:
-                        print(f"  Éxito con factor {factor}.")
-                        path_found_lr, successful_factor, trans_low = True, factor, trans_lr
-                        path_pixels_lr = pf.reconstruct_path(came_from_lr, start_lr, end_lr)
-                        break
+            # Destinos válidos como {id: píxel de alta resolución}
+            destinations = {dest_id: pixel for dest_id, pixel in validation.valid_pixels().items() if dest_id != ORIGIN_POINT_ID}
+
+            def take_cached(*search_params):
+                """Guarda las rutas que ya están en la caché; devuelve (destinos por calcular, contexto de la caché)."""
+                if route_cache is None:
+                    return destinations, None
+                context = cache.route_context_key(src.name, CACHE_DIR, search_window, main_search_mask, *search_params)
+                previous_context = None
+                if edit is not None:
+                    previous_context = cache.route_context_key(PREVIOUS_COST_RASTER_PATH, CACHE_DIR, search_window, main_search_mask, *search_params)
+                pending, reused = {}, 0
+                for dest_id, end_pixel_hr in destinations.items():
+                    key = route_cache.key(context, start_pixel_hr, end_pixel_hr)
+                    cached, mode = route_cache.get(key), 'cache'
+                    if cached is None and previous_context is not None:
+                        # Ruta del raster anterior: vale si las zonas editadas no la afectan
+                        cached, mode = route_cache.get(route_cache.key(previous_context, start_pixel_hr, end_pixel_hr)), 'reutilizada'
+                        if cached is not None and inc.route_unaffected(edit, cached, start_pixel_hr, end_pixel_hr, main_search_mask, search_window,
+                                                                       CORRIDOR_BUFFER_PIXELS, src.res[0], abs(src.res[1])):
+                            route_cache.put(key, cached['ruta'], cost=cached['costo'], factor=cached['factor'], buffer=cached['buffer'], plan_b=cached['plan_b'], path_lr=cached['ruta_fase1'])
+                            reused += 1
+                        else:
+                            cached = None
+                    if cached is None:
+                        pending[dest_id] = end_pixel_hr
+                        continue
+                    route_metrics = metrics_log.route(ORIGIN_POINT_ID, dest_id)
+                    if cached['ruta_fase1'] is not None:
+                        factor = cached['factor']
+                        save_route(cached['ruta_fase1'], search_transform * search_transform.scale(factor, factor), dest_id, phase='fase1', factor=factor)
+                    save_route(cached['ruta'], search_transform, dest_id, cost=cached['costo'], factor=cached['factor'], buffer=cached['buffer'], plan_b=cached['plan_b'])
+                    metrics_log.write(route_metrics, encontrada=True, modo=mode)
+                if len(pending) < len(destinations):
+                    print(f"{len(destinations) - len(pending)} rutas recuperadas de la caché ({reused} del raster anterior); {len(pending)} por calcular.")
+                return pending, context
+
+            def cache_route(context, end_pixel, path_pixels, **attributes):
+                if route_cache is not None:
+                    route_cache.put(route_cache.key(context, start_pixel_hr, end_pixel), path_pixels, **attributes)
+            surfaces = srf.SurfaceQuery.open(CACHE_DIR, src.name, search_window, main_search_mask, start_pixel_hr) if edge_cost is None else None
+            if surfaces is not None:
+                # MODO SUPERFICIES: ya existe una búsqueda de uno a todos guardada para este origen
+                print(f"\n--- Trazando {len(destinations)} rutas sobre las superficies guardadas del origen {ORIGIN_POINT_ID} ---")
+                with surfaces:
+                    for dest_id, end_pixel_hr in destinations.items():
+                        route_metrics = metrics_log.route(ORIGIN_POINT_ID, dest_id)
+                        with route_metrics.phase('trazado'):
+                            path_pixels_hr = surfaces.trace(end_pixel_hr)
+                        metrics_log.write(route_metrics, encontrada=path_pixels_hr is not None, modo='superficies')
+                        if path_pixels_hr is not None:
+                            print(f"  ÉXITO FINAL: Se encontró la ruta para {ORIGIN_POINT_ID} -> {dest_id}.")
+                            save_route(path_pixels_hr, search_transform, dest_id, cost=surfaces.cost(end_pixel_hr))
+                        else:
+                            print(f"  ERROR CRÍTICO: No se pudo encontrar ninguna ruta para {ORIGIN_POINT_ID} -> {dest_id}.")
+            elif len(destinations) >= ONE_TO_ALL_MIN_DESTINATIONS:
+                # MODO UNO A TODOS: una sola búsqueda Dijkstra asienta todos los destinos
+                pending, route_context = take_cached('dijkstra')
+                if pending:
+                    print(f"\n--- Calculando {len(pending)} rutas con una única búsqueda Dijkstra desde {ORIGIN_POINT_ID} ---")
+                    print("Cargando superficie de costo de la ventana de búsqueda...")
+                    cost_data_high_res = raster.read_window(search_window)
+                    end_pixels_hr = list(pending.values())
+                    # La búsqueda es común a todos los destinos: tiene su propio registro (destino nulo)
+                    search_metrics = metrics_log.route(ORIGIN_POINT_ID, None)
+                    with search_metrics.phase('dijkstra', destinos=len(end_pixels_hr)):
+                        if SAVE_SURFACES:
+                            # Se recorre toda la zona alcanzable para que sirva a cualquier destino futuro
+                            cost_path, backlink_path = srf.surface_paths(CACHE_DIR, src.name, search_window, main_search_mask, start_pixel_hr)
+                            g_cost_hr, came_from_hr = srf.compute_surfaces(cost_data_high_res, src.nodata, start_pixel_hr, src.res[0], abs(src.res[1]), main_search_mask,
+                                                                           search_transform, src.crs, cost_path, backlink_path)
+                            found = [np.isfinite(g_cost_hr[end_pixel]) for end_pixel in end_pixels_hr]
+                            print(f"Superficies guardadas en: {os.path.dirname(cost_path)}")
+                        else:
+                            found, came_from_hr, g_cost_hr = pf.dijkstra_multi_target(cost_data_high_res, src.nodata, start_pixel_hr, np.array(end_pixels_hr, dtype=np.int64), src.res[0], abs(src.res[1]), main_search_mask)
+                    metrics_log.write(search_metrics, encontrada=bool(np.any(found)), modo='uno_a_todos')
+
+                    for dest_id, end_pixel_hr, path_found_hr in zip(pending, end_pixels_hr, found):
+                        route_metrics = metrics_log.route(ORIGIN_POINT_ID, dest_id)
+                        if path_found_hr:
+                            print(f"  ÉXITO FINAL: Se encontró la ruta para {ORIGIN_POINT_ID} -> {dest_id}.")
+                            with route_metrics.phase('trazado'):
+                                path_pixels_hr = pf.reconstruct_path(came_from_hr, start_pixel_hr, end_pixel_hr)
+                            save_route(path_pixels_hr, search_transform, dest_id, cost=g_cost_hr[end_pixel_hr])
+                            cache_route(route_context, end_pixel_hr, path_pixels_hr, cost=g_cost_hr[end_pixel_hr])
+                        else:
+                            print(f"  ERROR CRÍTICO: No se pudo encontrar ninguna ruta para {ORIGIN_POINT_ID} -> {dest_id}.")
+                        metrics_log.write(route_metrics, encontrada=bool(path_found_hr), modo='uno_a_todos')
+            else:
+                # Rutas de dos fases en tres etapas (ver 'lcp.pipeline'). La preparación corre en
+                # otro hilo y no puede compartir el dataset ni la caché de teselas con la búsqueda
+                if PIPELINE_QUEUE_SIZE:
+                    prep_src = dl.load_raster(COST_RASTER_PATH)
+                    prep_raster = tiles.TiledRaster(prep_src, memory_budget_mb=TILE_CACHE_MB)
+                else:
+                    prep_raster = raster
+                pyramid = pyr.CostPyramid(prep_raster.src, main_search_mask, cache_dir=CACHE_DIR, window=search_window, previous_path=PREVIOUS_COST_RASTER_PATH, edit=edit,
+                                          mask_reduction=MASK_REDUCTION, max_nodata_fraction=MAX_NODATA_FRACTION)
+                tile_graph = None # Se construye (o se lee de la caché) en la primera consulta
+                landmarks = None # Se calculan (o se leen de la caché) en la primera búsqueda de alta resolución
+
+                def landmark_args(end_pixel, offset=(0, 0), log=print):
+                    nonlocal landmarks
+                    if not LANDMARK_COUNT or SEARCH_ALGORITHM != 'astar':
+                        return None
+                    if landmarks is None:
+                        landmarks = lmk.Landmarks(raster, main_search_mask, search_window, count=LANDMARK_COUNT, block=LANDMARK_BLOCK, cache_dir=CACHE_DIR, log=log)
+                    return landmarks.heuristic_args(end_pixel, offset)
+
+                def in_search_window(pixel):
+                    return 0 <= pixel[0] < main_search_mask.shape[0] and 0 <= pixel[1] < main_search_mask.shape[1]
+
+                if not in_search_window(start_pixel_hr):
+                    raise ValueError(f"El origen ID {ORIGIN_POINT_ID} (píxel {start_pixel_hr}) está fuera de la ventana de búsqueda.")
+
+                corridor_buffers = [CORRIDOR_BUFFER_PIXELS * 2**step for step in range(CORRIDOR_WIDENING_STEPS + 1)]
+                main_mask_pixels = int(np.count_nonzero(main_search_mask))
+
+                def build_corridor(reader, route_metrics, path_pixels_lr, factor, buffer, end_pixel_hr, searched_pixels):
+                    """
+                    Corredor de 'buffer' px alrededor de la ruta de baja resolución, leído con 'reader':
+                    (máscara, ventana, píxeles, costo), o None si no creció respecto al ya buscado.
+                    """
+                    # La búsqueda trabaja solo sobre el rectángulo que contiene el corredor
+                    with route_metrics.phase('corredor', buffer=buffer) as phase:
+                        corridor_mask, corridor_window = proc.build_search_corridor(path_pixels_lr, main_search_mask.shape, factor, buffer, include_pixels=(start_pixel_hr, end_pixel_hr))
+                        rows, cols = corridor_window.toslices()
+                        corridor_mask &= main_search_mask[rows, cols] # En el lugar: el corredor es un array propio de esta ruta
+                        corridor_pixels = int(np.count_nonzero(corridor_mask))
+                        phase.set(pixeles_corredor=corridor_pixels, ventana=[int(corridor_window.height), int(corridor_window.width)])
+                    if corridor_pixels == searched_pixels:
+                        return None # El corredor no creció (ya cubre la máscara cerca de la ruta)
+                    with route_metrics.phase('lectura'):
+                        cost_crop = reader.read_window(proc.offset_window(corridor_window, search_window))
+                    return corridor_mask, corridor_window, corridor_pixels, cost_crop
+
+                def prepare_route(item):
+                    """Etapa de preparación: fase 1 y primer corredor. Los mensajes se acumulan en 'log'."""
+                    nonlocal tile_graph
+                    dest_id, end_pixel_hr = item
+                    log = [f"\n--- Calculando ruta: {ORIGIN_POINT_ID} -> {dest_id} ---"]
+                    route_metrics = metrics_log.route(ORIGIN_POINT_ID, dest_id)
+                    job = {'dest_id': dest_id, 'log': log, 'metrics': route_metrics, 'end_pixel': end_pixel_hr, 'path_lr': None,
+                           'factor': None, 'transform_lr': None, 'corridor': None, 'outside': not in_search_window(end_pixel_hr)}
+                    if job['outside']:
+                        log.append(f"  El destino (píxel {end_pixel_hr}) está fuera de la ventana de búsqueda.")
+                        route_metrics.wait()
+                        return job
+
+                    # FASE 1: Búsqueda a baja resolución
+                    path_pixels_lr, successful_factor, trans_low = None, None, None
+                    if COARSE_METHOD == 'jerarquico':
+                        log.append("-> FASE 1: Buscando en el grafo de teselas...")
+                        if tile_graph is None:
+                            with route_metrics.phase('grafo_teselas'):
+                                tile_graph = hier.TileGraph(prep_raster, main_search_mask, search_window, tile_size=TILE_GRAPH_SIZE, cache_dir=CACHE_DIR,
+                                                            previous_path=PREVIOUS_COST_RASTER_PATH, edit=edit, log=log.append)
+                        with route_metrics.phase('fase1', metodo='jerarquico') as phase:
+                            path_pixels_lr = tile_graph.coarse_path(start_pixel_hr, end_pixel_hr)
+                            phase.set(encontrada=path_pixels_lr is not None)
+                        if path_pixels_lr is not None:
+                            log.append("  Éxito en el grafo de teselas.")
+                            successful_factor = tile_graph.coarse_factor
+                            trans_low = search_transform * search_transform.scale(successful_factor, successful_factor)
+                        else:
+                            log.append("  No hay conexión en el grafo de teselas.")
                     else:
-                        print(f"  Falló con factor {factor}.")
-                
-                # FASE 2: Búsqueda a alta resolución
-                print("\n-> FASE 2: Buscando en alta resolución...")
-                path_found_hr, came_from_hr = False, None
-
-                if path_found_lr and path_pixels_lr is not None:
-                    print("  Creando corredor a partir de la ruta de baja resolución...")
-                    corridor_mask = proc.create_search_corridor(path_pixels_lr, cost_data_high_res.shape, successful_factor, CORRIDOR_BUFFER_PIXELS)
-                    final_search_mask = np.logical_and(corridor_mask, main_search_mask)
-                    path_found_hr, came_from_hr = pf.a_star_search(cost_data_high_res, src.nodata, start_pixel_hr, end_pixel_hr, src.res[0], abs(src.res[1]), HEURISTIC_WEIGHT, final_search_mask)
-
-                if not path_found_hr:
-                    print("  Búsqueda en corredor fallida o no realizada. Iniciando PLAN B: búsqueda en toda la máscara.")
-                    path_found_hr, came_from_hr = pf.a_star_search(cost_data_high_res, src.nodata, start_pixel_hr, end_pixel_hr, src.res[0], abs(src.res[1]), HEURISTIC_WEIGHT, main_search_mask)
-
-                # Guardar resultados
-                if path_found_hr:
-                    print(f"  ÉXITO FINAL: Se encontró la ruta para {ORIGIN_POINT_ID} -> {dest_id}.")
-                    path_pixels_hr = pf.reconstruct_path(came_from_hr, start_pixel_hr, end_pixel_hr)
-                    
+                        log.append("-> FASE 1: Buscando en baja resolución...")
+                        for factor in DOWNSAMPLING_FACTORS:
+                            log.append(f"  Intentando con factor de remuestreo {factor}x...")
+                            with route_metrics.phase('fase1', search=True, metodo='remuestreo', factor=factor) as phase:
+                                cost_lr, trans_lr, dx_lr, dy_lr, mask_lr = pyramid.level(factor)
+                                start_lr = proc.low_res_pixel(start_pixel_hr, main_search_mask.shape, mask_lr.shape)
+                                end_lr = proc.low_res_pixel(end_pixel_hr, main_search_mask.shape, mask_lr.shape)
+
+                                path_pixels_lr = pf.find_path(cost_lr, src.nodata, start_lr, end_lr, dx_lr, abs(dy_lr), HEURISTIC_WEIGHT, mask_lr, algorithm=SEARCH_ALGORITHM, stats=phase.stats,
+                                                             edge_cost=edge_cost)
+                                phase.set(encontrada=path_pixels_lr is not None)
+
+                            if path_pixels_lr is not None:
+                                log.append(f"  Éxito con factor {factor}.")
+                                successful_factor, trans_low = factor, trans_lr
+                                break
+                            else:
+                                log.append(f"  Falló con factor {factor}.")
+
+                    # FASE 2: el primer corredor se prepara aquí, mientras se busca la ruta anterior
+                    log.append("\n-> FASE 2: Buscando en alta resolución...")
+                    corridor = None
                     if path_pixels_lr is not None:
-                        p1_path = os.path.join(OUTPUT_DIR, f"ruta_fase1_{ORIGIN_POINT_ID}_a_{dest_id}.shp")
-                        utils.save_path_to_shapefile(path_pixels_lr, trans_low, src.crs, p1_path)
-                    
-                    final_path_shp = os.path.join(OUTPUT_DIR, f"ruta_final_{ORIGIN_POINT_ID}_a_{dest_id}.shp")
-                    utils.save_path_to_shapefile(path_pixels_hr, src.transform, src.crs, final_path_shp)
-                else:
-                    print(f"  ERROR CRÍTICO: No se pudo encontrar ninguna ruta para {ORIGIN_POINT_ID} -> {dest_id}.")
+                        log.append("  Creando corredor a partir de la ruta de baja resolución...")
+                        corridor = build_corridor(prep_raster, route_metrics, path_pixels_lr, successful_factor, corridor_buffers[0], end_pixel_hr, 0)
+                    route_metrics.wait() # Hasta que la búsqueda tome la ruta
+                    job.update(path_lr=path_pixels_lr, factor=successful_factor, transform_lr=trans_low, corridor=corridor)
+                    return job
+
+                def search_route(job):
+                    """Etapa de búsqueda: fase 2 en corredores cada vez más anchos y, si fallan, PLAN B."""
+                    nonlocal cost_data_high_res, passable_hr
+                    log, route_metrics, end_pixel_hr, path_pixels_lr = job['log'], job['metrics'], job['end_pixel'], job['path_lr']
+                    route_metrics.resume()
+                    path_found_hr, path_pixels_hr, resolved_by, successful_buffer, route_cost = False, None, None, None, None
+                    # Estado de la última búsqueda fallida: el corredor siguiente (o el PLAN B) la reanuda
+                    search_state, state_window, searched_pixels = None, None, 0
+
+                    if path_pixels_lr is not None:
+                        for step, buffer in enumerate(corridor_buffers):
+                            # El primer corredor llega preparado (y se suelta aquí); los siguientes se leen en esta etapa
+                            corridor = job.pop('corridor') if step == 0 else build_corridor(raster, route_metrics, path_pixels_lr, job['factor'], buffer, end_pixel_hr, searched_pixels)
+                            if corridor is None:
+                                continue
+                            corridor_mask, corridor_window, searched_pixels, cost_crop = corridor
+
+                            offset = (corridor_window.row_off, corridor_window.col_off)
+                            start_crop = (start_pixel_hr[0] - offset[0], start_pixel_hr[1] - offset[1])
+                            end_crop = (end_pixel_hr[0] - offset[0], end_pixel_hr[1] - offset[1])
+                            with route_metrics.phase('landmarks'):
+                                heuristic = landmark_args(end_crop, offset, log=log.append)
+                            with route_metrics.phase('fase2', search=True, buffer=buffer) as phase:
+                                if SEARCH_ALGORITHM == 'astar':
+                                    state_offset = (0, 0) if search_state is None else (state_window.row_off - offset[0], state_window.col_off - offset[1])
+                                    path_pixels_crop, search_state = pf.corridor_search(cost_crop, src.nodata, start_crop, end_crop, src.res[0], abs(src.res[1]), HEURISTIC_WEIGHT, corridor_mask,
+                                                                                        landmarks=heuristic, previous=search_state, offset=state_offset, stats=phase.stats,
+                                                                                        edge_cost=edge_cost, memo=edge_memo, memo_offset=offset)
+                                    state_window = corridor_window
+                                else:
+                                    path_pixels_crop = pf.find_path(cost_crop, src.nodata, start_crop, end_crop, src.res[0], abs(src.res[1]), HEURISTIC_WEIGHT, corridor_mask, algorithm=SEARCH_ALGORITHM, stats=phase.stats)
+                                phase.set(encontrada=path_pixels_crop is not None)
+                            if path_pixels_crop is not None:
+                                log.append(f"  Éxito en el corredor de {buffer} px.")
+                                path_found_hr, path_pixels_hr, resolved_by, successful_buffer = True, path_pixels_crop + offset, 'corredor', buffer
+                                route_cost = route_cost_of(cost_crop, path_pixels_crop)
+                                break
+                            log.append(f"  Falló el corredor de {buffer} px.")
+
+                    if job['outside']:
+                        pass # Sin búsqueda: los núcleos no comprueban límites
+                    elif not path_found_hr and searched_pixels == main_mask_pixels:
+                        log.append("  El corredor ya cubría toda la máscara: se omite el PLAN B.")
+                    elif not path_found_hr:
+                        log.append("  Búsqueda en corredor fallida o no realizada. Iniciando PLAN B: búsqueda en toda la máscara.")
+                        if cost_data_high_res is None:
+                            with route_metrics.phase('lectura', ventana='completa'):
+                                cost_data_high_res = raster.read_window(search_window)
+                                if edge_cost is None:
+                                    # Se construye una vez por ejecución (el origen es fijo); el costo es su interior
+                                    passable_hr = proc.build_passability(cost_data_high_res, src.nodata, main_search_mask, include_pixels=(start_pixel_hr,))
+                                    cost_data_high_res = passable_hr[1:-1, 1:-1]
+                        with route_metrics.phase('landmarks'):
+                            heuristic = landmark_args(end_pixel_hr, log=log.append)
+                        with route_metrics.phase('plan_b', search=True) as phase:
+                            if SEARCH_ALGORITHM == 'astar':
+                                state_offset = (0, 0) if search_state is None else (state_window.row_off, state_window.col_off)
+                                path_pixels_hr, _ = pf.corridor_search(cost_data_high_res, src.nodata, start_pixel_hr, end_pixel_hr, src.res[0], abs(src.res[1]), HEURISTIC_WEIGHT, main_search_mask,
+                                                                       landmarks=heuristic, previous=search_state, offset=state_offset, compact_state=COMPACT_SEARCH_STATE, stats=phase.stats,
+                                                                       edge_cost=edge_cost, memo=edge_memo, passable=passable_hr)
+                            else:
+                                path_pixels_hr = pf.find_path(cost_data_high_res, src.nodata, start_pixel_hr, end_pixel_hr, src.res[0], abs(src.res[1]), HEURISTIC_WEIGHT, main_search_mask, algorithm=SEARCH_ALGORITHM, compact_state=COMPACT_SEARCH_STATE, stats=phase.stats)
+                            phase.set(encontrada=path_pixels_hr is not None)
+                        path_found_hr = path_pixels_hr is not None
+                        resolved_by = 'plan_b' if path_found_hr else None
+                        if path_found_hr:
+                            route_cost = route_cost_of(cost_data_high_res, path_pixels_hr)
+                    route_metrics.finish() # La espera y la escritura no cuentan en el total de la ruta
+                    job.update(found=path_found_hr, path=path_pixels_hr, cost=route_cost, resolved_by=resolved_by, buffer=successful_buffer)
+                    return job
+
+                def write_route(job):
+                    """Etapa de escritura: métricas, mensajes de la ruta, archivo de rutas y caché."""
+                    dest_id, end_pixel_hr, path_pixels_lr = job['dest_id'], job['end_pixel'], job['path_lr']
+                    metrics_log.write(job['metrics'], encontrada=job['found'], modo='dos_fases', resuelta_en=job['resolved_by'], buffer_corredor=job['buffer'])
+
+                    # Guardar resultados
+                    if job['found']:
+                        job['log'].append(f"  ÉXITO FINAL: Se encontró la ruta para {ORIGIN_POINT_ID} -> {dest_id}.")
+                    else:
+                        job['log'].append(f"  ERROR CRÍTICO: No se pudo encontrar ninguna ruta para {ORIGIN_POINT_ID} -> {dest_id}.")
+                    print("\n".join(job['log']))
+                    if job['found']:
+                        plan_b = job['resolved_by'] == 'plan_b'
+                        if path_pixels_lr is not None:
+                            save_route(path_pixels_lr, job['transform_lr'], dest_id, phase='fase1', factor=job['factor'])
+                        save_route(job['path'], search_transform, dest_id, cost=job['cost'], factor=job['factor'], buffer=job['buffer'], plan_b=plan_b)
+                        cache_route(route_context, end_pixel_hr, job['path'], cost=job['cost'], factor=job['factor'], buffer=job['buffer'], plan_b=plan_b, path_lr=path_pixels_lr)
+
+                pending, route_context = take_cached('dos_fases', COARSE_METHOD, TILE_GRAPH_SIZE, tuple(DOWNSAMPLING_FACTORS), MASK_REDUCTION, MAX_NODATA_FRACTION, tuple(corridor_buffers), HEURISTIC_WEIGHT,
+                                                     SEARCH_ALGORITHM, LANDMARK_COUNT, LANDMARK_BLOCK, COMPACT_SEARCH_STATE, DEM_COST_FUNCTION)
+                if pending:
+                    summary = pipe.Pipeline(prepare_route, search_route, write_route, queue_size=PIPELINE_QUEUE_SIZE).run(pending.items())
+                    print(f"\n{pipe.report(summary)}")
 
     except Exception as e:
         print(f"\nOcurrió un error fatal en la ejecución: {e}")
@@ -121,6 +432,13 @@ def main():
         traceback.print_exc()
 
     finally:
+        if route_writer is not None:
+            route_writer.close()
+        if prep_src is not None:
+            prep_src.close()
+        if route_cache is not None:
+            route_cache.close()
+        metrics_log.close()
         print("\n--- ANÁLISIS COMPLETADO ---")
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+# lcp/allocation.py
+
+import os
+import heapq
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from .pathfinder import dijkstra_multi_source, NO_DIRECTION_U8
+from .processing import offset_window
+from .surfaces import UNREACHED_COST
+
+# Valor sin dato del raster de asignación (píxeles que no alcanza ningún origen)
+UNALLOCATED = np.iinfo(np.int32).min
+
+def allocation_paths(output_dir):
+    """Rutas de los rasters de asignación, costo acumulado y direcciones dentro de 'output_dir'."""
+    return (os.path.join(output_dir, 'asignacion.tif'), os.path.join(output_dir, 'costo_acumulado.tif'),
+            os.path.join(output_dir, 'direccion.tif'))
+
+def compute_allocation(raster, search_mask, window, source_pixels, source_ids, dx, dy, transform, crs, output_dir,
+                       tile_size=1024, block_size=256):
+    """
+    Asignación por costo desde varios orígenes: para cada píxel de 'search_mask' (relativa a
+    'window'), el origen más barato de alcanzar ('source_ids', en el mismo orden que
+    'source_pixels'), el costo acumulado y la dirección hacia el píxel anterior. Se escriben
+    como GeoTIFF teselados (ver 'allocation_paths'); los códigos de dirección son los de
+    'reconstruct_path', así que cada ruta se traza hasta su origen como en 'surfaces'.
+
+    'raster' es un 'TiledRaster'. La búsqueda avanza por ventanas de 'tile_size' píxeles
+    con un borde de un píxel, y los propios GeoTIFF guardan el estado entre ventanas: en
+    memoria solo hay una ventana a la vez. Cada ventana reanuda 'dijkstra_multi_source'
+    desde sus bordes y, si mejora el borde de una vecina, la vuelve a encolar con prioridad
+    igual al menor costo mejorado; al vaciarse la cola el resultado es el de una única
+    búsqueda sobre todo el raster. Devuelve un dict con el número de ventanas procesadas,
+    reprocesadas y nodos asentados.
+    """
+    height, width = search_mask.shape
+    tiles_shape = (-(-height // tile_size), -(-width // tile_size))
+    os.makedirs(output_dir, exist_ok=True)
+    allocation_path, cost_path, backlink_path = allocation_paths(output_dir)
+
+    profile = {'driver': 'GTiff', 'height': height, 'width': width, 'count': 1, 'transform': transform, 'crs': crs,
+               'tiled': True, 'blockxsize': block_size, 'blockysize': block_size}
+    layers = ((allocation_path, 'int32', UNALLOCATED), (cost_path, 'float64', UNREACHED_COST), (backlink_path, 'uint8', NO_DIRECTION_U8))
+    datasets = [rasterio.open(path, 'w+', dtype=dtype, nodata=nodata, **profile) for path, dtype, nodata in layers]
+    allocation_dst, cost_dst, backlink_dst = datasets
+
+    def tile_window(tile_row, tile_col, halo=0):
+        r0, c0 = max(tile_row * tile_size - halo, 0), max(tile_col * tile_size - halo, 0)
+        r1, c1 = min((tile_row + 1) * tile_size + halo, height), min((tile_col + 1) * tile_size + halo, width)
+        return Window(c0, r0, c1 - c0, r1 - r0)
+
+    try:
+        for tile_row in range(tiles_shape[0]):
+            for tile_col in range(tiles_shape[1]):
+                w = tile_window(tile_row, tile_col)
+                for dst, (_, dtype, nodata) in zip(datasets, layers):
+                    dst.write(np.full((int(w.height), int(w.width)), nodata, dtype=dtype), 1, window=w)
+
+        # Orígenes: costo 0 en su píxel; la ventana que los contiene entra en la cola con prioridad 0
+        pending, queue, sources_by_tile = {}, [], {}
+        for pixel, source_id in zip(source_pixels, source_ids):
+            r, c = int(pixel[0]), int(pixel[1])
+            if not (0 <= r < height and 0 <= c < width) or not search_mask[r, c]:
+                print(f"  El origen {source_id} está fuera de la máscara de búsqueda; se omite.")
+                continue
+            w = Window(c, r, 1, 1)
+            source_cost = raster.read_window(offset_window(w, window))[0, 0]
+            if source_cost == raster.nodata or not np.isfinite(source_cost):
+                print(f"  El origen {source_id} está sobre un píxel sin dato; se omite.")
+                continue
+            if cost_dst.read(1, window=w)[0, 0] == 0.0:
+                continue  # Otro origen en el mismo píxel
+            allocation_dst.write(np.array([[source_id]], dtype=np.int32), 1, window=w)
+            cost_dst.write(np.zeros((1, 1)), 1, window=w)
+            tile = (r // tile_size, c // tile_size)
+            sources_by_tile.setdefault(tile, []).append((r, c))
+            pending[tile] = 0.0
+        for tile, key in pending.items():
+            heapq.heappush(queue, (key, tile))
+
+        processed, settled, visited = 0, 0, set()
+        while queue:
+            key, tile = heapq.heappop(queue)
+            if pending.get(tile) != key:
+                continue
+            del pending[tile]
+
+            w = tile_window(*tile, halo=1)
+            row_off, col_off = int(w.row_off), int(w.col_off)
+            rows, cols = w.toslices()
+            cost = raster.read_window(offset_window(w, window))
+            mask = search_mask[rows, cols]
+            g_cost = cost_dst.read(1, window=w).astype(np.float64)
+            g_cost[g_cost == UNREACHED_COST] = np.inf
+            allocation = allocation_dst.read(1, window=w)
+            came_from = backlink_dst.read(1, window=w)
+            g_before = g_cost.copy()
+
+            # Semillas: los orígenes de la ventana y su contorno (los únicos píxeles que otras ventanas pudieron cambiar)
+            seed_mask = np.zeros(g_cost.shape, dtype=bool)
+            inner = tile_window(*tile)
+            r0, c0 = int(inner.row_off) - row_off, int(inner.col_off) - col_off
+            r1, c1 = r0 + int(inner.height), c0 + int(inner.width)
+            seed_mask[:r0 + 1], seed_mask[r1 - 1:] = True, True
+            seed_mask[:, :c0 + 1], seed_mask[:, c1 - 1:] = True, True
+            for r, c in sources_by_tile.get(tile, ()):
+                seed_mask[r - row_off, c - col_off] = True
+
+            settled += dijkstra_multi_source(cost, raster.nodata, mask, dx, dy, g_cost, allocation, came_from, seed_mask)
+            processed += 1
+            visited.add(tile)
+
+            cost_dst.write(np.where(np.isfinite(g_cost), g_cost, UNREACHED_COST), 1, window=w)
+            allocation_dst.write(allocation, 1, window=w)
+            backlink_dst.write(came_from, 1, window=w)
+
+            # El borde mejorado pertenece a ventanas vecinas: se encolan con el menor costo mejorado
+            improved = g_cost < g_before
+            improved[r0:r1, c0:c1] = False
+            for r, c in zip(*np.nonzero(improved)):
+                neighbor = ((row_off + r) // tile_size, (col_off + c) // tile_size)
+                value = float(g_cost[r, c])
+                if value < pending.get(neighbor, np.inf):
+                    pending[neighbor] = value
+                    heapq.heappush(queue, (value, neighbor))
+    finally:
+        for dst in datasets:
+            dst.close()
+
+    print(f"Asignación guardada en: {output_dir}")
+    return {'ventanas': processed, 'reprocesadas': processed - len(visited), 'nodos_asentados': settled}
@@ -0,0 +1,143 @@
+# lcp/cache.py
+
+import os
+import json
+import sqlite3
+import time
+import hashlib
+import numpy as np
+
+def file_content_hash(path, chunk_size=1 << 24):
+    """Hash (BLAKE2b) del contenido completo de un archivo, leído por bloques."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def raster_content_hash(path, cache_dir=None):
+    """
+    Hash del contenido de un raster. Si se indica 'cache_dir', se memoriza por
+    (ruta, mtime, tamaño) para no releer el archivo completo en cada ejecución.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stat_key = f"{path}|{stat.st_mtime_ns}|{stat.st_size}"
+
+    memo, memo_path = {}, None
+    if cache_dir:
+        memo_path = os.path.join(cache_dir, 'fingerprints.json')
+        if os.path.exists(memo_path):
+            with open(memo_path, 'r') as f:
+                memo = json.load(f)
+
+    content_hash = memo.get(stat_key)
+    if content_hash is None:
+        content_hash = file_content_hash(path)
+        if memo_path:
+            memo[stat_key] = content_hash
+            tmp_path = f"{memo_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(memo, f)
+            os.replace(tmp_path, memo_path)
+    return content_hash
+
+def raster_fingerprint(path, cache_dir=None):
+    """Huella de un raster que combina su ruta, su fecha de modificación y el hash de su contenido."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stat_key = f"{path}|{stat.st_mtime_ns}|{stat.st_size}"
+    content_hash = raster_content_hash(path, cache_dir)
+    return hashlib.blake2b(f"{stat_key}|{content_hash}".encode(), digest_size=16).hexdigest()
+
+def _search_spec_key(raster_id, window, search_mask, params):
+    window_spec = (int(window.row_off), int(window.col_off), int(window.height), int(window.width))
+    mask_hash = hashlib.blake2b(np.packbits(search_mask).tobytes(), digest_size=16).hexdigest()
+    spec = '|'.join(str(p) for p in (raster_id, window_spec, mask_hash) + params)
+    return hashlib.blake2b(spec.encode(), digest_size=16).hexdigest()
+
+def search_cache_key(raster_path, cache_dir, window, search_mask, *params):
+    """Clave de caché para tablas precalculadas sobre una ventana y máscara de búsqueda de un raster."""
+    return _search_spec_key(raster_fingerprint(raster_path, cache_dir), window, search_mask, params)
+
+def route_context_key(raster_path, cache_dir, window, search_mask, *params):
+    """
+    Clave del contexto de las rutas de 'RouteCache': contenido del raster (no su ruta ni su
+    fecha), ventana, máscara y parámetros de búsqueda. Copiar o volver a guardar un raster
+    idéntico no invalida las rutas.
+    """
+    return _search_spec_key(raster_content_hash(raster_path, cache_dir), window, search_mask, params)
+
+class RouteCache:
+    """
+    Caché de rutas en SQLite, direccionada por contenido: cada ruta se guarda bajo el hash de
+    su contexto ('route_context_key') y sus píxeles de origen y destino. Al cambiar el raster,
+    la máscara o un parámetro cambia la clave, así que solo se recalculan los pares afectados.
+    Cuando el tamaño de las rutas supera 'max_mb' se descartan las usadas hace más tiempo.
+    Se puede usar desde otro hilo que el que la abrió (la etapa de escritura de
+    'lcp.pipeline'), pero no desde dos a la vez.
+    """
+
+    def __init__(self, path, max_mb=1024):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_bytes = int(max_mb * 2**20)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("""CREATE TABLE IF NOT EXISTS rutas (
+                clave TEXT PRIMARY KEY, ruta BLOB NOT NULL, ruta_fase1 BLOB, costo REAL,
+                factor INTEGER, plan_b INTEGER NOT NULL, bytes INTEGER NOT NULL, usada REAL NOT NULL, buffer INTEGER)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS rutas_usada ON rutas (usada)")
+        # Tamaño total de las rutas, llevado en memoria para no sumar la tabla en cada 'put'
+        self._total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM rutas").fetchone()[0]
+
+    @staticmethod
+    def key(context_key, start_pixel, end_pixel):
+        spec = f"{context_key}|{int(start_pixel[0])},{int(start_pixel[1])}|{int(end_pixel[0])},{int(end_pixel[1])}"
+        return hashlib.blake2b(spec.encode(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        """Ruta guardada como dict (ruta, ruta_fase1, costo, factor, buffer, plan_b), o None si no está."""
+        row = self._db.execute("SELECT ruta, ruta_fase1, costo, factor, buffer, plan_b FROM rutas WHERE clave = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self._db:
+            self._db.execute("UPDATE rutas SET usada = ? WHERE clave = ?", (time.time(), key))
+        path, path_lr, cost, factor, buffer, plan_b = row
+        return {'ruta': np.frombuffer(path, dtype=np.int32).reshape(-1, 2),
+                'ruta_fase1': None if path_lr is None else np.frombuffer(path_lr, dtype=np.int32).reshape(-1, 2),
+                'costo': cost, 'factor': factor, 'buffer': buffer, 'plan_b': bool(plan_b)}
+
+    def put(self, key, path, cost=None, factor=None, buffer=None, plan_b=False, path_lr=None):
+        """Guarda una ruta (array de píxeles) y descarta las menos usadas si se supera el tamaño máximo."""
+        path = np.ascontiguousarray(path, dtype=np.int32).tobytes()
+        path_lr = None if path_lr is None else np.ascontiguousarray(path_lr, dtype=np.int32).tobytes()
+        size = len(path) + len(path_lr or b'')
+        old = self._db.execute("SELECT bytes FROM rutas WHERE clave = ?", (key,)).fetchone()
+        total = self._total + size - (old[0] if old else 0)
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO rutas (clave, ruta, ruta_fase1, costo, factor, plan_b, bytes, usada, buffer) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (key, path, path_lr, None if cost is None else float(cost), None if factor is None else int(factor),
+                              int(bool(plan_b)), size, time.time(), None if buffer is None else int(buffer)))
+            total = self._evict(total)
+        self._total = total
+
+    def _evict(self, total):
+        """Descarta las rutas usadas hace más tiempo hasta que 'total' no supere el máximo; devuelve el nuevo total."""
+        if total <= self.max_bytes:
+            return total
+        for key, size in self._db.execute("SELECT clave, bytes FROM rutas ORDER BY usada").fetchall():
+            self._db.execute("DELETE FROM rutas WHERE clave = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        return total
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,107 @@
+# lcp/cost_functions.py
+
+import math
+import numpy as np
+from numba import njit
+
+# Costos anisotrópicos sobre un MDE: en lugar de un raster de fricción precalculado, el costo de
+# cada arista se calcula durante la búsqueda a partir de las elevaciones de sus dos píxeles, así
+# que subir y bajar cuestan distinto. Una función de costo es un núcleo Numba
+# f(z_origen, z_destino, dist_m) -> costo de ir del primer píxel al segundo (dist_m es la
+# distancia horizontal). Ver 'pathfinder.a_star_search' (argumento 'edge_cost').
+
+@njit(cache=True)
+def tobler_seconds(z_from, z_to, dist_m):
+    """Función de marcha de Tobler: segundos para recorrer la arista (6 km/h con pendiente -5 %)."""
+    slope = (z_to - z_from) / dist_m
+    speed_m_s = 6000.0 / 3600.0 * math.exp(-3.5 * abs(slope + 0.05))
+    return dist_m / speed_m_s
+
+@njit(cache=True)
+def herzog_metabolic(z_from, z_to, dist_m):
+    """Costo metabólico de Herzog (2013), en J/kg: polinomio de la pendiente por la distancia."""
+    s = (z_to - z_from) / dist_m
+    per_m = ((((((1337.8 * s + 278.19) * s - 517.39) * s - 78.199) * s + 93.419) * s + 19.825) * s + 1.64)
+    return per_m * dist_m
+
+class EdgeCost:
+    """
+    Función de costo de arista ('function', un núcleo @njit con la firma de arriba) y el menor
+    costo por metro horizontal que puede dar ('min_cost_per_m'). A* lo usa para escalar la
+    distancia euclidiana: con una cota mayor la heurística deja de ser admisible y las rutas
+    pueden no ser óptimas; con 0 la búsqueda es un Dijkstra.
+    """
+
+    def __init__(self, function, min_cost_per_m=0.0, name=None):
+        if min_cost_per_m < 0:
+            raise ValueError(f"El costo mínimo por metro no puede ser negativo (se recibió {min_cost_per_m}).")
+        self.function = function
+        self.min_cost_per_m = float(min_cost_per_m)
+        self.name = name or function.__name__
+
+    def __repr__(self):
+        return f"EdgeCost({self.name}, min_cost_per_m={self.min_cost_per_m})"
+
+# Funciones incluidas. Mínimos: Tobler a 6 km/h (0.6 s/m); el polinomio de Herzog vale
+# 0.6142 J/(kg·m) en su mínimo (pendiente -10.5 %).
+EDGE_COSTS = {
+    'tobler': EdgeCost(tobler_seconds, 0.6, 'tobler'),
+    'herzog': EdgeCost(herzog_metabolic, 0.614, 'herzog'),
+}
+
+def get_edge_cost(edge_cost):
+    """'EdgeCost' a partir de su nombre en EDGE_COSTS o de un 'EdgeCost' ya construido."""
+    if isinstance(edge_cost, EdgeCost):
+        return edge_cost
+    if edge_cost in EDGE_COSTS:
+        return EDGE_COSTS[edge_cost]
+    raise ValueError(f"Función de costo desconocida: '{edge_cost}'. Use {', '.join(repr(k) for k in EDGE_COSTS)} o un EdgeCost.")
+
+# --- Memo de costos de arista por teselas ---
+# Las búsquedas sobre el mismo MDE (rutas desde un origen común, corredores que se amplían, el
+# PLAN B) vuelven a evaluar las mismas aristas. El memo guarda el costo de las 8 aristas
+# salientes de cada píxel (NaN = sin calcular) en teselas que se reservan solo cuando la
+# búsqueda llega a ellas, en un pool que crece al duplicarse.
+
+# Memo vacío: 'pathfinder.a_star_dem' no guarda nada
+NO_MEMO = (np.empty((0, 0), dtype=np.int32), np.empty((0, 1, 1, 8), dtype=np.float32), 0, 1)
+
+class EdgeCostMemo:
+    """
+    Memo de costos de arista para un MDE de forma 'shape' (la ventana de búsqueda completa),
+    en teselas de 'tile_size' píxeles. Sirve para una sola función de costo y resolución; las
+    búsquedas sobre recortes indican la posición del recorte ('offset' de 'args').
+    """
+
+    def __init__(self, shape, tile_size=64):
+        self.shape = shape
+        self.tile_size = tile_size
+        self.slots = np.full((-(-shape[0] // tile_size), -(-shape[1] // tile_size)), -1, dtype=np.int32)
+        self.pool = np.empty((0, tile_size, tile_size, 8), dtype=np.float32)
+        self.used = 0
+
+    def args(self):
+        """Argumentos (slots, pool, teselas usadas, tile_size) para 'pathfinder.a_star_dem'."""
+        return self.slots, self.pool, self.used, self.tile_size
+
+    def update(self, pool, used):
+        """Guarda el pool (quizás ampliado) que devuelve la búsqueda."""
+        self.pool, self.used = pool, used
+
+    def nbytes(self):
+        """Memoria ocupada por las teselas reservadas y el índice de teselas."""
+        return self.slots.nbytes + self.used * self.tile_size * self.tile_size * 8 * 4
+
+@njit(cache=True)
+def memo_tile(slots, pool, used, tile_row, tile_col):
+    """Índice en el pool de la tesela (tile_row, tile_col), reservándola si hace falta. Devuelve (índice, pool, usadas)."""
+    slot = slots[tile_row, tile_col]
+    if slot >= 0:
+        return slot, pool, used
+    if used == pool.shape[0]:
+        grown = np.empty((max(4, 2 * pool.shape[0]), pool.shape[1], pool.shape[2], 8), dtype=np.float32)
+        grown[:used] = pool[:used]
+        pool = grown
+    pool[used] = np.nan
+    slots[tile_row, tile_col] = used
+    return used, pool, used + 1
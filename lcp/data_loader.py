@@ -3,9 +3,13 @@
 import rasterio
 import fiona
 import os
+import numpy as np
+import shapely
 from shapely.geometry import shape
 from shapely.ops import unary_union
 
+from . import processing as proc
+
 def load_raster(path):
     """
     Carga un archivo raster y devuelve el objeto del dataset, que es
@@ -25,22 +29,32 @@ def load_points_as_dict(shapefile_path, id_field):
     """
     Carga puntos desde un shapefile a un diccionario {id: (x, y)}.
     """
-    points = {}
-    crs = None
+    ids, coords, crs = load_point_set(shapefile_path, id_field)
+    points = dict(zip(ids.tolist(), map(tuple, coords.tolist())))
+    return points, crs
+
+def load_point_set(shapefile_path, id_field):
+    """
+    Carga puntos desde un shapefile como arrays, en el orden del archivo: (ids int64 (n,),
+    coords float64 (n, 2) con (x, y), crs). A diferencia de 'load_points_as_dict' conserva los
+    IDs repetidos, y los puntos sin geometría quedan con coordenadas NaN, para que
+    'validate_points' los informe en lugar de descartarlos en silencio.
+    """
     print(f"Cargando puntos desde: {shapefile_path}")
     if not os.path.exists(shapefile_path):
         raise FileNotFoundError(f"El archivo de puntos no se encontró en la ruta: {shapefile_path}")
-    
+
+    ids, coords = [], []
     with fiona.open(shapefile_path, 'r') as c:
         if len(c) == 0:
             raise ValueError(f"El archivo de puntos '{os.path.basename(shapefile_path)}' está vacío.")
         crs = c.crs
         for feature in c:
-            point_id = int(feature['properties'][id_field])
-            coords = feature['geometry']['coordinates']
-            points[point_id] = coords
-    print(f"Se cargaron {len(points)} puntos.")
-    return points, crs
+            ids.append(int(feature['properties'][id_field]))
+            geometry = feature['geometry']
+            coords.append(geometry['coordinates'][:2] if geometry is not None else (np.nan, np.nan))
+    print(f"Se cargaron {len(ids)} puntos.")
+    return np.array(ids, dtype=np.int64), np.array(coords, dtype=np.float64).reshape(-1, 2), crs
 
 def load_mask_geometry(shapefile_path):
     """Carga y unifica la geometría de un polígono de máscara."""
@@ -49,4 +63,94 @@ def load_mask_geometry(shapefile_path):
     print("Cargando polígono de máscara...")
     with fiona.open(shapefile_path, 'r') as c:
         geoms = [shape(f['geometry']) for f in c]
-    return unary_union(geoms)
\ No newline at end of file
+    return unary_union(geoms)
+
+# Motivos por los que 'validate_points' descarta un punto, en orden de prioridad
+POINT_ISSUES = ('sin_geometria', 'id_duplicado', 'fuera_del_raster', 'fuera_del_poligono', 'fuera_de_la_mascara')
+
+class PointValidation:
+    """
+    Resultado de 'validate_points', con arrays paralelos a los puntos: 'pixels' (fila, columna),
+    'in_raster', 'in_polygon' y 'in_mask' (None si no se comprobó) e 'issue', el índice en
+    POINT_ISSUES del primer motivo de descarte (-1 si el punto es válido).
+    """
+
+    def __init__(self, ids, coords, pixels, in_raster, in_polygon, in_mask, issue):
+        self.ids = ids
+        self.coords = coords
+        self.pixels = pixels
+        self.in_raster = in_raster
+        self.in_polygon = in_polygon
+        self.in_mask = in_mask
+        self.issue = issue
+
+    @property
+    def valid(self):
+        return self.issue < 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def counts(self):
+        """Número de puntos descartados por cada motivo (solo los que aparecen)."""
+        found = np.bincount(self.issue[self.issue >= 0], minlength=len(POINT_ISSUES))
+        return {name: int(n) for name, n in zip(POINT_ISSUES, found) if n}
+
+    def invalid(self):
+        """Puntos descartados como lista de dicts (id, x, y, fila, columna, motivo)."""
+        return [{'id': int(self.ids[i]), 'x': float(self.coords[i, 0]), 'y': float(self.coords[i, 1]),
+                 'fila': int(self.pixels[i, 0]) if self.issue[i] != 0 else None,
+                 'columna': int(self.pixels[i, 1]) if self.issue[i] != 0 else None,
+                 'motivo': POINT_ISSUES[self.issue[i]]}
+                for i in np.flatnonzero(~self.valid)]
+
+    def valid_pixels(self):
+        """Diccionario {id: (fila, columna)} de los puntos válidos."""
+        keep = self.valid
+        return dict(zip(self.ids[keep].tolist(), map(tuple, self.pixels[keep].tolist())))
+
+    def report(self, limit=20):
+        """Imprime un resumen y los primeros 'limit' puntos descartados."""
+        n_invalid = int(np.count_nonzero(~self.valid))
+        print(f"{len(self) - n_invalid} de {len(self)} puntos válidos.")
+        if n_invalid:
+            print("  Descartados: " + ", ".join(f"{name}: {n}" for name, n in self.counts().items()))
+            for point in self.invalid()[:limit]:
+                print(f"  Punto ID {point['id']} ({point['x']:.2f}, {point['y']:.2f}): {point['motivo']}")
+            if n_invalid > limit:
+                print(f"  ... y {n_invalid - limit} más.")
+
+def validate_points(ids, coords, transform, shape, search_mask=None, mask_geometry=None):
+    """
+    Valida muchos puntos a la vez: convierte sus coordenadas a píxeles de la rejilla ('transform',
+    'shape', p. ej. la ventana de búsqueda) con una sola operación afín y comprueba, sin bucles
+    por punto, que tengan geometría, que su ID no esté repetido (vale el primero), que caigan
+    dentro de la rejilla, dentro del polígono 'mask_geometry' (preparado y consultado con
+    'shapely.contains_xy') y sobre un píxel True de 'search_mask'. Devuelve un 'PointValidation'.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    pixels = proc.world_to_pixels(transform, coords)
+
+    has_geometry = np.isfinite(coords).all(axis=1)
+    unique = np.zeros(len(ids), dtype=bool)
+    unique[np.unique(ids, return_index=True)[1]] = True
+    in_raster = has_geometry & (pixels[:, 0] >= 0) & (pixels[:, 0] < shape[0]) & (pixels[:, 1] >= 0) & (pixels[:, 1] < shape[1])
+
+    in_polygon = None
+    if mask_geometry is not None:
+        shapely.prepare(mask_geometry)
+        in_polygon = has_geometry & shapely.contains_xy(mask_geometry, coords[:, 0], coords[:, 1])
+
+    in_mask = None
+    if search_mask is not None:
+        in_mask = np.zeros(len(ids), dtype=bool)
+        in_mask[in_raster] = search_mask[pixels[in_raster, 0], pixels[in_raster, 1]]
+
+    # De menor a mayor prioridad: gana el primer motivo de POINT_ISSUES que falla
+    issue = np.full(len(ids), -1, dtype=np.int64)
+    checks = (has_geometry, unique, in_raster, in_polygon, in_mask)
+    for code in range(len(POINT_ISSUES) - 1, -1, -1):
+        if checks[code] is not None:
+            issue[~checks[code]] = code
+    return PointValidation(ids, coords, pixels, in_raster, in_polygon, in_mask, issue)
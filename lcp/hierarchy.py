@@ -0,0 +1,349 @@
+# lcp/hierarchy.py
+
+import os
+import math
+import numpy as np
+from numba import njit
+
+from .pathfinder import heap_push, heap_pop, dijkstra_multi_target
+from .processing import offset_window
+from .cache import search_cache_key
+
+# rasterio y skimage se importan al usarlos, no al importar el módulo.
+
+# Forma parte de la clave de los grafos guardados: se incrementa cuando cambia su construcción
+# (2: una transición por segmento conexo a cada lado del borde)
+GRAPH_VERSION = 2
+
+@njit(cache=True, nogil=True)
+def abstract_dijkstra(indptr, indices, weights, source_cost, target_cost, direct_cost):
+    """
+    Dijkstra sobre el grafo abstracto (CSR) con un origen y un destino virtuales:
+    'source_cost[n]' / 'target_cost[n]' son los costos del origen al nodo n y del nodo n
+    al destino (inf si no están conectados) y 'direct_cost' el costo origen -> destino
+    sin salir de la tesela. Devuelve (costo, último nodo antes del destino o -1, predecesores).
+    """
+    n_nodes = indptr.shape[0] - 1
+    g_cost = np.full(n_nodes, np.inf, dtype=np.float64)
+    previous = np.full(n_nodes, -1, dtype=np.int64)
+
+    heap = np.empty((max(64, n_nodes), 5), dtype=np.float64)
+    size = 0
+    order = 0.0
+    for n in range(n_nodes):
+        if source_cost[n] < np.inf:
+            g_cost[n] = source_cost[n]
+            heap, size = heap_push(heap, size, source_cost[n], order, source_cost[n], n, 0)
+            order += 1.0
+
+    best_cost = direct_cost
+    best_last = -1
+    while size > 0:
+        f, g, n, _, size = heap_pop(heap, size)
+        if g >= best_cost:
+            break
+        if g > g_cost[n]:
+            continue
+
+        if g + target_cost[n] < best_cost:
+            best_cost = g + target_cost[n]
+            best_last = n
+
+        for k in range(indptr[n], indptr[n + 1]):
+            m = indices[k]
+            tentative = g + weights[k]
+            if tentative < g_cost[m]:
+                g_cost[m] = tentative
+                previous[m] = n
+                heap, size = heap_push(heap, size, tentative, order, tentative, m, 0)
+                order += 1.0
+
+    return best_cost, best_last, previous
+
+def _border_transitions(valid_a, valid_b, cost_a, cost_b, straight_m, diagonal_m):
+    """
+    Entradas a lo largo del borde entre dos teselas. 'valid_a' / 'valid_b' son las filas (o
+    columnas) de píxeles a cada lado del borde. Cada tramo continuo de píxeles que pueden
+    cruzarlo (también en diagonal) es una entrada, con una transición en su punto medio.
+    Los píxeles del lado b junto a un tramo pueden estar cortados en varios segmentos, que
+    quizá no se unen dentro de su tesela: cada segmento recibe su propia transición, desde
+    el píxel del tramo más cercano al punto medio.
+    Devuelve una lista de (i, j, costo): índice a cada lado y costo del paso.
+    """
+    length = valid_a.shape[0]
+    reach_b = valid_b.copy()
+    reach_b[1:] |= valid_b[:-1]
+    reach_b[:-1] |= valid_b[1:]
+    crossing = valid_a & reach_b
+
+    transitions = []
+    i = 0
+    while i < length:
+        if not crossing[i]:
+            i += 1
+            continue
+        run_end = i
+        while run_end + 1 < length and crossing[run_end + 1]:
+            run_end += 1
+        mid = (i + run_end) // 2
+        # Segmentos continuos del lado b al alcance del tramo (un píxel más a cada lado)
+        k, last = max(i - 1, 0), min(run_end + 1, length - 1)
+        while k <= last:
+            if not valid_b[k]:
+                k += 1
+                continue
+            segment_end = k
+            while segment_end + 1 <= last and valid_b[segment_end + 1]:
+                segment_end += 1
+            j = min(max(mid, k), segment_end)
+            a = mid if abs(j - mid) <= 1 else min(max(j, i), run_end)
+            step_m = straight_m if j == a else diagonal_m
+            transitions.append((a, j, (float(cost_a[a]) + float(cost_b[j])) / 2.0 * step_m))
+            k = segment_end + 1
+        i = run_end + 1
+    return transitions
+
+class TileGraph:
+    """
+    Índice jerárquico (estilo HPA*) para la fase de baja resolución.
+
+    La ventana de búsqueda se divide en teselas de 'tile_size' píxeles. En cada borde entre
+    teselas vecinas, cada tramo continuo de píxeles transitables es una entrada, representada
+    por un par de nodos a ambos lados; dentro de cada tesela se guarda el costo mínimo (sin
+    salir de ella) entre todos sus nodos. El grafo resultante (CSR) se construye una vez por
+    raster y máscara, se guarda en 'cache_dir', y responde la fase gruesa de cualquier consulta
+    con dos búsquedas locales en las teselas de origen y destino más un Dijkstra abstracto.
+
+    A diferencia del remuestreo, no puede cerrar pasos angostos: cada tramo de borde tiene
+    una transición por segmento conexo del otro lado y las esquinas se cruzan en diagonal,
+    así que si existe una ruta dentro de la máscara, el grafo la encuentra.
+
+    'coarse_factor' es el lado (px) de las celdas en que se devuelve la ruta gruesa (por omisión
+    un cuarto de 'tile_size'). El corredor se construye por bloques de ese lado, así que una
+    ruta píxel a píxel lo haría mucho más lento sin hacerlo más preciso.
+
+    Si se indica 'previous_path' (versión anterior del raster, con su grafo en la caché) y
+    'edit' (su 'RasterEdit' respecto al actual), solo se recalculan los costos internos de las
+    teselas que tocan las zonas editadas o cuyos nodos de borde cambiaron; el resto se copia.
+    Los mensajes de progreso se pasan a 'log' (por omisión se imprimen).
+    """
+
+    def __init__(self, raster, search_mask, window, tile_size=32, cache_dir=None, previous_path=None, edit=None, coarse_factor=None, log=print):
+        self.raster = raster
+        self.search_mask = search_mask
+        self.window = window
+        self.tile_size = tile_size
+        self.coarse_factor = coarse_factor or max(1, tile_size // 4)
+        self.nodata = raster.nodata
+        self.dx, self.dy = raster.src.res[0], abs(raster.src.res[1])
+        self.shape = search_mask.shape
+        self.tiles_shape = (-(-self.shape[0] // tile_size), -(-self.shape[1] // tile_size))
+
+        cache_path = previous_cache_path = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            cache_path = self._cache_path(raster.src.name, cache_dir)
+            if previous_path is not None and edit is not None:
+                previous_cache_path = self._cache_path(previous_path, cache_dir)
+
+        if cache_path and os.path.exists(cache_path):
+            with np.load(cache_path) as data:
+                self.node_pixels, self.indptr = data['node_pixels'], data['indptr']
+                self.indices, self.weights = data['indices'], data['weights']
+        else:
+            reusable = {}
+            if previous_cache_path and os.path.exists(previous_cache_path):
+                with np.load(previous_cache_path) as data:
+                    reusable = self._tile_edges(data, skip=edit.tiles(window, tile_size))
+                log(f"Actualizando grafo de teselas ({tile_size} px) a partir del raster anterior...")
+            else:
+                log(f"Construyendo grafo de teselas ({tile_size} px)...")
+            self._build(reusable)
+            if cache_path:
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+                np.savez(tmp_path, node_pixels=self.node_pixels, indptr=self.indptr, indices=self.indices, weights=self.weights)
+                os.replace(tmp_path, cache_path)
+
+        # Nodos de cada tesela, para conectar el origen y el destino de una consulta
+        node_tiles = (self.node_pixels[:, 0] // tile_size) * self.tiles_shape[1] + self.node_pixels[:, 1] // tile_size
+        self._tile_order = np.argsort(node_tiles, kind='stable')
+        self._tile_ptr = np.searchsorted(node_tiles[self._tile_order], np.arange(self.tiles_shape[0] * self.tiles_shape[1] + 1))
+
+    def _cache_path(self, raster_path, cache_dir):
+        key = search_cache_key(raster_path, cache_dir, self.window, self.search_mask, self.tile_size, GRAPH_VERSION)
+        return os.path.join(cache_dir, f"grafo_teselas_{key}.npz")
+
+    def _tile_edges(self, graph, skip=()):
+        """
+        Aristas internas de cada tesela de un grafo guardado ('node_pixels', 'indptr', 'indices',
+        'weights'), salvo las de 'skip' (índices (fila, columna) de tesela). Devuelve
+        {tesela: (conjunto de píxeles de sus nodos, {(píxel a, píxel b): costo})}.
+        """
+        ts, n_cols = self.tile_size, self.tiles_shape[1]
+        node_pixels = graph['node_pixels']
+        node_tiles = (node_pixels[:, 0] // ts) * n_cols + node_pixels[:, 1] // ts
+        skip_ids = {tile_row * n_cols + tile_col for tile_row, tile_col in skip}
+        pixels = [tuple(p) for p in node_pixels.tolist()]
+
+        tiles = {}
+        for n, tile_id in enumerate(node_tiles.tolist()):
+            if tile_id not in skip_ids:
+                tiles.setdefault(tile_id, (set(), {}))[0].add(pixels[n])
+
+        sources = np.repeat(np.arange(len(node_pixels)), np.diff(graph['indptr']))
+        indices, weights = graph['indices'], graph['weights']
+        for k in np.flatnonzero(node_tiles[sources] == node_tiles[indices]).tolist():
+            tile = tiles.get(int(node_tiles[sources[k]]))
+            if tile is not None:
+                tile[1][(pixels[sources[k]], pixels[indices[k]])] = float(weights[k])
+        return tiles
+
+    def _read(self, row_off, col_off, height, width):
+        """Costo y píxeles transitables de una ventana (en píxeles de la ventana de búsqueda)."""
+        from rasterio.windows import Window
+        local = Window(col_off, row_off, width, height)
+        cost = self.raster.read_window(offset_window(local, self.window))
+        rows, cols = local.toslices()
+        valid = self.search_mask[rows, cols] & (cost != self.nodata) & np.isfinite(cost)
+        return cost, valid
+
+    def _tile_bounds(self, tile_row, tile_col):
+        r0, c0 = tile_row * self.tile_size, tile_col * self.tile_size
+        return r0, c0, min(r0 + self.tile_size, self.shape[0]), min(c0 + self.tile_size, self.shape[1])
+
+    def _build(self, reusable=None):
+        """Construye el grafo; 'reusable' son aristas internas de otro grafo (ver '_tile_edges') que se copian si los nodos de la tesela coinciden."""
+        ts = self.tile_size
+        reusable = reusable or {}
+        diagonal_m = math.hypot(self.dx, self.dy)
+        node_ids, edges = {}, []
+
+        def node(pixel):
+            return node_ids.setdefault(pixel, len(node_ids))
+
+        def link(pixel_a, pixel_b, cost):
+            a, b = node(pixel_a), node(pixel_b)
+            edges.append((a, b, cost))
+            edges.append((b, a, cost))
+
+        # 1. Transiciones entre teselas vecinas (bordes verticales, horizontales y esquinas)
+        for tile_row in range(self.tiles_shape[0]):
+            for tile_col in range(self.tiles_shape[1]):
+                r0, c0, r1, c1 = self._tile_bounds(tile_row, tile_col)
+                if c1 < self.shape[1]:
+                    cost, valid = self._read(r0, c1 - 1, r1 - r0, 2)
+                    for i, j, step in _border_transitions(valid[:, 0], valid[:, 1], cost[:, 0], cost[:, 1], self.dx, diagonal_m):
+                        link((r0 + i, c1 - 1), (r0 + j, c1), step)
+                if r1 < self.shape[0]:
+                    cost, valid = self._read(r1 - 1, c0, 2, c1 - c0)
+                    for i, j, step in _border_transitions(valid[0], valid[1], cost[0], cost[1], self.dy, diagonal_m):
+                        link((r1 - 1, c0 + i), (r1, c0 + j), step)
+                if r1 < self.shape[0] and c1 < self.shape[1]:
+                    cost, valid = self._read(r1 - 1, c1 - 1, 2, 2)
+                    if valid[0, 0] and valid[1, 1]:
+                        link((r1 - 1, c1 - 1), (r1, c1), (float(cost[0, 0]) + float(cost[1, 1])) / 2.0 * diagonal_m)
+                    if valid[0, 1] and valid[1, 0]:
+                        link((r1 - 1, c1), (r1, c1 - 1), (float(cost[0, 1]) + float(cost[1, 0])) / 2.0 * diagonal_m)
+
+        node_pixels = np.array(list(node_ids), dtype=np.int64).reshape(-1, 2)
+
+        # 2. Costos dentro de cada tesela entre todos sus nodos
+        node_tiles = (node_pixels[:, 0] // ts) * self.tiles_shape[1] + node_pixels[:, 1] // ts
+        for tile_id in np.unique(node_tiles):
+            members = np.flatnonzero(node_tiles == tile_id)
+            if len(members) < 2:
+                continue
+            pixels = [tuple(p) for p in node_pixels[members].tolist()]
+            previous = reusable.get(int(tile_id))
+            if previous is not None and previous[0] == set(pixels):
+                for k in range(len(members) - 1):
+                    for m, pixel in zip(members[k + 1:], pixels[k + 1:]):
+                        g = previous[1].get((pixels[k], pixel))
+                        if g is not None:
+                            edges.append((members[k], m, g))
+                            edges.append((m, members[k], g))
+                continue
+            r0, c0, r1, c1 = self._tile_bounds(tile_id // self.tiles_shape[1], tile_id % self.tiles_shape[1])
+            cost, valid = self._read(r0, c0, r1 - r0, c1 - c0)
+            local = node_pixels[members] - (r0, c0)
+            for k in range(len(members) - 1):
+                targets = np.ascontiguousarray(local[k + 1:])
+                _, _, g_cost = dijkstra_multi_target(cost, self.nodata, (int(local[k, 0]), int(local[k, 1])), targets, self.dx, self.dy, valid)
+                reached = g_cost[targets[:, 0], targets[:, 1]]
+                for m, g in zip(members[k + 1:], reached):
+                    if np.isfinite(g):
+                        edges.append((members[k], m, g))
+                        edges.append((m, members[k], g))
+
+        # 3. Formato CSR
+        edge_array = np.array(edges, dtype=np.float64).reshape(-1, 3)
+        sources = edge_array[:, 0].astype(np.int64)
+        order = np.argsort(sources, kind='stable')
+        self.node_pixels = node_pixels
+        self.indptr = np.searchsorted(sources[order], np.arange(len(node_pixels) + 1)).astype(np.int64)
+        self.indices = edge_array[order, 1].astype(np.int64)
+        self.weights = edge_array[order, 2]
+
+    def _tile_costs(self, pixel, extra_pixel=None):
+        """
+        Costos desde 'pixel' hasta los nodos de su tesela (y hasta 'extra_pixel' si está en
+        ella) sin salir de la tesela. Devuelve (ids de nodo, costos, costo a 'extra_pixel').
+        """
+        tile_row, tile_col = pixel[0] // self.tile_size, pixel[1] // self.tile_size
+        tile_id = tile_row * self.tiles_shape[1] + tile_col
+        members = self._tile_order[self._tile_ptr[tile_id]:self._tile_ptr[tile_id + 1]]
+        r0, c0, r1, c1 = self._tile_bounds(tile_row, tile_col)
+
+        targets = self.node_pixels[members] - (r0, c0)
+        same_tile = extra_pixel is not None and (extra_pixel[0] // self.tile_size, extra_pixel[1] // self.tile_size) == (tile_row, tile_col)
+        if same_tile:
+            targets = np.vstack((targets, [(extra_pixel[0] - r0, extra_pixel[1] - c0)]))
+        if len(targets) == 0:
+            return members, np.empty(0), np.inf
+
+        cost, valid = self._read(r0, c0, r1 - r0, c1 - c0)
+        _, _, g_cost = dijkstra_multi_target(cost, self.nodata, (pixel[0] - r0, pixel[1] - c0), np.ascontiguousarray(targets, dtype=np.int64),
+                                             self.dx, self.dy, valid)
+        reached = g_cost[targets[:, 0], targets[:, 1]]
+        if same_tile:
+            return members, reached[:-1], reached[-1]
+        return members, reached, np.inf
+
+    def coarse_path(self, start_pixel, end_pixel):
+        """
+        Ruta gruesa de 'start_pixel' a 'end_pixel' (píxeles de la ventana de búsqueda): los nodos
+        del grafo abstracto unidos por segmentos rectos, como array (fila, columna) en celdas de
+        'coarse_factor' píxeles, o None si no hay conexión. Se refina con el corredor de la fase
+        de alta resolución, construido con ese factor.
+        """
+        for r, c in (start_pixel, end_pixel):
+            if not (0 <= r < self.shape[0] and 0 <= c < self.shape[1]):
+                return None
+
+        n_nodes = len(self.node_pixels)
+        source_cost = np.full(n_nodes, np.inf)
+        target_cost = np.full(n_nodes, np.inf)
+        members, costs, direct_cost = self._tile_costs(start_pixel, end_pixel)
+        source_cost[members] = costs
+        members, costs, _ = self._tile_costs(end_pixel)
+        target_cost[members] = costs  # El costo de cada paso es simétrico
+
+        best_cost, last, previous = abstract_dijkstra(self.indptr, self.indices, self.weights, source_cost, target_cost, direct_cost)
+        if not np.isfinite(best_cost):
+            return None
+
+        waypoints = [tuple(end_pixel)]
+        while last != -1:
+            waypoints.append(tuple(self.node_pixels[last]))
+            last = previous[last]
+        waypoints.append(tuple(start_pixel))
+        waypoints.reverse()
+
+        from skimage.draw import line
+        factor = self.coarse_factor
+        waypoints = [(int(r) // factor, int(c) // factor) for r, c in waypoints]
+        segments = [np.array([waypoints[0]])]
+        for (ra, ca), (rb, cb) in zip(waypoints[:-1], waypoints[1:]):
+            rows, cols = line(ra, ca, rb, cb)
+            segments.append(np.column_stack((rows, cols))[1:])
+        return np.concatenate(segments).astype(np.int32)
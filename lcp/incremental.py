@@ -0,0 +1,146 @@
+# lcp/incremental.py
+
+import math
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from . import processing as proc
+
+class RasterEdit:
+    """
+    Zonas editadas entre dos versiones de un raster de costo (ver 'diff_rasters'): ventanas en
+    píxeles del raster completo, si en cada una algún píxel se abarató o pasó a ser
+    transitable ('cheaper') y el costo mínimo de un píxel transitable del raster nuevo.
+    """
+
+    def __init__(self, windows, cheaper, min_cost):
+        self.windows = windows
+        self.cheaper = cheaper
+        self.min_cost = min_cost
+
+    def __len__(self):
+        return len(self.windows)
+
+    def relative_bounds(self, base_window):
+        """Ventanas editadas como (fila0, columna0, fila1, columna1) relativas a 'base_window'."""
+        return [(int(w.row_off - base_window.row_off), int(w.col_off - base_window.col_off),
+                 int(w.row_off - base_window.row_off + w.height), int(w.col_off - base_window.col_off + w.width))
+                for w in self.windows]
+
+    def touches(self, mask, mask_window, base_window):
+        """True si alguna zona editada cae sobre un píxel True de 'mask', cuya ventana 'mask_window' es relativa a 'base_window'."""
+        top, left = int(mask_window.row_off), int(mask_window.col_off)
+        for r0, c0, r1, c1 in self.relative_bounds(base_window):
+            r0, c0 = max(r0 - top, 0), max(c0 - left, 0)
+            r1, c1 = min(r1 - top, mask.shape[0]), min(c1 - left, mask.shape[1])
+            if r0 < r1 and c0 < c1 and mask[r0:r1, c0:c1].any():
+                return True
+        return False
+
+    def touches_pixels(self, pixels, base_window):
+        """True si algún píxel (fila, columna) de 'pixels', relativo a 'base_window', cae en una zona editada."""
+        pixels = np.asarray(pixels)
+        for r0, c0, r1, c1 in self.relative_bounds(base_window):
+            inside = (pixels[:, 0] >= r0) & (pixels[:, 0] < r1) & (pixels[:, 1] >= c0) & (pixels[:, 1] < c1)
+            if inside.any():
+                return True
+        return False
+
+    def may_shorten(self, start_pixel, end_pixel, route_cost, dx, dy, base_window):
+        """
+        True si alguna zona abaratada podría dar una ruta más barata que 'route_cost'. Toda ruta
+        que pase por una zona mide al menos la distancia del origen a la zona más la de la zona
+        al destino, y cada metro cuesta al menos 'min_cost'; si esa cota ya supera el costo de
+        la ruta guardada, la edición no puede mejorarla.
+        """
+        def distance_m(pixel, bounds):
+            r0, c0, r1, c1 = bounds
+            dr = max(r0 - pixel[0], 0, pixel[0] - (r1 - 1))
+            dc = max(c0 - pixel[1], 0, pixel[1] - (c1 - 1))
+            return math.hypot(dr * dy, dc * dx)
+
+        for bounds, cheaper in zip(self.relative_bounds(base_window), self.cheaper):
+            if not cheaper:
+                continue
+            lower_bound = self.min_cost * (distance_m(start_pixel, bounds) + distance_m(end_pixel, bounds))
+            if lower_bound < route_cost:
+                return True
+        return False
+
+    def tiles(self, base_window, tile_size):
+        """Conjunto de índices (fila, columna) de las teselas de 'tile_size' px (relativas a 'base_window') que tocan alguna zona editada."""
+        touched = set()
+        for r0, c0, r1, c1 in self.relative_bounds(base_window):
+            r0, c0 = max(r0, 0), max(c0, 0)
+            r1, c1 = min(r1, int(base_window.height)), min(c1, int(base_window.width))
+            if r0 >= r1 or c0 >= c1:
+                continue
+            for tile_row in range(r0 // tile_size, (r1 - 1) // tile_size + 1):
+                for tile_col in range(c0 // tile_size, (c1 - 1) // tile_size + 1):
+                    touched.add((tile_row, tile_col))
+        return touched
+
+def _valid(data, nodata):
+    valid = np.isfinite(data)
+    if nodata is not None:
+        valid &= data != nodata
+    return valid
+
+def diff_rasters(old_path, new_path, window=None, block=512):
+    """
+    Compara dos versiones de un raster de costo por bloques de 'block' píxeles (solo dentro de
+    'window', si se indica) y devuelve un 'RasterEdit' con una ventana ajustada a los píxeles
+    modificados de cada bloque. Ambos rasters deben tener la misma forma y georreferencia.
+    """
+    with rasterio.open(old_path) as old, rasterio.open(new_path) as new:
+        if old.shape != new.shape or old.transform != new.transform:
+            raise ValueError(f"Los rasters '{old_path}' y '{new_path}' no tienen la misma forma y georreferencia.")
+        if window is None:
+            window = Window(0, 0, new.width, new.height)
+        row_start, col_start = int(window.row_off), int(window.col_off)
+        row_end, col_end = row_start + int(window.height), col_start + int(window.width)
+
+        windows, cheaper, min_cost = [], [], np.inf
+        for row_off in range(row_start, row_end, block):
+            for col_off in range(col_start, col_end, block):
+                block_window = Window(col_off, row_off, min(block, col_end - col_off), min(block, row_end - row_off))
+                a, b = old.read(1, window=block_window), new.read(1, window=block_window)
+                valid_a, valid_b = _valid(a, old.nodata), _valid(b, new.nodata)
+                if valid_b.any():
+                    min_cost = min(min_cost, float(b[valid_b].min()))
+
+                changed = (valid_a != valid_b) | (valid_a & valid_b & (a != b))
+                if not changed.any():
+                    continue
+                rows, cols = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+                windows.append(Window(col_off + int(cols[0]), row_off + int(rows[0]),
+                                      int(cols[-1] - cols[0]) + 1, int(rows[-1] - rows[0]) + 1))
+                cheaper.append(bool((valid_b & (~valid_a | (b < a))).any()))
+    return RasterEdit(windows, cheaper, max(min_cost, 0.0) if np.isfinite(min_cost) else 0.0)
+
+def route_unaffected(edit, stored, start_pixel, end_pixel, search_mask, base_window, buffer_pixels, dx, dy):
+    """
+    True si una ruta calculada sobre el raster anterior ('RouteCache.get') sigue valiendo con el
+    raster editado. Las rutas de dos fases se descartan si las zonas editadas tocan su corredor
+    (con el buffer con que se encontraron; 'buffer_pixels' si no está guardado), porque la fase 2
+    ya no daría el mismo resultado; las de búsquedas sobre toda la máscara, si tocan
+    sus píxeles. En ambos casos la ruta conserva su costo, y se descarta también si una zona
+    abaratada podría dar una más barata ('RasterEdit.may_shorten'). Las rutas sin costo
+    guardado no se pueden comprobar y se recalculan, igual que las de un origen o destino fuera
+    de 'search_mask'.
+    """
+    if len(edit) == 0:
+        return True
+    inside = all(0 <= p[0] < search_mask.shape[0] and 0 <= p[1] < search_mask.shape[1] for p in (start_pixel, end_pixel))
+    if stored['costo'] is None or not inside:
+        return False
+    if stored['ruta_fase1'] is not None and not stored['plan_b']:
+        corridor_mask, corridor_window = proc.build_search_corridor(stored['ruta_fase1'], search_mask.shape, stored['factor'], stored.get('buffer') or buffer_pixels,
+                                                                    include_pixels=(start_pixel, end_pixel))
+        rows, cols = corridor_window.toslices()
+        if edit.touches(corridor_mask & search_mask[rows, cols], corridor_window, base_window):
+            return False
+    elif edit.touches_pixels(stored['ruta'], base_window):
+        return False
+    return not edit.may_shorten(start_pixel, end_pixel, stored['costo'], dx, dy, base_window)
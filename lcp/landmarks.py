@@ -0,0 +1,151 @@
+# lcp/landmarks.py
+
+import os
+import math
+import numpy as np
+from numba import njit
+
+from .pathfinder import heap_push, heap_pop
+from .cache import search_cache_key
+
+@njit(cache=True, nogil=True)
+def cost_distance(cost_array, nodata_value, source_pixel, dx, dy, search_mask):
+    """Dijkstra completo desde 'source_pixel': costo acumulado a cada píxel de la máscara (inf si no se alcanza)."""
+    height, width = cost_array.shape
+    dist = np.full((height, width), np.inf, dtype=np.float64)
+
+    heap = np.empty((max(64, 4 * (height + width)), 5), dtype=np.float64)
+    heap, size = heap_push(heap, 0, 0.0, 0.0, 0.0, source_pixel[0], source_pixel[1])
+    order = 1.0
+    dist[source_pixel] = 0.0
+
+    while size > 0:
+        f, g, r, c, size = heap_pop(heap, size)
+        if g > dist[r, c]:
+            continue
+
+        cost_current = cost_array[r, c]
+        for dr in range(-1, 2):
+            for dc in range(-1, 2):
+                if dr == 0 and dc == 0:
+                    continue
+                nr, nc = r + dr, c + dc
+                if not (0 <= nr < height and 0 <= nc < width):
+                    continue
+                if not search_mask[nr, nc]:
+                    continue
+                cost_neighbor = cost_array[nr, nc]
+                if cost_neighbor == nodata_value or np.isinf(cost_neighbor) or np.isnan(cost_neighbor):
+                    continue
+
+                tentative = g + ((cost_current + cost_neighbor) / 2.0) * math.sqrt((dr * dy)**2 + (dc * dx)**2)
+                if tentative < dist[nr, nc]:
+                    dist[nr, nc] = tentative
+                    heap, size = heap_push(heap, size, tentative, order, tentative, nr, nc)
+                    order += 1.0
+
+    return dist
+
+def _block_bounds(dist, valid, block):
+    """
+    Reduce un raster de distancias a bloques de block x block: (mínimo, máximo) por bloque,
+    en float32 redondeado hacia afuera. Un bloque con algún píxel válido no alcanzado
+    tiene máximo inf, para que la cota siga siendo admisible fuera de la componente del landmark.
+    """
+    height, width = dist.shape
+    pad_h, pad_w = -height % block, -width % block
+    dist = np.pad(dist, ((0, pad_h), (0, pad_w)), constant_values=np.inf)
+    valid = np.pad(valid, ((0, pad_h), (0, pad_w)), constant_values=False)
+    shape = (dist.shape[0] // block, block, dist.shape[1] // block, block)
+
+    reached = np.isfinite(dist)
+    block_min = dist.reshape(shape).min(axis=(1, 3))
+    block_max = np.where(reached, dist, -np.inf).reshape(shape).max(axis=(1, 3))
+    unreached = (valid & ~reached).reshape(shape).any(axis=(1, 3))
+    block_max[unreached | ~np.isfinite(block_max)] = np.inf
+
+    low = block_min.astype(np.float32)
+    low = np.where(low > block_min, np.nextafter(low, np.float32(-np.inf)), low)
+    high = block_max.astype(np.float32)
+    high = np.where(high < block_max, np.nextafter(high, np.float32(np.inf)), high)
+    return low, high
+
+class Landmarks:
+    """
+    Landmarks para la heurística ALT (A*, Landmarks y desigualdad triangular).
+
+    Se eligen 'count' píxeles alejados entre sí (selección por el más lejano) y se calcula
+    el costo acumulado desde cada uno a toda la máscara, en float32: el mínimo y el máximo por
+    bloque de 'block' x 'block' píxeles, redondeados hacia afuera, de modo que para un
+    píxel u y un destino t d(u, t) >= max(min_t - max_u, min_u - max_t) sigue siendo una cota
+    inferior admisible del costo restante. Vale para cualquier búsqueda dentro de 'search_mask'
+    (por ejemplo un corredor).
+
+    Con block = 1 la cota es la que menos nodos expande; se guardan igualmente dos arrays, el
+    redondeado hacia abajo y el redondeado hacia arriba, porque el float32 de un solo lado
+    puede sobrestimar. Los bloques ocupan block² veces menos memoria, pero la cota deja de ser consistente y A* reabre nodos
+    (se mitiga con pathmax); conviene solo si las distancias completas no caben en memoria.
+
+    Si se indica 'cache_dir', las tablas se guardan en disco con una clave derivada del
+    raster, la ventana, la máscara y los parámetros. Los mensajes de progreso se pasan a
+    'log' (por omisión se imprimen).
+    """
+
+    def __init__(self, raster, search_mask, window, count=8, block=1, cache_dir=None, log=print):
+        self.block = block
+        cache_path = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            key = search_cache_key(raster.src.name, cache_dir, window, search_mask, count, block)
+            cache_path = os.path.join(cache_dir, f"landmarks_{key}.npz")
+
+        if cache_path and os.path.exists(cache_path):
+            with np.load(cache_path) as data:
+                # Las tablas sin 'dist_max' (un solo array redondeado hacia abajo) se recalculan
+                if 'dist_max' in data:
+                    self.pixels, self.dist_min, self.dist_max = data['pixels'], data['dist_min'], data['dist_max']
+                    return
+
+        log(f"Calculando {count} landmarks (bloques de {block} px)...")
+        cost_array = raster.read_window(window)
+        dx, dy = raster.src.res[0], abs(raster.src.res[1])
+        self.pixels, self.dist_min, self.dist_max = self._compute(cost_array, raster.nodata, search_mask, dx, dy, count)
+        if cache_path:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, pixels=self.pixels, dist_min=self.dist_min, dist_max=self.dist_max)
+            os.replace(tmp_path, cache_path)
+
+    def _compute(self, cost_array, nodata_value, search_mask, dx, dy, count):
+        valid = search_mask & (cost_array != nodata_value) & np.isfinite(cost_array)
+        if not valid.any():
+            raise ValueError("La máscara de búsqueda no contiene píxeles transitables para ubicar landmarks.")
+
+        # El primer landmark es el píxel más lejano a un píxel válido cualquiera;
+        # cada siguiente, el más lejano al conjunto ya elegido
+        seed = tuple(int(v) for v in np.argwhere(valid)[0])
+        nearest = cost_distance(cost_array, nodata_value, seed, dx, dy, search_mask)
+        pixels, mins, maxs = [], [], []
+        for _ in range(count):
+            candidate = np.unravel_index(np.where(np.isfinite(nearest), nearest, -1.0).argmax(), nearest.shape)
+            landmark = (int(candidate[0]), int(candidate[1]))
+            dist = cost_distance(cost_array, nodata_value, landmark, dx, dy, search_mask)
+            pixels.append(landmark)
+            low, high = _block_bounds(dist, valid, self.block)
+            mins.append(low)
+            maxs.append(high)
+            nearest = dist if len(pixels) == 1 else np.minimum(nearest, dist)
+
+        return np.array(pixels, dtype=np.int64), np.stack(mins), np.stack(maxs)
+
+    def heuristic_args(self, end_pixel, offset=(0, 0)):
+        """
+        Argumentos de la heurística ALT para 'pathfinder.a_star_search' hacia 'end_pixel'.
+        'offset' es la posición (fila, columna) del recorte de búsqueda dentro de la ventana
+        de los landmarks; 'end_pixel' es relativo al recorte.
+        """
+        br = (end_pixel[0] + int(offset[0])) // self.block
+        bc = (end_pixel[1] + int(offset[1])) // self.block
+        if not (0 <= br < self.dist_min.shape[1] and 0 <= bc < self.dist_min.shape[2]):
+            return None
+        return (self.dist_min, self.dist_max, int(self.block), int(offset[0]), int(offset[1]),
+                self.dist_min[:, br, bc].copy(), self.dist_max[:, br, bc].copy())
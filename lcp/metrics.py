@@ -0,0 +1,118 @@
+# lcp/metrics.py
+
+import json
+import time
+from contextlib import contextmanager
+
+from .pathfinder import new_search_stats, search_stats_dict
+
+class Phase:
+    """Fase en curso de una ruta: campos extra del registro y contadores para la búsqueda ('stats')."""
+    __slots__ = ('fields', 'stats')
+
+    def __init__(self, fields, stats):
+        self.fields = fields
+        self.stats = stats
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+class _NullPhase:
+    """Fase de un registro desactivado: no guarda nada y no pide contadores a la búsqueda."""
+    __slots__ = ()
+    stats = None
+
+    def set(self, **fields):
+        pass
+
+_NULL_PHASE = _NullPhase()
+
+class RouteMetrics:
+    """
+    Métricas de una ruta: tiempo de cada fase y, para las búsquedas que reciben 'phase.stats',
+    sus contadores (ver 'pathfinder.new_search_stats'). Desactivada, 'phase' no mide nada y
+    'phase.stats' es None, de modo que las búsquedas corren sin contadores.
+
+    Cuando las etapas de la ruta corren en hilos distintos ('lcp.pipeline'), 'wait' y 'resume'
+    marcan el tiempo en una cola y 'finish' el final del trabajo: 'segundos_total' no incluye
+    esas esperas ni la escritura, y la espera se guarda aparte ('segundos_espera').
+    """
+
+    def __init__(self, origin_id, dest_id, enabled=True):
+        self.enabled = enabled
+        self.record = {'origen': origin_id, 'destino': dest_id, 'fases': []}
+        self.started = time.perf_counter() if enabled else None
+        self.finished = None
+        self.waited = 0.0
+        self._wait_start = None
+
+    def wait(self):
+        """Marca el comienzo de una espera en cola."""
+        if self.enabled:
+            self._wait_start = time.perf_counter()
+
+    def resume(self):
+        """Marca el fin de la espera iniciada con 'wait'."""
+        if self.enabled and self._wait_start is not None:
+            self.waited += time.perf_counter() - self._wait_start
+            self._wait_start = None
+
+    def finish(self):
+        """Marca el final del trabajo de la ruta; lo que siga (la escritura) no cuenta en el total."""
+        if self.enabled:
+            self.finished = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name, search=False, **fields):
+        """
+        Mide el bloque 'with' como la fase 'name'. Con 'search' = True la fase lleva contadores
+        de búsqueda en 'phase.stats', que se agregan al registro al terminar.
+        """
+        if not self.enabled:
+            yield _NULL_PHASE
+            return
+        phase = Phase({'fase': name, **fields}, new_search_stats() if search else None)
+        start = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase.fields['segundos'] = round(time.perf_counter() - start, 6)
+            if phase.stats is not None:
+                phase.fields.update(search_stats_dict(phase.stats))
+            self.record['fases'].append(phase.fields)
+
+class MetricsLog:
+    """
+    Registro JSON Lines con una línea por ruta (ver 'RouteMetrics'). Con 'path' None queda
+    desactivado: las rutas no miden nada y no se escribe ningún archivo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+
+    def route(self, origin_id, dest_id):
+        return RouteMetrics(origin_id, dest_id, enabled=self._file is not None)
+
+    def write(self, route, **fields):
+        """Escribe el registro de 'route' con los campos finales (por ejemplo, si se encontró la ruta)."""
+        if self._file is None:
+            return
+        route.record.update(fields)
+        finished = route.finished if route.finished is not None else time.perf_counter()
+        route.record['segundos_total'] = round(finished - route.started - route.waited, 6)
+        if route.waited:
+            route.record['segundos_espera'] = round(route.waited, 6)
+        self._file.write(json.dumps(route.record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
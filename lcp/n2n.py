@@ -0,0 +1,105 @@
+# lcp/n2n.py
+
+import os
+import time
+import numpy as np
+from multiprocessing import Pool, shared_memory
+
+from . import pathfinder as pf
+
+# Arrays compartidos del proceso trabajador (se llenan en '_attach_worker')
+_worker_state = {}
+
+def _share_array(array):
+    """Copia un array a un bloque de memoria compartida y devuelve (bloque, especificación)."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+def _attach_worker(cost_spec, mask_spec, nodata_value, dx, dy):
+    """Inicializador de cada trabajador: se conecta a los arrays compartidos sin copiarlos."""
+    for key, (name, shape, dtype) in (('cost', cost_spec), ('mask', mask_spec)):
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_state[key + '_shm'] = shm  # Mantener viva la referencia al bloque
+        _worker_state[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    _worker_state['params'] = (nodata_value, dx, dy)
+
+def _route_origin(task):
+    """Calcula con una sola búsqueda Dijkstra todas las rutas de un origen."""
+    origin_id, start_pixel, dest_ids, dest_pixels = task
+    nodata_value, dx, dy = _worker_state['params']
+    found, came_from, g_cost = pf.dijkstra_multi_target(
+        _worker_state['cost'], nodata_value, start_pixel, dest_pixels, dx, dy, _worker_state['mask']
+    )
+    routes = []
+    for dest_id, (r, c), path_found in zip(dest_ids, dest_pixels, found):
+        if path_found:
+            end_pixel = (int(r), int(c))
+            routes.append((dest_id, pf.reconstruct_path(came_from, start_pixel, end_pixel), g_cost[end_pixel]))
+        else:
+            routes.append((dest_id, None, np.inf))
+    return origin_id, routes
+
+def run_all_to_all(cost_array, nodata_value, search_mask, point_pixels, dx, dy, processes=None, symmetric=True, on_route=None):
+    """
+    Calcula las rutas de todos a todos (N2N) repartiendo los orígenes entre un pool de procesos.
+
+    El raster de costo y la máscara se publican una sola vez en memoria compartida; cada
+    trabajador los lee desde allí en lugar de cargar su propia copia. Cada tarea es un
+    origen que resuelve todos sus destinos con 'dijkstra_multi_target'.
+
+    - point_pixels: diccionario {id: (fila, columna)} en píxeles del raster.
+    - symmetric: como el costo de cada arista es simétrico, calcula solo i -> j con i < j
+      y entrega j -> i como la ruta invertida (la mitad de las búsquedas).
+    - on_route: función opcional on_route(origen, destino, ruta_pixeles, costo) que se
+      llama en el proceso principal a medida que llegan los resultados.
+
+    Devuelve un diccionario con métricas: rutas, rutas_fallidas, segundos y rutas_por_segundo.
+    """
+    ids = list(point_pixels)
+    tasks = []
+    for i, origin_id in enumerate(ids):
+        dest_ids = ids[i + 1:] if symmetric else ids[:i] + ids[i + 1:]
+        if not dest_ids:
+            continue
+        dest_pixels = np.array([point_pixels[d] for d in dest_ids], dtype=np.int64)
+        start_pixel = (int(point_pixels[origin_id][0]), int(point_pixels[origin_id][1]))
+        tasks.append((origin_id, start_pixel, dest_ids, dest_pixels))
+
+    processes = processes or os.cpu_count()
+    print(f"Calculando rutas de todos a todos: {len(ids)} puntos, {len(tasks)} orígenes, {processes} procesos.")
+
+    cost_shm, cost_spec = _share_array(np.ascontiguousarray(cost_array))
+    mask_shm, mask_spec = _share_array(np.ascontiguousarray(search_mask, dtype=bool))
+    n_routes, n_failed = 0, 0
+    start_time = time.perf_counter()
+    try:
+        with Pool(processes, initializer=_attach_worker, initargs=(cost_spec, mask_spec, nodata_value, dx, dy)) as pool:
+            for origin_id, routes in pool.imap_unordered(_route_origin, tasks):
+                for dest_id, path, cost in routes:
+                    pairs = [(origin_id, dest_id, path)]
+                    if symmetric:
+                        pairs.append((dest_id, origin_id, None if path is None else path[::-1]))
+                    for o, d, p in pairs:
+                        if p is None:
+                            n_failed += 1
+                        else:
+                            n_routes += 1
+                        if on_route is not None:
+                            on_route(o, d, p, cost)
+    finally:
+        for shm in (cost_shm, mask_shm):
+            shm.close()
+            shm.unlink()
+
+    elapsed = time.perf_counter() - start_time
+    stats = {
+        'rutas': n_routes,
+        'rutas_fallidas': n_failed,
+        'segundos': elapsed,
+        'rutas_por_segundo': n_routes / elapsed if elapsed > 0 else float('inf'),
+    }
+    print(f"Rutas calculadas: {n_routes} ({n_failed} sin solución) en {elapsed:.1f} s "
+          f"-> {stats['rutas_por_segundo']:.2f} rutas/s.")
+    return stats
@@ -2,44 +2,402 @@
 
 import numpy as np
 import math
-from numba import njit
+import numba
+from numba import njit, prange
 
-@njit
+from . import cost_functions as cf
+from .cost_functions import memo_tile
+from .processing import build_passability, IMPASSABLE
+
+# Los núcleos se guardan compilados en disco (cache=True): solo la primera ejecución paga la
+# compilación. Los más pequeños se compilan al importar, con firmas explícitas.
+@njit('float64(int64, int64, int64, int64, float64, float64)', cache=True)
 def heuristic_numba(r1, c1, r2, c2, dx, dy):
     """Heurística de distancia euclidiana."""
     return math.sqrt(((r2 - r1) * dy)**2 + ((c2 - c1) * dx)**2)
 
-@njit
-def a_star_search(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask):
+# Sin registro de celdas escritas (ver 'a_star_heap')
+NO_TOUCHED = np.empty(0, dtype=np.int64)
+
+# Argumentos ALT vacíos (sin landmarks): ver 'landmarks.Landmarks.heuristic_args'
+NO_LANDMARKS = (np.empty((0, 1, 1), dtype=np.float32), np.empty((0, 1, 1), dtype=np.float32), 1, 0, 0,
+                np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
+
+# Contadores de búsqueda: array int64 de 'new_search_stats', o None para no contar. Numba
+# descarta las ramas 'stats is not None' al compilar la versión sin contadores, que queda
+# igual a la de antes.
+STAT_POPPED, STAT_PUSHED, STAT_STALE, STAT_PEAK_OPEN = 0, 1, 2, 3
+STAT_NAMES = ('nodos_extraidos', 'nodos_insertados', 'extracciones_obsoletas', 'pico_open_set')
+
+def new_search_stats():
+    """Contadores en cero: extraídos, insertados, extracciones obsoletas y pico del open set."""
+    return np.zeros(len(STAT_NAMES), dtype=np.int64)
+
+def search_stats_dict(stats):
+    """Contadores de 'new_search_stats' como dict con nombres."""
+    return {name: int(value) for name, value in zip(STAT_NAMES, stats)}
+
+@njit(cache=True)
+def landmark_bound(r, c, landmarks):
+    """
+    Cota inferior ALT del costo desde (r, c) hasta el destino; 0 si no hay landmarks. Las
+    entradas infinitas (bloques o destinos que un landmark no alcanzó, p. ej. un origen fuera
+    de la máscara) no acotan nada y se omiten.
+    """
+    dist_min, dist_max, block, offset_r, offset_c, target_min, target_max = landmarks
+    br = (r + offset_r) // block
+    bc = (c + offset_c) // block
+    best = 0.0
+    # Las tablas son float32 redondeadas hacia afuera: se restan en float64 para no redondear hacia arriba
+    for k in range(dist_min.shape[0]):
+        if np.isfinite(target_min[k]):
+            bound = np.float64(target_min[k]) - np.float64(dist_max[k, br, bc])
+            if bound > best:
+                best = bound
+        if np.isfinite(dist_min[k, br, bc]) and np.isfinite(target_max[k]):
+            bound = np.float64(dist_min[k, br, bc]) - np.float64(target_max[k])
+            if bound > best:
+                best = bound
+    return best
+
+# --- Colas de prioridad para el open set ---
+# Montículo binario preasignado: cada fila es [f, orden, g, r, c]. El orden de
+# inserción desempata los f iguales tal como lo hacía np.argmin sobre el antiguo
+# open set (sale primero la entrada más antigua), por lo que las rutas son idénticas.
+# Las entradas obsoletas no se borran: se descartan al salir ("lazy deletion").
+
+@njit(cache=True)
+def heap_push(heap, size, f, order, g, r, c):
+    """Inserta una entrada en el montículo, duplicando su capacidad si está lleno."""
+    if size == heap.shape[0]:
+        grown = np.empty((heap.shape[0] * 2, 5), dtype=np.float64)
+        grown[:size] = heap[:size]
+        heap = grown
+
+    i = size
+    while i > 0:
+        parent = (i - 1) // 2
+        if heap[parent, 0] < f or (heap[parent, 0] == f and heap[parent, 1] < order):
+            break
+        heap[i] = heap[parent]
+        i = parent
+    heap[i, 0] = f
+    heap[i, 1] = order
+    heap[i, 2] = g
+    heap[i, 3] = r
+    heap[i, 4] = c
+    return heap, size + 1
+
+@njit(cache=True)
+def heap_pop(heap, size):
+    """Extrae la entrada de menor (f, orden). Devuelve (f, g, r, c, nuevo_tamaño)."""
+    f, g, r, c = heap[0, 0], heap[0, 2], int(heap[0, 3]), int(heap[0, 4])
+    size -= 1
+    if size > 0:
+        last_f, last_order = heap[size, 0], heap[size, 1]
+        i = 0
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            right = child + 1
+            if right < size and (heap[right, 0] < heap[child, 0] or
+                                 (heap[right, 0] == heap[child, 0] and heap[right, 1] < heap[child, 1])):
+                child = right
+            if last_f < heap[child, 0] or (last_f == heap[child, 0] and last_order < heap[child, 1]):
+                break
+            heap[i] = heap[child]
+            i = child
+        heap[i] = heap[size]
+    return f, g, r, c, size
+
+# Cola de cubetas (bucket/radix) para costos cuantizados: la clave de cada entrada
+# es floor(f / ancho). Las cubetas forman un anillo que crece si una clave cae
+# fuera de él, y los nodos viven en un pool preasignado con lista de libres.
+
+@njit(cache=True)
+def bucket_push(heads, nodes, keys, links, free, cursor, key, g, r, c):
+    """Inserta (g, r, c) en la cubeta 'key'. Devuelve el estado actualizado de la cola."""
+    if key < cursor:
+        key = cursor
+    n_buckets = heads.shape[0]
+    if key - cursor >= n_buckets:
+        while key - cursor >= n_buckets:
+            n_buckets *= 2
+        new_heads = np.full(n_buckets, -1, dtype=np.int64)
+        for slot in range(heads.shape[0]):
+            node = heads[slot]
+            while node != -1:
+                following = links[node]
+                new_slot = keys[node] % n_buckets
+                links[node] = new_heads[new_slot]
+                new_heads[new_slot] = node
+                node = following
+        heads = new_heads
+
+    if free == -1:
+        capacity = nodes.shape[0]
+        grown_nodes = np.empty((capacity * 2, 3), dtype=np.float64)
+        grown_nodes[:capacity] = nodes
+        grown_keys = np.empty(capacity * 2, dtype=np.int64)
+        grown_keys[:capacity] = keys
+        grown_links = np.empty(capacity * 2, dtype=np.int64)
+        grown_links[:capacity] = links
+        for i in range(capacity, capacity * 2 - 1):
+            grown_links[i] = i + 1
+        grown_links[capacity * 2 - 1] = -1
+        nodes, keys, links, free = grown_nodes, grown_keys, grown_links, capacity
+
+    node = free
+    free = links[node]
+    nodes[node, 0] = g
+    nodes[node, 1] = r
+    nodes[node, 2] = c
+    keys[node] = key
+    slot = key % heads.shape[0]
+    links[node] = heads[slot]
+    heads[slot] = node
+    return heads, nodes, keys, links, free
+
+@njit(cache=True)
+def bucket_pop(heads, nodes, keys, links, free, cursor):
+    """Extrae una entrada de la cubeta no vacía más baja. Requiere una cola no vacía."""
+    n_buckets = heads.shape[0]
+    while heads[cursor % n_buckets] == -1:
+        cursor += 1
+    slot = cursor % n_buckets
+    node = heads[slot]
+    heads[slot] = links[node]
+    links[node] = free
+    free = node
+    return nodes[node, 0], int(nodes[node, 1]), int(nodes[node, 2]), free, cursor
+
+# --- Búsqueda A* ---
+
+# Código de dirección de 'came_from' para "sin predecesor" en el estado compacto (uint8)
+NO_DIRECTION_U8 = 255
+
+def new_search_state(shape, compact=False):
+    """
+    Crea los arrays de estado de una búsqueda: (g_cost, came_from).
+    Estándar: float64 / int16 con -1. Compacto: float32 / uint8 con NO_DIRECTION_U8,
+    un 40 % de la memoria; los costos acumulados se redondean a float32.
+    """
+    if compact:
+        return np.full(shape, np.inf, dtype=np.float32), np.full(shape, NO_DIRECTION_U8, dtype=np.uint8)
+    return np.full(shape, np.inf, dtype=np.float64), np.full(shape, -1, dtype=np.int16)
+
+def a_star_search(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask,
+                  queue='heap', bucket_width=1.0, compact_state=False, landmarks=None, stats=None,
+                  edge_cost=None, memo=None, memo_offset=(0, 0), passable=None):
+    """
+    Algoritmo A* sobre el raster de costo, restringido a 'search_mask'.
+
+    'queue' elige la cola de prioridad del open set:
+      - 'heap': montículo binario. Rutas idénticas a la implementación original.
+      - 'bucket': cola de cubetas con claves floor(f / bucket_width), pensada para
+        costos cuantizados a enteros. Dentro de una cubeta el orden es arbitrario,
+        así que el costo de la ruta puede superar al óptimo en menos de 'bucket_width'.
+
+    'compact_state' usa float32 para los costos acumulados y uint8 para las direcciones
+    (ver 'new_search_state'); conviene en búsquedas sin recortar sobre rasters grandes.
+
+    'landmarks' son los argumentos de 'landmarks.Landmarks.heuristic_args'; la heurística pasa
+    a ser el máximo entre la distancia euclidiana y la cota ALT, que sigue siendo admisible.
+
+    'stats' (de 'new_search_stats') acumula los contadores de la búsqueda; con None no se cuenta nada.
+
+    'edge_cost' (un 'cost_functions.EdgeCost' o su nombre, p. ej. 'tobler') hace de 'cost_array'
+    un MDE: el costo de cada arista depende del desnivel y del sentido, y se calcula al expandir
+    (ver 'a_star_dem'). Solo con la cola 'heap' y sin landmarks; 'memo' es un
+    'cost_functions.EdgeCostMemo' opcional del MDE en el que 'cost_array' empieza en 'memo_offset'.
+
+    Con la cola 'heap' la búsqueda recorre el raster de transitabilidad de
+    'processing.build_passability'. Si varias búsquedas comparten costo, máscara y origen,
+    se puede construir una vez y pasarlo en 'passable'; si no, se construye aquí.
+
+    Devuelve (path_found, came_from).
+    """
+    g_cost, came_from = new_search_state(cost_array.shape, compact_state)
+    if edge_cost is not None:
+        if queue != 'heap' or landmarks is not None:
+            raise ValueError("Los costos sobre un MDE ('edge_cost') solo admiten la cola 'heap' y no usan landmarks.")
+        g_cost[start_pixel] = 0.0
+        path_found = dem_search(cost_array, nodata_value, np.array([start_pixel], dtype=np.int64), end_pixel, dx, dy, weight, search_mask,
+                                g_cost, came_from, edge_cost, memo, memo_offset, stats)
+        return path_found, came_from
+    if landmarks is None:
+        landmarks = NO_LANDMARKS
+    if queue == 'heap':
+        if passable is None:
+            passable = build_passability(cost_array, nodata_value, search_mask, include_pixels=(start_pixel,))
+        path_found, _ = a_star_heap(passable, start_pixel, end_pixel, dx, dy, weight, g_cost, came_from, landmarks, NO_TOUCHED, stats)
+    elif queue == 'bucket':
+        if bucket_width <= 0:
+            raise ValueError(f"El ancho de cubeta debe ser positivo (se recibió {bucket_width}).")
+        path_found = a_star_bucket(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask, g_cost, came_from, landmarks, float(bucket_width), stats)
+    else:
+        raise ValueError(f"Cola de prioridad desconocida: '{queue}'. Use 'heap' o 'bucket'.")
+    return path_found, came_from
+
+@njit(cache=True, nogil=True)
+def a_star_heap(passable, start_pixel, end_pixel, dx, dy, weight, g_cost, came_from, landmarks, touched, stats):
     """
     Implementación del algoritmo A* fiel al script original.
-    Optimizada con Numba.
+    Optimizada con Numba y un montículo binario preasignado, sobre el raster de
+    transitabilidad 'passable' ('processing.build_passability'); las coordenadas son las del
+    raster de costo, sin el borde. Escribe sobre 'g_cost' y 'came_from' (ver 'new_search_state'), que deben llegar en su
+    estado inicial. Si 'touched' no está vacío (tamaño del raster), guarda en él los índices
+    planos de las celdas escritas para restaurarlas sin recorrer todo el raster.
+    Si 'stats' no es None, acumula en él los contadores (ver 'new_search_stats').
+    Devuelve (path_found, número de celdas en 'touched').
     """
-    height, width = cost_array.shape
-    g_cost = np.full(cost_array.shape, np.inf, dtype=np.float64)
-    came_from = np.full(cost_array.shape, -1, dtype=np.int16)
-    
-    open_set = np.zeros((1, 4), dtype=np.float64)
-    h_initial = heuristic_numba(start_pixel[0], start_pixel[1], end_pixel[0], end_pixel[1], dx, dy)
-    open_set[0] = [h_initial * weight, 0.0, start_pixel[0], start_pixel[1]]
+    height, width = g_cost.shape
+    n_touched = 0
+
+    heap = np.empty((max(64, 4 * (height + width)), 5), dtype=np.float64)
+    h_initial = max(heuristic_numba(start_pixel[0], start_pixel[1], end_pixel[0], end_pixel[1], dx, dy),
+                    landmark_bound(start_pixel[0], start_pixel[1], landmarks))
+    heap, size = heap_push(heap, 0, h_initial * weight, 0.0, 0.0, start_pixel[0], start_pixel[1])
     g_cost[start_pixel] = 0.0
+    if stats is not None:
+        stats[STAT_PUSHED] += 1
+        stats[STAT_PEAK_OPEN] = max(stats[STAT_PEAK_OPEN], size)
+    if touched.shape[0] > 0:
+        touched[0] = start_pixel[0] * width + start_pixel[1]
+        n_touched = 1
+    return a_star_expand(passable, end_pixel, dx, dy, weight, g_cost, came_from, landmarks,
+                         heap, size, 1.0, touched, n_touched, stats)
+
+@njit(cache=True, nogil=True)
+def a_star_resume(passable, seeds, end_pixel, dx, dy, weight, g_cost, came_from, landmarks, stats):
+    """
+    A* que parte de varios píxeles 'seeds' (array (n, 2)) con los costos ya escritos en 'g_cost';
+    el resto de 'g_cost' y 'came_from' puede traer costos de una búsqueda anterior, que se
+    toman como cotas superiores y se mejoran si se encuentra un camino más barato.
+    Con un único píxel de costo 0 es un A* normal desde él. Devuelve path_found.
+    """
+    height, width = g_cost.shape
+    heap = np.empty((max(64, 4 * (height + width), 2 * seeds.shape[0]), 5), dtype=np.float64)
+    size = 0
+    order = 0.0
+    for i in range(seeds.shape[0]):
+        r, c = seeds[i, 0], seeds[i, 1]
+        h = max(heuristic_numba(r, c, end_pixel[0], end_pixel[1], dx, dy), landmark_bound(r, c, landmarks))
+        heap, size = heap_push(heap, size, g_cost[r, c] + h * weight, order, g_cost[r, c], r, c)
+        order += 1.0
+    if stats is not None:
+        stats[STAT_PUSHED] += size
+        stats[STAT_PEAK_OPEN] = max(stats[STAT_PEAK_OPEN], size)
+    path_found, _ = a_star_expand(passable, end_pixel, dx, dy, weight, g_cost, came_from, landmarks,
+                                  heap, size, order, np.empty(0, dtype=np.int64), 0, stats)
+    return path_found
+
+@njit(cache=True)
+def a_star_expand(passable, end_pixel, dx, dy, weight, g_cost, came_from, landmarks,
+                  heap, size, order, touched, n_touched, stats):
+    """
+    Bucle principal de A*: extrae nodos del montículo 'heap' (con 'size' elementos) y expande
+    sus vecinos hasta extraer 'end_pixel' o vaciar el open set. Devuelve (path_found, n_touched).
+    El borde de 'passable' es intransitable, así que no hace falta comprobar los límites: un
+    vecino con costo distinto de IMPASSABLE está dentro del raster y de la máscara.
+    """
+    width = g_cost.shape[1]
+    record = touched.shape[0] > 0
     path_found = False
 
-    while open_set.shape[0] > 0:
-        min_idx = np.argmin(open_set[:, 0])
-        f, g, r, c = open_set[min_idx]
-        current_pos = (int(r), int(c))
+    while size > 0:
+        f, g, r, c, size = heap_pop(heap, size)
+        current_pos = (r, c)
+        if stats is not None:
+            stats[STAT_POPPED] += 1
 
-        if open_set.shape[0] == 1:
-            open_set = np.zeros((0, 4), dtype=np.float64)
-        else:
-            open_set = np.vstack((open_set[:min_idx], open_set[min_idx + 1:]))
+        if current_pos == end_pixel:
+            path_found = True
+            break
+
+        if g > g_cost[current_pos]:
+            if stats is not None:
+                stats[STAT_STALE] += 1
+            continue
+
+        cost_current = passable[r + 1, c + 1]
+        for dr in range(-1, 2):
+            for dc in range(-1, 2):
+                if dr == 0 and dc == 0:
+                    continue
+
+                cost_neighbor = passable[r + 1 + dr, c + 1 + dc]
+                if cost_neighbor == IMPASSABLE:
+                    continue
+                neighbor_pos = (r + dr, c + dc)
+
+                dist_m = math.sqrt((dr * dy)**2 + (dc * dx)**2)
+                avg_cost = (cost_current + cost_neighbor) / 2.0
+                tentative_g_cost = g + (avg_cost * dist_m)
+
+                if tentative_g_cost < g_cost[neighbor_pos]:
+                    if record and g_cost[neighbor_pos] == np.inf:
+                        touched[n_touched] = neighbor_pos[0] * width + neighbor_pos[1]
+                        n_touched += 1
+                    direction = (dr + 1) * 3 + (dc + 1)
+                    came_from[neighbor_pos] = direction
+                    g_cost[neighbor_pos] = tentative_g_cost
+                    tentative_g_cost = g_cost[neighbor_pos]  # Valor almacenado (float32 en estado compacto)
+                    h = heuristic_numba(neighbor_pos[0], neighbor_pos[1], end_pixel[0], end_pixel[1], dx, dy)
+                    if landmarks[0].shape[0] > 0:
+                        # Pathmax: la cota por bloques no es consistente; h(v) >= h(u) - costo(u, v)
+                        h = max(h, landmark_bound(neighbor_pos[0], neighbor_pos[1], landmarks))
+                        if np.isfinite(f):
+                            h = max(h, (f - g) / weight - avg_cost * dist_m)
+                    new_f_cost = tentative_g_cost + (h * weight)
+                    heap, size = heap_push(heap, size, new_f_cost, order, tentative_g_cost, neighbor_pos[0], neighbor_pos[1])
+                    order += 1.0
+                    if stats is not None:
+                        stats[STAT_PUSHED] += 1
+                        if size > stats[STAT_PEAK_OPEN]:
+                            stats[STAT_PEAK_OPEN] = size
+
+    return path_found, n_touched
+
+@njit(cache=True, nogil=True)
+def a_star_bucket(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask, g_cost, came_from, landmarks, bucket_width, stats):
+    """Variante de A* con cola de cubetas; ver 'a_star_search'."""
+    height, width = cost_array.shape
+
+    capacity = max(64, 4 * (height + width))
+    heads = np.full(1024, -1, dtype=np.int64)
+    nodes = np.empty((capacity, 3), dtype=np.float64)
+    keys = np.empty(capacity, dtype=np.int64)
+    links = np.arange(1, capacity + 1).astype(np.int64)
+    links[capacity - 1] = -1
+    free = 0
+
+    h_initial = max(heuristic_numba(start_pixel[0], start_pixel[1], end_pixel[0], end_pixel[1], dx, dy),
+                    landmark_bound(start_pixel[0], start_pixel[1], landmarks))
+    cursor = int(h_initial * weight / bucket_width)
+    heads, nodes, keys, links, free = bucket_push(heads, nodes, keys, links, free, cursor, cursor, 0.0, start_pixel[0], start_pixel[1])
+    size = 1
+    g_cost[start_pixel] = 0.0
+    path_found = False
+    if stats is not None:
+        stats[STAT_PUSHED] += 1
+        stats[STAT_PEAK_OPEN] = max(stats[STAT_PEAK_OPEN], size)
+
+    while size > 0:
+        g, r, c, free, cursor = bucket_pop(heads, nodes, keys, links, free, cursor)
+        size -= 1
+        current_pos = (r, c)
+        if stats is not None:
+            stats[STAT_POPPED] += 1
 
         if current_pos == end_pixel:
             path_found = True
             break
-        
+
         if g > g_cost[current_pos]:
+            if stats is not None:
+                stats[STAT_STALE] += 1
             continue
 
         cost_current = cost_array[current_pos]
@@ -47,14 +405,14 @@ def a_star_search(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weig
             for dc in range(-1, 2):
                 if dr == 0 and dc == 0:
                     continue
-                
+
                 neighbor_pos = (current_pos[0] + dr, current_pos[1] + dc)
-                
+
                 if not (0 <= neighbor_pos[0] < height and 0 <= neighbor_pos[1] < width):
                     continue
                 if not search_mask[neighbor_pos]:
                     continue
-                
+
                 cost_neighbor = cost_array[neighbor_pos]
                 if cost_neighbor == nodata_value or np.isinf(cost_neighbor) or np.isnan(cost_neighbor):
                     continue
@@ -67,17 +425,631 @@ def a_star_search(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weig
                     direction = (dr + 1) * 3 + (dc + 1)
                     came_from[neighbor_pos] = direction
                     g_cost[neighbor_pos] = tentative_g_cost
+                    tentative_g_cost = g_cost[neighbor_pos]  # Valor almacenado (float32 en estado compacto)
                     h = heuristic_numba(neighbor_pos[0], neighbor_pos[1], end_pixel[0], end_pixel[1], dx, dy)
-                    new_f_cost = tentative_g_cost + (h * weight)
-                    
-                    new_entry = np.array([[new_f_cost, tentative_g_cost, float(neighbor_pos[0]), float(neighbor_pos[1])]])
-                    open_set = np.vstack((open_set, new_entry))
-                    
-    return path_found, came_from
+                    if landmarks[0].shape[0] > 0:
+                        h = max(h, landmark_bound(neighbor_pos[0], neighbor_pos[1], landmarks))
+                    key = int((tentative_g_cost + (h * weight)) / bucket_width)
+                    heads, nodes, keys, links, free = bucket_push(heads, nodes, keys, links, free, cursor, key, tentative_g_cost, neighbor_pos[0], neighbor_pos[1])
+                    size += 1
+                    if stats is not None:
+                        stats[STAT_PUSHED] += 1
+                        if size > stats[STAT_PEAK_OPEN]:
+                            stats[STAT_PEAK_OPEN] = size
+
+    return path_found
+
+# --- Búsqueda A* bidireccional ---
+
+def bidirectional_a_star_search(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask,
+                                compact_state=False, stats=None):
+    """
+    A* bidireccional: una búsqueda hacia adelante desde el origen y otra hacia atrás desde
+    el destino, con los mismos argumentos que 'a_star_search'. Como el costo de cada
+    arista es simétrico, ambas usan el mismo raster. Las dos búsquedas usan el potencial
+    promedio p(v) = weight * (h(v, destino) - h(v, origen)) / 2 (+p hacia adelante, -p
+    hacia atrás), con el que se puede parar en cuanto clave_min_adelante + clave_min_atrás
+    >= mejor costo de encuentro. Con weight = 1 el costo es el mismo que el de 'a_star_search'.
+    'stats' suma los contadores de ambas búsquedas; el pico es el de los dos open sets juntos.
+
+    Devuelve (path_found, came_from_fwd, came_from_bwd, meeting_pixel); la ruta completa
+    se obtiene con 'reconstruct_bidirectional_path'.
+    """
+    g_fwd, came_from_fwd = new_search_state(cost_array.shape, compact_state)
+    g_bwd, came_from_bwd = new_search_state(cost_array.shape, compact_state)
+
+    # El destino debe estar dentro del raster y ser transitable, igual que en la búsqueda hacia adelante
+    if start_pixel != end_pixel:
+        if not (0 <= end_pixel[0] < cost_array.shape[0] and 0 <= end_pixel[1] < cost_array.shape[1]):
+            return False, came_from_fwd, came_from_bwd, None
+        end_value = cost_array[end_pixel]
+        if not search_mask[end_pixel] or end_value == nodata_value or not np.isfinite(end_value):
+            return False, came_from_fwd, came_from_bwd, None
+
+    path_found, meet_r, meet_c = bidirectional_a_star_heap(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight,
+                                                           search_mask, g_fwd, came_from_fwd, g_bwd, came_from_bwd, stats)
+    return path_found, came_from_fwd, came_from_bwd, (meet_r, meet_c) if path_found else None
+
+def reconstruct_bidirectional_path(came_from_fwd, came_from_bwd, start_pixel, end_pixel, meeting_pixel):
+    """Une la ruta origen -> encuentro (búsqueda hacia adelante) con encuentro -> destino (hacia atrás)."""
+    forward = reconstruct_path(came_from_fwd, start_pixel, meeting_pixel)
+    backward = reconstruct_path(came_from_bwd, end_pixel, meeting_pixel)
+    if forward is None or backward is None:
+        return None
+    return np.concatenate((forward, backward[::-1][1:]))
+
+def find_path(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask,
+              algorithm='astar', compact_state=False, landmarks=None, stats=None, edge_cost=None, memo=None, memo_offset=(0, 0),
+              passable=None):
+    """
+    Busca una ruta con el algoritmo indicado y la reconstruye.
+    'algorithm' es 'astar' (A* unidireccional) o 'bidireccional'. 'landmarks' (heurística
+    ALT, ver 'a_star_search') solo se aplica con 'astar'; 'stats' acumula los contadores de la búsqueda.
+    'edge_cost', 'memo' y 'memo_offset' (costos sobre un MDE) y 'passable' (raster de transitabilidad
+    ya construido), ver 'a_star_search', solo con 'astar'.
+    Devuelve el array de píxeles (fila, columna) de la ruta, o None si no se encontró.
+    """
+    if algorithm == 'astar':
+        path_found, came_from = a_star_search(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask,
+                                              compact_state=compact_state, landmarks=landmarks, stats=stats,
+                                              edge_cost=edge_cost, memo=memo, memo_offset=memo_offset, passable=passable)
+        return reconstruct_path(came_from, start_pixel, end_pixel) if path_found else None
+    if edge_cost is not None:
+        raise ValueError("Con costos sobre un MDE el costo de cada arista depende del sentido: use el algoritmo 'astar'.")
+    if algorithm == 'bidireccional':
+        path_found, came_from_fwd, came_from_bwd, meeting_pixel = bidirectional_a_star_search(
+            cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask, compact_state=compact_state, stats=stats)
+        return reconstruct_bidirectional_path(came_from_fwd, came_from_bwd, start_pixel, end_pixel, meeting_pixel) if path_found else None
+    raise ValueError(f"Algoritmo de búsqueda desconocido: '{algorithm}'. Use 'astar' o 'bidireccional'.")
+
+# --- Corredores que se amplían ---
+
+def widen_search_state(state, offset, search_mask, compact=False):
+    """
+    Traslada el estado (g_cost, came_from, máscara) de una búsqueda fallida de 'corridor_search'
+    a una ventana mayor con máscara 'search_mask', en la que la ventana anterior empieza en
+    'offset' (fila, columna). Como la búsqueda agotó su open set, sus costos son exactos dentro
+    de la máscara anterior: basta reanudarla desde los píxeles asentados vecinos de los que la
+    nueva máscara habilita. Devuelve (g_cost, came_from, semillas).
+    """
+    g_previous, came_previous, mask_previous = state
+    rows = slice(offset[0], offset[0] + mask_previous.shape[0])
+    cols = slice(offset[1], offset[1] + mask_previous.shape[1])
+    g_cost, came_from = new_search_state(search_mask.shape, compact)
+    g_cost[rows, cols] = g_previous
+    came_from[rows, cols] = came_previous
+
+    opened = search_mask.copy()
+    opened[rows, cols] &= ~mask_previous
+    near = opened.copy()
+    near[1:] |= opened[:-1]
+    near[:-1] |= opened[1:]
+    near_rows = near.copy()
+    near[:, 1:] |= near_rows[:, :-1]
+    near[:, :-1] |= near_rows[:, 1:]
+    seeds = np.argwhere(near & np.isfinite(g_cost)).astype(np.int64)
+    return g_cost, came_from, seeds
+
+def corridor_search(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask,
+                    landmarks=None, previous=None, offset=(0, 0), compact_state=False, stats=None,
+                    edge_cost=None, memo=None, memo_offset=(0, 0), passable=None):
+    """
+    A* que se puede reanudar en un corredor más ancho. Con 'previous' (el estado devuelto por una
+    búsqueda fallida cuyo corredor, contenido en este, empieza en 'offset') no vuelve a expandir
+    el área ya asentada, sino que sigue desde su frontera; el costo de la ruta es el mismo que el
+    de una búsqueda nueva. Sin 'previous' da la misma ruta que 'find_path' con 'astar'.
+    'edge_cost', 'memo' y 'memo_offset': costos sobre un MDE, y 'passable': raster de
+    transitabilidad ya construido, como en 'a_star_search'.
+    Devuelve (ruta o None, estado para reanudarla o None si se encontró la ruta).
+    """
+    if landmarks is None:
+        landmarks = NO_LANDMARKS
+    if previous is None:
+        g_cost, came_from = new_search_state(search_mask.shape, compact_state)
+        g_cost[start_pixel] = 0.0
+        seeds = np.array([start_pixel], dtype=np.int64)
+    else:
+        g_cost, came_from, seeds = widen_search_state(previous, offset, search_mask, compact_state)
+    if edge_cost is not None:
+        if landmarks is not NO_LANDMARKS:
+            raise ValueError("Los costos sobre un MDE ('edge_cost') no usan landmarks.")
+        path_found = dem_search(cost_array, nodata_value, seeds, end_pixel, dx, dy, weight, search_mask, g_cost, came_from,
+                                edge_cost, memo, memo_offset, stats)
+    else:
+        if passable is None:
+            passable = build_passability(cost_array, nodata_value, search_mask, include_pixels=(start_pixel,))
+        path_found = a_star_resume(passable, seeds, end_pixel, dx, dy, weight, g_cost, came_from, landmarks, stats)
+    if path_found:
+        return reconstruct_path(came_from, start_pixel, end_pixel), None
+    return None, (g_cost, came_from, search_mask)
+
+# --- A* con costos anisotrópicos sobre un MDE ---
+# 'cost_array' es un MDE y el costo de cada arista lo da una función de 'cost_functions'
+# evaluada al expandir el nodo. Estos núcleos reciben la función como argumento y Numba no
+# guarda en disco esas versiones: se compilan una vez por proceso y función de costo.
+
+def dem_search(dem, nodata_value, seeds, end_pixel, dx, dy, weight, search_mask, g_cost, came_from,
+               edge_cost, memo=None, memo_offset=(0, 0), stats=None):
+    """
+    Ejecuta 'a_star_dem' con un 'cost_functions.EdgeCost' (o su nombre) y, si se indica, un
+    'cost_functions.EdgeCostMemo' del MDE en el que este recorte empieza en 'memo_offset'.
+    Devuelve path_found.
+    """
+    edge_cost = cf.get_edge_cost(edge_cost)
+    memo_slots, memo_pool, memo_used, memo_tile_size = cf.NO_MEMO if memo is None else memo.args()
+    path_found, memo_pool, memo_used = a_star_dem(dem, nodata_value, seeds, end_pixel, dx, dy, weight, search_mask, g_cost, came_from,
+                                                  edge_cost.function, edge_cost.min_cost_per_m, memo_slots, memo_pool, memo_used, memo_tile_size,
+                                                  (int(memo_offset[0]), int(memo_offset[1])), stats)
+    if memo is not None:
+        memo.update(memo_pool, memo_used)
+    return path_found
+
+@njit(nogil=True)
+def a_star_dem(dem, nodata_value, seeds, end_pixel, dx, dy, weight, search_mask, g_cost, came_from, edge_function, h_per_m,
+               memo_slots, memo_pool, memo_used, memo_tile_size, memo_offset, stats):
+    """
+    A* desde los píxeles 'seeds' (como 'a_star_resume') con el costo de la arista u -> v igual a
+    edge_function(z_u, z_v, dist_m), que debe ser positivo. La heurística es la distancia
+    euclidiana por 'h_per_m', el menor costo por metro de la función: así es consistente.
+    Si 'memo_slots' no está vacío, los costos calculados se guardan en las teselas del memo
+    (ver 'cost_functions.EdgeCostMemo') y se reutilizan. Devuelve (path_found, pool, teselas usadas).
+    """
+    height, width = dem.shape
+    use_memo = memo_slots.shape[0] > 0
+    slot, tile_r, tile_c, local_r, local_c = -1, -1, -1, 0, 0
+
+    heap = np.empty((max(64, 4 * (height + width), 2 * seeds.shape[0]), 5), dtype=np.float64)
+    size = 0
+    order = 0.0
+    for i in range(seeds.shape[0]):
+        r, c = seeds[i, 0], seeds[i, 1]
+        h = heuristic_numba(r, c, end_pixel[0], end_pixel[1], dx, dy) * h_per_m
+        heap, size = heap_push(heap, size, g_cost[r, c] + h * weight, order, g_cost[r, c], r, c)
+        order += 1.0
+    if stats is not None:
+        stats[STAT_PUSHED] += size
+        stats[STAT_PEAK_OPEN] = max(stats[STAT_PEAK_OPEN], size)
+
+    path_found = False
+    while size > 0:
+        f, g, r, c, size = heap_pop(heap, size)
+        if stats is not None:
+            stats[STAT_POPPED] += 1
+
+        if r == end_pixel[0] and c == end_pixel[1]:
+            path_found = True
+            break
+
+        if g > g_cost[r, c]:
+            if stats is not None:
+                stats[STAT_STALE] += 1
+            continue
+
+        z_current = dem[r, c]
+        if use_memo:
+            global_r, global_c = r + memo_offset[0], c + memo_offset[1]
+            if global_r // memo_tile_size != tile_r or global_c // memo_tile_size != tile_c:
+                tile_r, tile_c = global_r // memo_tile_size, global_c // memo_tile_size
+                slot, memo_pool, memo_used = memo_tile(memo_slots, memo_pool, memo_used, tile_r, tile_c)
+            local_r, local_c = global_r % memo_tile_size, global_c % memo_tile_size
+
+        for dr in range(-1, 2):
+            for dc in range(-1, 2):
+                if dr == 0 and dc == 0:
+                    continue
+                nr, nc = r + dr, c + dc
+                if not (0 <= nr < height and 0 <= nc < width):
+                    continue
+                if not search_mask[nr, nc]:
+                    continue
+                z_neighbor = dem[nr, nc]
+                if z_neighbor == nodata_value or np.isinf(z_neighbor) or np.isnan(z_neighbor):
+                    continue
+
+                direction = (dr + 1) * 3 + (dc + 1)
+                if use_memo:
+                    k = direction if direction < 4 else direction - 1
+                    edge = memo_pool[slot, local_r, local_c, k]
+                    if np.isnan(edge):
+                        memo_pool[slot, local_r, local_c, k] = edge_function(z_current, z_neighbor, math.sqrt((dr * dy)**2 + (dc * dx)**2))
+                        edge = memo_pool[slot, local_r, local_c, k]  # Valor guardado (float32): igual en todas las búsquedas
+                else:
+                    edge = edge_function(z_current, z_neighbor, math.sqrt((dr * dy)**2 + (dc * dx)**2))
+                tentative_g_cost = g + edge
+
+                if tentative_g_cost < g_cost[nr, nc]:
+                    came_from[nr, nc] = direction
+                    g_cost[nr, nc] = tentative_g_cost
+                    tentative_g_cost = g_cost[nr, nc]  # Valor almacenado (float32 en estado compacto)
+                    h = heuristic_numba(nr, nc, end_pixel[0], end_pixel[1], dx, dy) * h_per_m
+                    heap, size = heap_push(heap, size, tentative_g_cost + h * weight, order, tentative_g_cost, nr, nc)
+                    order += 1.0
+                    if stats is not None:
+                        stats[STAT_PUSHED] += 1
+                        if size > stats[STAT_PEAK_OPEN]:
+                            stats[STAT_PEAK_OPEN] = size
+
+    return path_found, memo_pool, memo_used
+
+def dem_path_cost(dem, path, dx, dy, edge_cost):
+    """Costo de una ruta sobre un MDE con la misma función de arista que 'dem_search'."""
+    return dem_path_cost_kernel(dem, path, dx, dy, cf.get_edge_cost(edge_cost).function)
+
+@njit(nogil=True)
+def dem_path_cost_kernel(dem, path, dx, dy, edge_function):
+    total = 0.0
+    for i in range(1, path.shape[0]):
+        r0, c0, r1, c1 = path[i - 1, 0], path[i - 1, 1], path[i, 0], path[i, 1]
+        total += edge_function(dem[r0, c0], dem[r1, c1], math.sqrt(((r1 - r0) * dy)**2 + ((c1 - c0) * dx)**2))
+    return total
+
+# --- Búsqueda por lotes ---
+
+def a_star_batch(cost_array, nodata_value, start_pixels, end_pixels, dx, dy, weight, search_mask,
+                 threads=None, path_capacity=None):
+    """
+    Resuelve muchos pares origen/destino (arrays N x 2 de píxeles) con una sola llamada
+    compilada, repartidos entre hilos con numba.prange. Cada hilo reutiliza sus propios
+    arrays de estado y solo restaura las celdas que tocó cada búsqueda. Las rutas son las
+    mismas que las de 'a_star_search' (montículo, sin landmarks).
+
+    'path_capacity' es el espacio reservado por ruta para las coordenadas (por defecto
+    2 * (alto + ancho)); las rutas de un hilo lo comparten y las que no caben se
+    resuelven después de forma individual.
+
+    Devuelve (found, costs, offsets, coords): la ruta i es coords[offsets[i]:offsets[i + 1]]
+    (vacía si found[i] es False) y costs[i] su costo acumulado (inf si no hay ruta).
+    """
+    start_pixels = np.ascontiguousarray(start_pixels, dtype=np.int64).reshape(-1, 2)
+    end_pixels = np.ascontiguousarray(end_pixels, dtype=np.int64).reshape(-1, 2)
+    if start_pixels.shape != end_pixels.shape:
+        raise ValueError(f"Se recibieron {len(start_pixels)} orígenes y {len(end_pixels)} destinos.")
+    n_chunks = max(1, min(threads or numba.get_num_threads(), len(start_pixels)))
+    if path_capacity is None:
+        path_capacity = 2 * (cost_array.shape[0] + cost_array.shape[1])
+
+    # Un único raster de transitabilidad sin los orígenes; cada búsqueda deja transitable solo
+    # el suyo (como 'include_pixels' en 'a_star_search'), con el costo de 'start_values'
+    passable = build_passability(cost_array, nodata_value, search_mask)
+    start_values = cost_array[start_pixels[:, 0], start_pixels[:, 1]].astype(passable.dtype)
+    invalid = ~np.isfinite(start_values)
+    if nodata_value is not None:
+        invalid |= start_values == nodata_value
+    start_values[invalid] = IMPASSABLE
+    found, costs, lengths, positions, chunk_coords = a_star_batch_kernel(
+        passable, start_pixels, start_values, end_pixels, dx, dy, weight, NO_LANDMARKS, n_chunks, int(path_capacity))
+
+    # Rutas que no cupieron en el espacio de su hilo
+    overflow = {}
+    for i in np.flatnonzero(found & (positions < 0)):
+        start, end = (int(start_pixels[i, 0]), int(start_pixels[i, 1])), (int(end_pixels[i, 0]), int(end_pixels[i, 1]))
+        overflow[i] = find_path(cost_array, nodata_value, start, end, dx, dy, weight, search_mask)
+        lengths[i] = len(overflow[i])
+
+    offsets = np.zeros(len(start_pixels) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    coords = gather_paths(chunk_coords, positions, lengths, offsets, n_chunks)
+    for i, path in overflow.items():
+        coords[offsets[i]:offsets[i + 1]] = path
+    return found, costs, offsets, coords
+
+@njit(parallel=True, cache=True, nogil=True)
+def a_star_batch_kernel(passable, start_pixels, start_values, end_pixels, dx, dy, weight, landmarks, n_chunks, path_capacity):
+    """
+    Núcleo de 'a_star_batch': el bloque k resuelve las rutas k, k + n_chunks, ... con su propio
+    estado y escribe cada ruta en su tramo de 'chunk_coords'. 'positions[i]' es el inicio de la
+    ruta i dentro de su tramo (-1 si no cupo o no existe). Cada bloque busca sobre su propia
+    copia de 'passable', en la que el origen de la ruta en curso vale 'start_values[i]'
+    mientras dura su búsqueda.
+    """
+    height, width = passable.shape[0] - 2, passable.shape[1] - 2
+    n_routes = start_pixels.shape[0]
+    found = np.zeros(n_routes, dtype=np.bool_)
+    costs = np.full(n_routes, np.inf, dtype=np.float64)
+    lengths = np.zeros(n_routes, dtype=np.int64)
+    positions = np.full(n_routes, -1, dtype=np.int64)
+    chunk_capacity = (n_routes // n_chunks + 1) * path_capacity
+    chunk_coords = np.empty((n_chunks, chunk_capacity, 2), dtype=np.int32)
+
+    for k in prange(n_chunks):
+        own_passable = passable.copy()
+        g_cost = np.full((height, width), np.inf, dtype=np.float64)
+        came_from = np.full((height, width), -1, dtype=np.int16)
+        touched = np.empty(height * width, dtype=np.int64)
+        g_flat = g_cost.reshape(-1)
+        came_flat = came_from.reshape(-1)
+        used = 0
+
+        for i in range(k, n_routes, n_chunks):
+            start = (start_pixels[i, 0], start_pixels[i, 1])
+            end = (end_pixels[i, 0], end_pixels[i, 1])
+            saved = own_passable[start[0] + 1, start[1] + 1]
+            own_passable[start[0] + 1, start[1] + 1] = start_values[i]
+            path_found, n_touched = a_star_heap(own_passable, start, end, dx, dy, weight, g_cost, came_from, landmarks, touched, None)
+            own_passable[start[0] + 1, start[1] + 1] = saved
+            if path_found:
+                found[i] = True
+                costs[i] = g_cost[end]
+
+                # Reconstrucción hacia atrás directamente en el tramo del bloque
+                r, c = end
+                count = 0
+                complete = False
+                while used + count < chunk_capacity:
+                    chunk_coords[k, used + count, 0] = r
+                    chunk_coords[k, used + count, 1] = c
+                    count += 1
+                    if r == start[0] and c == start[1]:
+                        complete = True
+                        break
+                    direction = came_from[r, c]
+                    r -= (direction // 3) - 1
+                    c -= (direction % 3) - 1
+                if complete:
+                    chunk_coords[k, used:used + count] = chunk_coords[k, used:used + count][::-1].copy()
+                    positions[i] = used
+                    lengths[i] = count
+                    used += count
+
+            for t in range(n_touched):
+                g_flat[touched[t]] = np.inf
+                came_flat[touched[t]] = -1
+
+    return found, costs, lengths, positions, chunk_coords
+
+@njit(cache=True)
+def gather_paths(chunk_coords, positions, lengths, offsets, n_chunks):
+    """Copia las rutas de los tramos de cada bloque a un único array contiguo."""
+    coords = np.empty((offsets[-1], 2), dtype=np.int32)
+    for i in range(positions.shape[0]):
+        if positions[i] >= 0:
+            coords[offsets[i]:offsets[i + 1]] = chunk_coords[i % n_chunks, positions[i]:positions[i] + lengths[i]]
+    return coords
+
+@njit(cache=True)
+def bidirectional_potential(r, c, start_pixel, end_pixel, dx, dy, weight):
+    """Potencial promedio de la búsqueda hacia adelante (la de atrás usa su opuesto)."""
+    return weight * (heuristic_numba(r, c, end_pixel[0], end_pixel[1], dx, dy) -
+                     heuristic_numba(r, c, start_pixel[0], start_pixel[1], dx, dy)) / 2.0
+
+@njit(cache=True)
+def bidirectional_step(cost_array, nodata_value, search_mask, dx, dy, weight, heap, size, order,
+                       g_cost, came_from, g_other, start_pixel, end_pixel, sign, free_pixel, best_cost, meet_r, meet_c, stats):
+    """Expande un nodo de una de las dos búsquedas (sign = +1 adelante, -1 atrás) y actualiza el mejor encuentro."""
+    height, width = cost_array.shape
+    f, g, r, c, size = heap_pop(heap, size)
+    current_pos = (r, c)
+    if stats is not None:
+        stats[STAT_POPPED] += 1
+    if g > g_cost[current_pos]:
+        if stats is not None:
+            stats[STAT_STALE] += 1
+        return heap, size, order, best_cost, meet_r, meet_c
+
+    cost_current = cost_array[current_pos]
+    for dr in range(-1, 2):
+        for dc in range(-1, 2):
+            if dr == 0 and dc == 0:
+                continue
+
+            neighbor_pos = (current_pos[0] + dr, current_pos[1] + dc)
+
+            if not (0 <= neighbor_pos[0] < height and 0 <= neighbor_pos[1] < width):
+                continue
+            # 'free_pixel' es el origen visto desde la búsqueda hacia atrás: siempre se puede
+            # llegar a él, tal como la búsqueda hacia adelante siempre puede salir de él
+            if neighbor_pos != free_pixel:
+                if not search_mask[neighbor_pos]:
+                    continue
+                cost_neighbor = cost_array[neighbor_pos]
+                if cost_neighbor == nodata_value or np.isinf(cost_neighbor) or np.isnan(cost_neighbor):
+                    continue
+            cost_neighbor = cost_array[neighbor_pos]
+
+            dist_m = math.sqrt((dr * dy)**2 + (dc * dx)**2)
+            avg_cost = (cost_current + cost_neighbor) / 2.0
+            tentative_g_cost = g + (avg_cost * dist_m)
+
+            if tentative_g_cost < g_cost[neighbor_pos]:
+                direction = (dr + 1) * 3 + (dc + 1)
+                came_from[neighbor_pos] = direction
+                g_cost[neighbor_pos] = tentative_g_cost
+                tentative_g_cost = g_cost[neighbor_pos]
+                potential = sign * bidirectional_potential(neighbor_pos[0], neighbor_pos[1], start_pixel, end_pixel, dx, dy, weight)
+                heap, size = heap_push(heap, size, tentative_g_cost + potential, order, tentative_g_cost, neighbor_pos[0], neighbor_pos[1])
+                order += 1.0
+                if stats is not None:
+                    stats[STAT_PUSHED] += 1
+
+                if tentative_g_cost + g_other[neighbor_pos] < best_cost:
+                    best_cost = tentative_g_cost + g_other[neighbor_pos]
+                    meet_r, meet_c = neighbor_pos
+    return heap, size, order, best_cost, meet_r, meet_c
+
+@njit(cache=True, nogil=True)
+def bidirectional_a_star_heap(cost_array, nodata_value, start_pixel, end_pixel, dx, dy, weight, search_mask,
+                              g_fwd, came_from_fwd, g_bwd, came_from_bwd, stats):
+    """Núcleo de 'bidirectional_a_star_search'. Devuelve (path_found, fila_encuentro, columna_encuentro)."""
+    height, width = cost_array.shape
+    if start_pixel == end_pixel:
+        return True, start_pixel[0], start_pixel[1]
+
+    capacity = max(64, 4 * (height + width))
+    heap_fwd = np.empty((capacity, 5), dtype=np.float64)
+    heap_bwd = np.empty((capacity, 5), dtype=np.float64)
+    p_start = bidirectional_potential(start_pixel[0], start_pixel[1], start_pixel, end_pixel, dx, dy, weight)
+    p_end = bidirectional_potential(end_pixel[0], end_pixel[1], start_pixel, end_pixel, dx, dy, weight)
+    heap_fwd, size_fwd = heap_push(heap_fwd, 0, p_start, 0.0, 0.0, start_pixel[0], start_pixel[1])
+    heap_bwd, size_bwd = heap_push(heap_bwd, 0, -p_end, 0.0, 0.0, end_pixel[0], end_pixel[1])
+    order_fwd, order_bwd = 1.0, 1.0
+    g_fwd[start_pixel] = 0.0
+    g_bwd[end_pixel] = 0.0
+    no_pixel = (-1, -1)
+    if stats is not None:
+        stats[STAT_PUSHED] += 2
+        stats[STAT_PEAK_OPEN] = max(stats[STAT_PEAK_OPEN], 2)
+
+    best_cost = np.inf
+    meet_r, meet_c = -1, -1
+    while size_fwd > 0 and size_bwd > 0:
+        # Con potenciales promedio, ninguna ruta por nodos aún abiertos cuesta menos que la suma de claves mínimas
+        if heap_fwd[0, 0] + heap_bwd[0, 0] >= best_cost:
+            break
+        if size_fwd <= size_bwd:
+            heap_fwd, size_fwd, order_fwd, best_cost, meet_r, meet_c = bidirectional_step(
+                cost_array, nodata_value, search_mask, dx, dy, weight, heap_fwd, size_fwd, order_fwd,
+                g_fwd, came_from_fwd, g_bwd, start_pixel, end_pixel, 1.0, no_pixel, best_cost, meet_r, meet_c, stats)
+        else:
+            heap_bwd, size_bwd, order_bwd, best_cost, meet_r, meet_c = bidirectional_step(
+                cost_array, nodata_value, search_mask, dx, dy, weight, heap_bwd, size_bwd, order_bwd,
+                g_bwd, came_from_bwd, g_fwd, start_pixel, end_pixel, -1.0, start_pixel, best_cost, meet_r, meet_c, stats)
+        if stats is not None:
+            if size_fwd + size_bwd > stats[STAT_PEAK_OPEN]:
+                stats[STAT_PEAK_OPEN] = size_fwd + size_bwd
+
+    return best_cost < np.inf, meet_r, meet_c
+
+@njit(cache=True, nogil=True)
+def dijkstra_multi_target(cost_array, nodata_value, start_pixel, target_pixels, dx, dy, search_mask):
+    """
+    Dijkstra de uno a muchos: una sola búsqueda desde 'start_pixel' que se detiene en
+    cuanto todos los destinos alcanzables de 'target_pixels' (array N x 2) quedan asentados.
+    Devuelve (found, came_from, g_cost); 'found[i]' indica si el destino i tiene ruta y
+    cada una se extrae con 'reconstruct_path(came_from, start_pixel, destino)'.
+    Sin destinos (array 0 x 2) la búsqueda recorre toda la zona alcanzable. Los destinos
+    fuera del raster se marcan como no encontrados.
+    """
+    height, width = cost_array.shape
+    g_cost = np.full(cost_array.shape, np.inf, dtype=np.float64)
+    came_from = np.full(cost_array.shape, -1, dtype=np.int16)
+
+    is_target = np.zeros(cost_array.shape, dtype=np.bool_)
+    inside = np.zeros(target_pixels.shape[0], dtype=np.bool_)
+    pending = 0
+    for i in range(target_pixels.shape[0]):
+        r, c = target_pixels[i, 0], target_pixels[i, 1]
+        if not (0 <= r < height and 0 <= c < width):
+            continue
+        inside[i] = True
+        if not is_target[r, c]:
+            is_target[r, c] = True
+            pending += 1
+
+    heap = np.empty((max(64, 4 * (height + width)), 5), dtype=np.float64)
+    heap, size = heap_push(heap, 0, 0.0, 0.0, 0.0, start_pixel[0], start_pixel[1])
+    order = 1.0
+    g_cost[start_pixel] = 0.0
+
+    explore_all = target_pixels.shape[0] == 0
+    while size > 0 and (pending > 0 or explore_all):
+        f, g, r, c, size = heap_pop(heap, size)
+        current_pos = (r, c)
+
+        if g > g_cost[current_pos]:
+            continue
 
-@njit
+        if is_target[current_pos]:
+            is_target[current_pos] = False
+            pending -= 1
+
+        cost_current = cost_array[current_pos]
+        for dr in range(-1, 2):
+            for dc in range(-1, 2):
+                if dr == 0 and dc == 0:
+                    continue
+
+                neighbor_pos = (current_pos[0] + dr, current_pos[1] + dc)
+
+                if not (0 <= neighbor_pos[0] < height and 0 <= neighbor_pos[1] < width):
+                    continue
+                if not search_mask[neighbor_pos]:
+                    continue
+
+                cost_neighbor = cost_array[neighbor_pos]
+                if cost_neighbor == nodata_value or np.isinf(cost_neighbor) or np.isnan(cost_neighbor):
+                    continue
+
+                dist_m = math.sqrt((dr * dy)**2 + (dc * dx)**2)
+                avg_cost = (cost_current + cost_neighbor) / 2.0
+                tentative_g_cost = g + (avg_cost * dist_m)
+
+                if tentative_g_cost < g_cost[neighbor_pos]:
+                    direction = (dr + 1) * 3 + (dc + 1)
+                    came_from[neighbor_pos] = direction
+                    g_cost[neighbor_pos] = tentative_g_cost
+                    heap, size = heap_push(heap, size, tentative_g_cost, order, tentative_g_cost, neighbor_pos[0], neighbor_pos[1])
+                    order += 1.0
+
+    found = np.zeros(target_pixels.shape[0], dtype=np.bool_)
+    for i in range(target_pixels.shape[0]):
+        if inside[i]:
+            found[i] = g_cost[target_pixels[i, 0], target_pixels[i, 1]] < np.inf
+    return found, came_from, g_cost
+
+@njit(cache=True, nogil=True)
+def dijkstra_multi_source(cost_array, nodata_value, search_mask, dx, dy, g_cost, allocation, came_from, seed_mask):
+    """
+    Dijkstra de varios orígenes a la vez (asignación por costo): parte de los píxeles de
+    'seed_mask' con costo finito en 'g_cost' y asienta toda la zona alcanzable. Mejora en su
+    lugar 'g_cost' (float64), 'allocation' (origen más barato de cada píxel, que se propaga
+    desde las semillas) y 'came_from' (uint8, códigos de 'reconstruct_path'). Los demás
+    costos finitos se toman como cotas superiores, así que se puede reanudar por ventanas.
+    Devuelve el número de nodos asentados.
+    """
+    height, width = cost_array.shape
+    heap = np.empty((max(64, 4 * (height + width)), 5), dtype=np.float64)
+    size = 0
+    order = 0.0
+    for r in range(height):
+        for c in range(width):
+            if seed_mask[r, c] and g_cost[r, c] < np.inf:
+                heap, size = heap_push(heap, size, g_cost[r, c], order, g_cost[r, c], r, c)
+                order += 1.0
+
+    settled = 0
+    while size > 0:
+        f, g, r, c, size = heap_pop(heap, size)
+        current_pos = (r, c)
+        if g > g_cost[current_pos]:
+            continue
+        settled += 1
+
+        cost_current = cost_array[current_pos]
+        for dr in range(-1, 2):
+            for dc in range(-1, 2):
+                if dr == 0 and dc == 0:
+                    continue
+
+                neighbor_pos = (current_pos[0] + dr, current_pos[1] + dc)
+
+                if not (0 <= neighbor_pos[0] < height and 0 <= neighbor_pos[1] < width):
+                    continue
+                if not search_mask[neighbor_pos]:
+                    continue
+
+                cost_neighbor = cost_array[neighbor_pos]
+                if cost_neighbor == nodata_value or np.isinf(cost_neighbor) or np.isnan(cost_neighbor):
+                    continue
+
+                dist_m = math.sqrt((dr * dy)**2 + (dc * dx)**2)
+                avg_cost = (cost_current + cost_neighbor) / 2.0
+                tentative_g_cost = g + (avg_cost * dist_m)
+
+                if tentative_g_cost < g_cost[neighbor_pos]:
+                    came_from[neighbor_pos] = (dr + 1) * 3 + (dc + 1)
+                    allocation[neighbor_pos] = allocation[current_pos]
+                    g_cost[neighbor_pos] = tentative_g_cost
+                    heap, size = heap_push(heap, size, tentative_g_cost, order, tentative_g_cost, neighbor_pos[0], neighbor_pos[1])
+                    order += 1.0
+    return settled
+
+@njit(['(int16[:, ::1], UniTuple(int64, 2), UniTuple(int64, 2))',
+       '(uint8[:, ::1], UniTuple(int64, 2), UniTuple(int64, 2))'], cache=True, nogil=True)
 def reconstruct_path(came_from_array, start_pixel, end_pixel):
-    """Reconstruye la ruta a partir del array 'came_from' que almacena direcciones."""
+    """
+    Reconstruye la ruta a partir del array 'came_from' que almacena direcciones (0-8).
+    Acepta el estado estándar (int16, -1 sin predecesor) y el compacto (uint8, 255).
+    """
     path = np.zeros((came_from_array.size, 2), dtype=np.int32)
     current_pos_r, current_pos_c = end_pixel
     count = 0
@@ -86,7 +1058,7 @@ def reconstruct_path(came_from_array, start_pixel, end_pixel):
     while (current_pos_r, current_pos_c) != start_pixel and count < limit:
         path[count] = np.array([current_pos_r, current_pos_c])
         direction = came_from_array[current_pos_r, current_pos_c]
-        if direction == -1:
+        if direction < 0 or direction > 8:
             return None
         
         dc = (direction % 3) - 1
@@ -96,4 +1068,14 @@ def reconstruct_path(came_from_array, start_pixel, end_pixel):
         count += 1
     
     path[count] = np.array([start_pixel[0], start_pixel[1]])
-    return path[:count + 1][::-1]
\ No newline at end of file
+    return path[:count + 1][::-1]
+
+@njit(cache=True, nogil=True)
+def path_cost(cost_array, path, dx, dy):
+    """Costo acumulado de una ruta de píxeles (fila, columna), con el mismo costo de arista que la búsqueda."""
+    total = 0.0
+    for i in range(1, path.shape[0]):
+        r0, c0, r1, c1 = path[i - 1, 0], path[i - 1, 1], path[i, 0], path[i, 1]
+        dist_m = math.sqrt(((r1 - r0) * dy)**2 + ((c1 - c0) * dx)**2)
+        total += ((cost_array[r0, c0] + cost_array[r1, c1]) / 2.0) * dist_m
+    return total
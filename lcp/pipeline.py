@@ -0,0 +1,129 @@
+# lcp/pipeline.py
+
+import queue
+import threading
+import time
+
+# Ejecución por etapas de un lote de rutas: preparación (niveles de la pirámide, fase 1,
+# corredor y lectura de su ventana), búsqueda de alta resolución y escritura de resultados,
+# cada una en su propio hilo y unidas por colas acotadas. Los núcleos de búsqueda se compilan
+# con nogil=True, y rasterio, fiona y sqlite liberan el GIL durante la E/S. Así, mientras se
+# busca una ruta se prepara la siguiente y se escribe la anterior, y el tiempo del lote se
+# acerca al de la etapa de búsqueda. Las colas limitan cuántas rutas preparadas (con su
+# corredor y su ventana del raster) o terminadas esperan en memoria.
+
+# Marca de fin de los elementos de una cola
+_DONE = object()
+
+# Nombres de las etapas en el resumen de 'Pipeline.run'
+STAGES = ('preparacion', 'busqueda', 'escritura')
+
+class Pipeline:
+    """
+    Tres etapas por elemento: 'prepare(item) -> job', 'search(job) -> result' y 'write(result)'.
+    La preparación y la escritura corren en hilos propios y la búsqueda en el hilo que llama
+    a 'run'. Cada etapa procesa los elementos en orden, así que se escriben en el mismo orden
+    en que llegan. 'queue_size' es la capacidad de cada cola: la preparación se detiene
+    cuando hay esa cantidad de trabajos esperando a la búsqueda. Con 0 las tres etapas se
+    ejecutan una tras otra en el hilo que llama, sin hilos ni colas.
+
+    Si una etapa falla, las demás se detienen y 'run' vuelve a lanzar la primera excepción.
+    Las etapas no deben compartir objetos que no admitan hilos, como un mismo dataset de
+    rasterio o una 'TiledRaster': cada etapa que lee el raster usa su propio lector.
+    """
+
+    def __init__(self, prepare, search, write, queue_size=2):
+        if queue_size < 0:
+            raise ValueError(f"El tamaño de las colas no puede ser negativo (se recibió {queue_size}).")
+        self.prepare = prepare
+        self.search = search
+        self.write = write
+        self.queue_size = queue_size
+
+    def run(self, items):
+        """
+        Procesa todos los elementos. Devuelve un dict con el número de elementos, el tiempo
+        total y el tiempo ocupado de cada etapa (segundos, ver STAGES).
+        """
+        busy = dict.fromkeys(STAGES, 0.0)
+        count = 0
+        started = time.perf_counter()
+
+        def timed(stage, function, value):
+            start = time.perf_counter()
+            try:
+                return function(value)
+            finally:
+                busy[stage] += time.perf_counter() - start
+
+        if self.queue_size == 0:
+            for item in items:
+                timed('escritura', self.write, timed('busqueda', self.search, timed('preparacion', self.prepare, item)))
+                count += 1
+        else:
+            prepared = queue.Queue(maxsize=self.queue_size)
+            results = queue.Queue(maxsize=self.queue_size)
+            stop = threading.Event()
+            errors = []
+
+            def put(target, value):
+                # Espera lugar en la cola sin quedar bloqueado si otra etapa falló
+                while not stop.is_set():
+                    try:
+                        target.put(value, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        pass
+                return False
+
+            def get(source):
+                while not stop.is_set():
+                    try:
+                        return source.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                return _DONE
+
+            def fail(error):
+                errors.append(error)
+                stop.set()
+
+            def prepare_stage():
+                try:
+                    for item in items:
+                        if not put(prepared, timed('preparacion', self.prepare, item)):
+                            return
+                    put(prepared, _DONE)
+                except BaseException as e:
+                    fail(e)
+
+            def write_stage():
+                try:
+                    while (result := get(results)) is not _DONE:
+                        timed('escritura', self.write, result)
+                except BaseException as e:
+                    fail(e)
+
+            threads = [threading.Thread(target=prepare_stage, name='lcp-preparacion', daemon=True),
+                       threading.Thread(target=write_stage, name='lcp-escritura', daemon=True)]
+            for thread in threads:
+                thread.start()
+            try:
+                while (job := get(prepared)) is not _DONE:
+                    if not put(results, timed('busqueda', self.search, job)):
+                        break
+                    count += 1
+                put(results, _DONE)
+            except BaseException as e:
+                fail(e)
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise errors[0]
+
+        return {'rutas': count, 'segundos': time.perf_counter() - started, **busy}
+
+def report(summary):
+    """Texto con el tiempo total de un lote y el tiempo ocupado de cada etapa."""
+    stages = ", ".join(f"{stage} {summary[stage]:.2f} s" for stage in STAGES)
+    return f"{summary['rutas']} rutas en {summary['segundos']:.2f} s ({stages})."
@@ -1,30 +1,161 @@
 # lcp/processing.py
 
+import math
 import numpy as np
-import fiona  # <-- CORRECCIÓN: Se ha añadido la importación que faltaba
-from rasterio.enums import Resampling
-from rasterio.features import rasterize
-from skimage.draw import disk
+from numba import njit
+
+# fiona, rasterio y skimage se importan dentro de las funciones que los usan: importar este
+# módulo solo carga numpy y numba.
 
 def world_to_pixel(transform, x, y):
     """Convierte coordenadas del mundo a píxel."""
     col, row = ~transform * (x, y)
     return int(row), int(col)
 
-def create_low_res_data(src_dataset, factor):
-    """Crea una versión de baja resolución del raster."""
-    low_res_shape = (src_dataset.height // factor, src_dataset.width // factor)
-    low_res_data = src_dataset.read(1, out_shape=low_res_shape, resampling=Resampling.average)
-    low_res_transform = src_dataset.transform * src_dataset.transform.scale(factor, factor)
+def world_to_pixels(transform, coords):
+    """
+    'world_to_pixel' para un array (n, 2) de coordenadas (x, y) en una sola operación. Devuelve
+    un array int64 (n, 2) de (fila, columna), truncado hacia cero como int(). Las coordenadas
+    no finitas dan valores sin sentido: ver 'data_loader.validate_points'.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    inverse = ~transform
+    x, y = coords[:, 0], coords[:, 1]
+    pixels = np.empty(coords.shape, dtype=np.int64)
+    with np.errstate(invalid='ignore'):
+        pixels[:, 0] = x * inverse.d + y * inverse.e + inverse.f
+        pixels[:, 1] = x * inverse.a + y * inverse.b + inverse.c
+    return pixels
+
+def low_res_geometry(src_dataset, factor, window=None):
+    """
+    Forma, transformación y tamaño de píxel del nivel de baja resolución de un raster
+    (o de la ventana 'window' del raster, si se indica).
+    """
+    if window is None:
+        low_res_shape = (src_dataset.height // factor, src_dataset.width // factor)
+        base_transform = src_dataset.transform
+    else:
+        low_res_shape = (int(window.height) // factor, int(window.width) // factor)
+        base_transform = src_dataset.window_transform(window)
+    low_res_transform = base_transform * base_transform.scale(factor, factor)
     dx_low = src_dataset.res[0] * factor
     dy_low = src_dataset.res[1] * factor
+    return low_res_shape, low_res_transform, dx_low, dy_low
+
+def create_low_res_data(src_dataset, factor, window=None):
+    """Crea una versión de baja resolución del raster (o de su ventana 'window')."""
+    from rasterio.enums import Resampling
+    low_res_shape, low_res_transform, dx_low, dy_low = low_res_geometry(src_dataset, factor, window)
+    low_res_data = src_dataset.read(1, window=window, out_shape=low_res_shape, resampling=Resampling.average)
     return low_res_data, low_res_transform, dx_low, dy_low
 
+def block_fraction(mask, low_res_shape):
+    """
+    Fracción de píxeles True de 'mask' en cada celda de un nivel de forma 'low_res_shape'. Las
+    celdas tienen los mismos límites fraccionarios que las de Resampling.average (un píxel que
+    corta el borde de una celda cuenta en proporción), así que el resultado corresponde celda
+    a celda con el costo remuestreado.
+    """
+    def reduce_axis(values, n_cells, axis):
+        size = values.shape[axis]
+        edges = np.arange(n_cells + 1) * (size / n_cells)
+        lower = np.floor(edges).astype(np.int64)
+        upper = np.minimum(lower + 1, size)
+        shape = [1, 1]
+        shape[axis] = -1
+        weight = (edges - lower).reshape(shape)
+        # Suma acumulada interpolada en los bordes fraccionarios de las celdas
+        cumulative = np.cumsum(values, axis=axis, dtype=np.float64)
+        cumulative = np.concatenate((np.zeros_like(np.take(cumulative, [0], axis=axis)), cumulative), axis=axis)
+        at_edges = np.take(cumulative, lower, axis=axis) * (1.0 - weight) + np.take(cumulative, upper, axis=axis) * weight
+        return np.diff(at_edges, axis=axis)
+
+    # Las filas se reducen por franjas de columnas para no crear un array float64 del tamaño de la máscara
+    strip = 4096
+    rows_reduced = np.concatenate([reduce_axis(mask[:, c:c + strip], low_res_shape[0], 0) for c in range(0, mask.shape[1], strip)], axis=1)
+    sums = reduce_axis(rows_reduced, low_res_shape[1], 1)
+    return sums / ((mask.shape[0] / low_res_shape[0]) * (mask.shape[1] / low_res_shape[1]))
+
+def low_res_pixel(pixel, high_res_shape, low_res_shape):
+    """
+    Celda (fila, columna) del nivel de forma 'low_res_shape' que contiene el píxel de alta
+    resolución 'pixel', o None si el píxel cae fuera de 'high_res_shape'.
+    """
+    if not all(0 <= int(p) < size for p, size in zip(pixel, high_res_shape)):
+        return None
+    return tuple(int(p) * n // size for p, size, n in zip(pixel, high_res_shape, low_res_shape))
+
+MASK_REDUCTIONS = ('any', 'all', 'muestreo')
+
+def reduce_mask(search_mask, low_res_shape, factor, mode='any'):
+    """
+    Máscara del nivel de baja resolución (ver 'MASK_REDUCTIONS'):
+      - 'any': celda válida si contiene algún píxel válido. Conserva la conectividad: si hay
+        ruta en alta resolución, sus celdas forman una ruta en el nivel.
+      - 'all': celda válida solo si todos sus píxeles lo son; no cruza huecos de la máscara.
+      - 'muestreo': el primer píxel de cada bloque de 'factor' (comportamiento original).
+    """
+    if mode == 'muestreo':
+        return search_mask[::factor, ::factor][:low_res_shape[0], :low_res_shape[1]]
+    fraction = block_fraction(search_mask, low_res_shape)
+    if mode == 'any':
+        return fraction > 1e-9
+    if mode == 'all':
+        return fraction >= 1.0 - 1e-9
+    raise ValueError(f"Reducción de máscara desconocida: '{mode}'. Use {', '.join(repr(m) for m in MASK_REDUCTIONS)}.")
+
+# Valor de las celdas intransitables en el raster de transitabilidad ('build_passability')
+IMPASSABLE = np.inf
+
+def build_passability(cost_array, nodata_value, search_mask=None, include_pixels=()):
+    """
+    Raster de transitabilidad para A*: el costo con un borde de un píxel, en el que las celdas
+    sin dato, NaN o infinitas, las que quedan fuera de 'search_mask' y el propio borde valen
+    IMPASSABLE. La búsqueda descarta así un vecino con una sola comparación, sin comprobar
+    límites ni leer la máscara; el píxel (r, c) del costo es el (r + 1, c + 1) del resultado.
+    Es float32 si float32 representa exactamente todos los valores del costo (float32, float16
+    y enteros de hasta 16 bits) y float64 en otro caso (float64, int32, uint32...), para no
+    alterar los costos de las rutas.
+    Los píxeles de 'include_pixels' con costo válido quedan transitables aunque estén fuera de
+    la máscara: la búsqueda original solo aplicaba la máscara a los vecinos, no al origen.
+    """
+    dtype = np.result_type(cost_array.dtype, np.float32)
+    height, width = cost_array.shape
+    passable = np.empty((height + 2, width + 2), dtype=dtype)
+    mask = np.ones((0, 0), dtype=bool) if search_mask is None else search_mask
+    nodata = np.nan if nodata_value is None else float(nodata_value)
+    passability_kernel(cost_array, nodata, mask, passable)
+    for r, c in include_pixels:
+        if 0 <= r < height and 0 <= c < width:
+            value = cost_array[r, c]
+            if value != nodata and np.isfinite(value):
+                passable[r + 1, c + 1] = value
+    return passable
+
+@njit(cache=True, nogil=True)
+def passability_kernel(cost_array, nodata_value, search_mask, passable):
+    """Rellena 'passable' (ver 'build_passability') en una sola pasada, sin arrays intermedios."""
+    height, width = cost_array.shape
+    use_mask = search_mask.shape[0] > 0
+    passable[0, :] = IMPASSABLE
+    passable[height + 1, :] = IMPASSABLE
+    passable[:, 0] = IMPASSABLE
+    passable[:, width + 1] = IMPASSABLE
+    for r in range(height):
+        for c in range(width):
+            value = cost_array[r, c]
+            if value == nodata_value or np.isinf(value) or np.isnan(value) or (use_mask and not search_mask[r, c]):
+                passable[r + 1, c + 1] = IMPASSABLE
+            else:
+                passable[r + 1, c + 1] = value
+
 def create_search_corridor(path_low_res, high_res_shape, factor, buffer_pixels):
     """
     Crea una máscara de corredor dibujando discos alrededor de la ruta de baja resolución.
     Fiel a la implementación original con skimage.
     """
+    from skimage.draw import disk
     corridor_mask = np.zeros(high_res_shape, dtype=bool)
     if path_low_res is None or len(path_low_res) == 0:
         return corridor_mask
@@ -37,14 +168,154 @@ def create_search_corridor(path_low_res, high_res_shape, factor, buffer_pixels):
         
     return corridor_mask
 
-def create_mask_from_vector(vector_path, raster_src):
-    """Crea una máscara booleana a partir de un shapefile."""
+def vector_window(vector_path, raster_src):
+    """Ventana del raster (rasterio Window) que cubre las geometrías de un shapefile."""
+    import fiona
+    from rasterio.features import geometry_window
+    with fiona.open(vector_path, "r") as vf:
+        shapes = [f["geometry"] for f in vf]
+    return geometry_window(raster_src, shapes)
+
+def mask_window(mask, include_pixels=()):
+    """
+    Ventana mínima (rasterio Window, relativa a 'mask') que contiene todos los píxeles True
+    de la máscara y, además, los píxeles (fila, columna) de 'include_pixels'.
+    """
+    from rasterio.windows import Window
+    rows = [int(i) for i in np.flatnonzero(mask.any(axis=1))[[0, -1]]] if mask.any() else []
+    cols = [int(i) for i in np.flatnonzero(mask.any(axis=0))[[0, -1]]] if rows else []
+    rows += [r for r, _ in include_pixels]
+    cols += [c for _, c in include_pixels]
+    if not rows:
+        return Window(0, 0, 0, 0)
+    return Window(min(cols), min(rows), max(cols) - min(cols) + 1, max(rows) - min(rows) + 1)
+
+def offset_window(window, base_window):
+    """Traslada una ventana relativa a 'base_window' al sistema de píxeles del raster completo."""
+    from rasterio.windows import Window
+    return Window(base_window.col_off + window.col_off, base_window.row_off + window.row_off, window.width, window.height)
+
+@njit(cache=True, nogil=True)
+def corridor_kernel(path_rows, path_cols, factor, radius, lr_r0, lr_c0, lr_shape, hr_r0, hr_c0, hr_shape, high_res_shape):
+    """
+    Núcleo de 'build_search_corridor'. Trabaja por bloques de baja resolución: calcula para
+    cada bloque la distancia al centro de ruta más cercano (estampando la ruta una sola
+    vez en baja resolución), rellena de una vez los bloques que quedan enteros dentro del
+    radio y evalúa píxel a píxel solo los bloques del borde, con el mismo criterio que
+    skimage.draw.disk: (dr / radio)^2 + (dc / radio)^2 < 1.
+    """
+    half = factor // 2
+    slack = half * math.sqrt(2.0)  # Distancia máxima de un píxel al centro de su bloque
+    reach = int(math.ceil((radius + slack) / factor))
+    eps = 1e-9 * radius
+
+    dist2 = np.full(lr_shape, np.inf, dtype=np.float64)
+    for k in range(path_rows.shape[0]):
+        for di in range(-reach, reach + 1):
+            i = path_rows[k] - lr_r0 + di
+            if i < 0 or i >= lr_shape[0]:
+                continue
+            for dj in range(-reach, reach + 1):
+                j = path_cols[k] - lr_c0 + dj
+                if j < 0 or j >= lr_shape[1]:
+                    continue
+                d2 = float(di * di + dj * dj) * factor * factor
+                if d2 < dist2[i, j]:
+                    dist2[i, j] = d2
+
+    corridor = np.zeros(hr_shape, dtype=np.bool_)
+    border = np.zeros(lr_shape, dtype=np.bool_)
+    for i in range(lr_shape[0]):
+        for j in range(lr_shape[1]):
+            d = math.sqrt(dist2[i, j])
+            if d - slack > radius + eps:
+                continue
+            if d + slack < radius - eps:
+                r_start = max((lr_r0 + i) * factor, 0) - hr_r0
+                r_stop = min((lr_r0 + i + 1) * factor, high_res_shape[0]) - hr_r0
+                c_start = max((lr_c0 + j) * factor, 0) - hr_c0
+                c_stop = min((lr_c0 + j + 1) * factor, high_res_shape[1]) - hr_c0
+                corridor[max(r_start, 0):max(r_stop, 0), max(c_start, 0):max(c_stop, 0)] = True
+            else:
+                border[i, j] = True
+
+    for k in range(path_rows.shape[0]):
+        center_r = path_rows[k] * factor + half
+        center_c = path_cols[k] * factor + half
+        for di in range(-reach, reach + 1):
+            i = path_rows[k] - lr_r0 + di
+            if i < 0 or i >= lr_shape[0]:
+                continue
+            for dj in range(-reach, reach + 1):
+                j = path_cols[k] - lr_c0 + dj
+                if j < 0 or j >= lr_shape[1] or not border[i, j]:
+                    continue
+                for r in range(max((lr_r0 + i) * factor, 0), min((lr_r0 + i + 1) * factor, high_res_shape[0])):
+                    a = (r - center_r) / radius
+                    for c in range(max((lr_c0 + j) * factor, 0), min((lr_c0 + j + 1) * factor, high_res_shape[1])):
+                        b = (c - center_c) / radius
+                        if a * a + b * b < 1.0:
+                            corridor[r - hr_r0, c - hr_c0] = True
+    return corridor
+
+def build_search_corridor(path_low_res, high_res_shape, factor, buffer_pixels, include_pixels=()):
+    """
+    Crea el corredor de búsqueda alrededor de la ruta de baja resolución sin dibujar un
+    disco por píxel: la ruta se rasteriza una vez en baja resolución y se aplica un único
+    umbral de distancia por bloques. El resultado coincide con 'create_search_corridor'.
+
+    Devuelve (corridor_mask, window): la máscara recortada al rectángulo del corredor
+    (ampliado para contener los 'include_pixels' que caen dentro de 'high_res_shape') y su
+    ventana (rasterio Window) en píxeles de alta resolución, siempre dentro de 'high_res_shape'.
+    """
+    from rasterio.windows import Window
+    include_pixels = [(int(r), int(c)) for r, c in include_pixels if 0 <= r < high_res_shape[0] and 0 <= c < high_res_shape[1]]
+    if path_low_res is None or len(path_low_res) == 0:
+        empty = np.zeros((0, 0), dtype=bool)
+        return empty, Window(0, 0, 0, 0)
+
+    path_rows = np.ascontiguousarray(path_low_res[:, 0], dtype=np.int64)
+    path_cols = np.ascontiguousarray(path_low_res[:, 1], dtype=np.int64)
+    reach = int(math.ceil((buffer_pixels + (factor // 2) * math.sqrt(2.0)) / factor))
+    lr_rows = (max(path_rows.min() - reach, 0), min(path_rows.max() + reach + 1, -(-high_res_shape[0] // factor)))
+    lr_cols = (max(path_cols.min() - reach, 0), min(path_cols.max() + reach + 1, -(-high_res_shape[1] // factor)))
+
+    # Extensión en alta resolución: bloques alcanzables más los píxeles a incluir
+    hr_rows = [lr_rows[0] * factor, min(lr_rows[1] * factor, high_res_shape[0])]
+    hr_cols = [lr_cols[0] * factor, min(lr_cols[1] * factor, high_res_shape[1])]
+    for r, c in include_pixels:
+        hr_rows = [min(hr_rows[0], r), max(hr_rows[1], r + 1)]
+        hr_cols = [min(hr_cols[0], c), max(hr_cols[1], c + 1)]
+
+    corridor = corridor_kernel(path_rows, path_cols, factor, float(buffer_pixels),
+                               lr_rows[0], lr_cols[0], (lr_rows[1] - lr_rows[0], lr_cols[1] - lr_cols[0]),
+                               hr_rows[0], hr_cols[0], (hr_rows[1] - hr_rows[0], hr_cols[1] - hr_cols[0]),
+                               (high_res_shape[0], high_res_shape[1]))
+
+    # Recortar al rectángulo ocupado (una vista, sin copiar)
+    local_include = [(r - hr_rows[0], c - hr_cols[0]) for r, c in include_pixels]
+    tight = mask_window(corridor, include_pixels=local_include)
+    rows, cols = tight.toslices()
+    window = Window(hr_cols[0] + tight.col_off, hr_rows[0] + tight.row_off, tight.width, tight.height)
+    return corridor[rows, cols], window
+
+def create_mask_from_vector(vector_path, raster_src, window=None):
+    """
+    Crea una máscara booleana a partir de un shapefile.
+    Si se indica 'window', la máscara cubre solo esa ventana del raster.
+    """
+    import fiona
+    from rasterio.features import rasterize
     print("Creando máscara booleana desde el polígono...")
     with fiona.open(vector_path, "r") as vf:
         if vf.crs != raster_src.crs:
             raise ValueError(f"El CRS de la máscara ({vf.crs}) y el raster ({raster_src.crs}) no coinciden.")
         shapes = [f["geometry"] for f in vf]
-    
-    mask = rasterize(shapes, out_shape=raster_src.shape, transform=raster_src.transform, fill=0, all_touched=True, dtype=np.uint8)
+
+    if window is None:
+        out_shape, transform = raster_src.shape, raster_src.transform
+    else:
+        out_shape, transform = (int(window.height), int(window.width)), raster_src.window_transform(window)
+    mask = rasterize(shapes, out_shape=out_shape, transform=transform, fill=0, all_touched=True, dtype=np.uint8)
     print("Máscara creada.")
     return mask.astype(bool)
\ No newline at end of file
@@ -0,0 +1,136 @@
+# lcp/pyramid.py
+
+import os
+import math
+import hashlib
+import numpy as np
+
+from . import processing as proc
+from .cache import raster_fingerprint
+
+class CostPyramid:
+    """
+    Pirámide de niveles de baja resolución del raster de costo.
+
+    Cada nivel (costo remuestreado, transformación, dx, dy y máscara reducida) se calcula
+    una sola vez por ejecución, la primera vez que se pide. Si se indica 'cache_dir', los
+    costos remuestreados se guardan además en disco con una clave derivada de la ruta,
+    la fecha de modificación y el contenido del raster, de modo que las ejecuciones
+    posteriores sobre la misma superficie no vuelven a remuestrear.
+
+    Si se indica 'window', la pirámide cubre solo esa ventana del raster y 'search_mask'
+    debe tener la forma de la ventana.
+
+    La máscara de cada nivel se reduce con las mismas celdas que el costo ('reduce_mask' en
+    processing): con 'any' (por defecto) una celda es transitable si contiene algún píxel de
+    la máscara, así que los pasos angostos no se pierden; con 'all' solo si todos lo son, y
+    con 'muestreo' se toma un píxel de cada bloque, como en la versión original. Se descartan
+    además las celdas en que la fracción de píxeles sin dato del raster supera
+    'max_nodata_fraction' (por defecto la mitad; 1.0 no descarta ninguna), para que la fase 1
+    no atraviese celdas casi vacías con 'any'. La fracción se guarda en caché como el costo.
+    La ruta gruesa orienta el corredor, pero no garantiza que la ruta final sea la más barata:
+    según el factor con que se encuentre, el corredor puede dejar fuera un camino mejor.
+
+    Si se indica 'previous_path' (versión anterior del raster) y 'edit' (su 'RasterEdit'
+    respecto al actual), los niveles que falten en la caché se obtienen copiando los del
+    raster anterior y remuestreando solo las celdas que cubren las zonas editadas.
+    """
+
+    def __init__(self, src_dataset, search_mask, cache_dir=None, window=None, previous_path=None, edit=None,
+                 mask_reduction='any', max_nodata_fraction=0.5):
+        if mask_reduction not in proc.MASK_REDUCTIONS:
+            raise ValueError(f"Reducción de máscara desconocida: '{mask_reduction}'. Use {', '.join(repr(m) for m in proc.MASK_REDUCTIONS)}.")
+        self.src = src_dataset
+        self.search_mask = search_mask
+        self.mask_reduction = mask_reduction
+        self.max_nodata_fraction = max_nodata_fraction
+        self.cache_dir = cache_dir
+        self.window = window
+        self.edit = edit
+        self._levels = {}
+        self._key = self._previous_key = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._key = self._raster_key(src_dataset.name)
+            if previous_path is not None and edit is not None:
+                self._previous_key = self._raster_key(previous_path)
+
+    def _raster_key(self, raster_path):
+        key = raster_fingerprint(raster_path, self.cache_dir)
+        if self.window is not None:
+            window_spec = (int(self.window.row_off), int(self.window.col_off), int(self.window.height), int(self.window.width))
+            key = hashlib.blake2b(f"{key}|{window_spec}".encode(), digest_size=16).hexdigest()
+        return key
+
+    def level(self, factor):
+        """Devuelve (cost_lr, transform_lr, dx_lr, dy_lr, mask_lr) para el factor indicado."""
+        if factor not in self._levels:
+            self._levels[factor] = self._build_level(factor)
+        return self._levels[factor]
+
+    def _cache_path(self, factor, kind='costo', key=None):
+        suffix = '' if kind == 'costo' else f"_{kind}"
+        return os.path.join(self.cache_dir, f"piramide_{key or self._key}_x{factor}{suffix}.npy")
+
+    def _read_cells(self, kind, window, out_shape):
+        """Promedio por celda del costo ('costo') o de la máscara de datos válidos del raster (0-255, 'validos')."""
+        from rasterio.enums import Resampling
+        if kind == 'validos':
+            return self.src.read_masks(1, window=window, out_shape=out_shape, resampling=Resampling.average)
+        return self.src.read(1, window=window, out_shape=out_shape, resampling=Resampling.average)
+
+    def _patch_level(self, factor, kind, low_res_shape):
+        """
+        Nivel del raster anterior (desde la caché) con las celdas que cubren las zonas editadas
+        remuestreadas de nuevo, o None si ese nivel no está en la caché. Cada celda promedia
+        un bloque fraccionario de píxeles, así que se leen sub-ventanas con los mismos límites
+        que la lectura del nivel completo.
+        """
+        previous_path = self._cache_path(factor, kind, self._previous_key)
+        if not os.path.exists(previous_path):
+            return None
+        low_res_data = np.load(previous_path)
+        if low_res_data.shape != low_res_shape:
+            return None
+
+        from rasterio.windows import Window
+        base = self.window if self.window is not None else Window(0, 0, self.src.width, self.src.height)
+        step_r, step_c = int(base.height) / low_res_shape[0], int(base.width) / low_res_shape[1]
+        for r0, c0, r1, c1 in self.edit.relative_bounds(base):
+            # Una celda de margen por lado: el promedio pondera los píxeles que cortan sus bordes
+            a, b = max(math.floor(r0 / step_r) - 1, 0), min(math.ceil(r1 / step_r) + 1, low_res_shape[0])
+            c, d = max(math.floor(c0 / step_c) - 1, 0), min(math.ceil(c1 / step_c) + 1, low_res_shape[1])
+            if a >= b or c >= d:
+                continue
+            cells = Window(base.col_off + c * step_c, base.row_off + a * step_r, (d - c) * step_c, (b - a) * step_r)
+            low_res_data[a:b, c:d] = self._read_cells(kind, cells, (b - a, d - c))
+        return low_res_data
+
+    def _level_array(self, factor, kind, low_res_shape):
+        """Array de un nivel ('costo' o 'validos'): de la caché, actualizado desde el raster anterior o remuestreado."""
+        low_res_data = None
+        if self._key is not None and os.path.exists(self._cache_path(factor, kind)):
+            low_res_data = np.load(self._cache_path(factor, kind))
+            if low_res_data.shape != low_res_shape:
+                low_res_data = None
+
+        if low_res_data is None:
+            if self._previous_key is not None:
+                low_res_data = self._patch_level(factor, kind, low_res_shape)
+            if low_res_data is None:
+                low_res_data = self._read_cells(kind, self.window, low_res_shape)
+            if self._key is not None:
+                tmp_path = f"{self._cache_path(factor, kind)}.{os.getpid()}.tmp.npy"
+                np.save(tmp_path, low_res_data)
+                os.replace(tmp_path, self._cache_path(factor, kind))
+        return low_res_data
+
+    def _build_level(self, factor):
+        low_res_shape, low_res_transform, dx_low, dy_low = proc.low_res_geometry(self.src, factor, self.window)
+        low_res_data = self._level_array(factor, 'costo', low_res_shape)
+
+        mask_lr = proc.reduce_mask(self.search_mask, low_res_shape, factor, self.mask_reduction)
+        if self.max_nodata_fraction < 1.0:
+            valid_lr = self._level_array(factor, 'validos', low_res_shape)
+            mask_lr = mask_lr & (valid_lr >= 255.0 * (1.0 - self.max_nodata_fraction))
+        return low_res_data, low_res_transform, dx_low, dy_low, mask_lr
@@ -0,0 +1,128 @@
+# lcp/surfaces.py
+
+import os
+import numpy as np
+import rasterio
+from numba import njit
+
+from .pathfinder import dijkstra_multi_target, NO_DIRECTION_U8
+from .cache import search_cache_key
+from .tiles import TiledRaster
+
+# Valor sin dato del raster de costo acumulado (píxeles no alcanzados desde el origen)
+UNREACHED_COST = -1.0
+
+def surface_paths(cache_dir, raster_path, window, search_mask, origin_pixel):
+    """Rutas (costo acumulado, direcciones) de las superficies de un origen, ventana y máscara."""
+    os.makedirs(cache_dir, exist_ok=True)
+    key = search_cache_key(raster_path, cache_dir, window, search_mask, tuple(int(v) for v in origin_pixel))
+    folder = os.path.join(cache_dir, 'superficies')
+    return os.path.join(folder, f"costo_{key}.tif"), os.path.join(folder, f"direccion_{key}.tif")
+
+def compute_surfaces(cost_array, nodata_value, origin_pixel, dx, dy, search_mask, transform, crs, cost_path, backlink_path, tile_size=256):
+    """
+    Búsqueda de uno a todos desde 'origin_pixel' sobre toda la zona alcanzable. Guarda el costo
+    acumulado (float64, UNREACHED_COST sin dato) y las direcciones (uint8 con los códigos 0-8
+    de 'reconstruct_path', NO_DIRECTION_U8 sin dato) como GeoTIFF teselados sin compresión.
+    Devuelve (g_cost, came_from) de la búsqueda.
+    """
+    _, came_from, g_cost = dijkstra_multi_target(cost_array, nodata_value, origin_pixel, np.empty((0, 2), dtype=np.int64), dx, dy, search_mask)
+
+    os.makedirs(os.path.dirname(cost_path), exist_ok=True)
+    profile = {'driver': 'GTiff', 'height': g_cost.shape[0], 'width': g_cost.shape[1], 'count': 1,
+               'transform': transform, 'crs': crs, 'tiled': True, 'blockxsize': tile_size, 'blockysize': tile_size}
+    layers = ((cost_path, np.where(np.isfinite(g_cost), g_cost, UNREACHED_COST), 'float64', UNREACHED_COST),
+              (backlink_path, np.where(came_from < 0, NO_DIRECTION_U8, came_from).astype(np.uint8), 'uint8', NO_DIRECTION_U8))
+    for path, data, dtype, nodata in layers:
+        tmp_path = f"{path}.{os.getpid()}.tmp.tif"
+        with rasterio.open(tmp_path, 'w', dtype=dtype, nodata=nodata, **profile) as dst:
+            dst.write(data, 1)
+        os.replace(tmp_path, path)
+    return g_cost, came_from
+
+@njit(cache=True)
+def trace_in_tile(tile, row_off, col_off, r, c, start_pixel, path, count):
+    """
+    Sigue las direcciones dentro de una tesela desde (r, c) hasta salir de ella o llegar al
+    origen, escribiendo los píxeles en 'path'. Devuelve (r, c, count, estado): 1 si llegó al
+    origen, 0 si salió de la tesela y -1 si encontró un píxel sin dirección.
+    """
+    height, width = tile.shape
+    while 0 <= r - row_off < height and 0 <= c - col_off < width and count < path.shape[0]:
+        path[count, 0] = r
+        path[count, 1] = c
+        count += 1
+        if r == start_pixel[0] and c == start_pixel[1]:
+            return r, c, count, 1
+        direction = tile[r - row_off, c - col_off]
+        if direction > 8:
+            return r, c, count, -1
+        r -= (direction // 3) - 1
+        c -= (direction % 3) - 1
+    if count >= path.shape[0]:
+        return r, c, count, -1
+    return r, c, count, 0
+
+class SurfaceQuery:
+    """
+    Consulta de rutas sobre superficies ya guardadas con 'compute_surfaces', sin ninguna
+    búsqueda: solo se leen (con caché LRU) las teselas del raster de direcciones que
+    atraviesa cada ruta.
+    """
+
+    def __init__(self, cost_path, backlink_path, origin_pixel, tile_cache_mb=64):
+        self.origin_pixel = (int(origin_pixel[0]), int(origin_pixel[1]))
+        self._cost_src = rasterio.open(cost_path)
+        self._backlink_src = rasterio.open(backlink_path)
+        tile_size = self._backlink_src.block_shapes[0][0]
+        self._costs = TiledRaster(self._cost_src, tile_size=tile_size, memory_budget_mb=tile_cache_mb)
+        self._backlinks = TiledRaster(self._backlink_src, tile_size=tile_size, memory_budget_mb=tile_cache_mb)
+        self.shape = self._backlinks.shape
+
+    @classmethod
+    def open(cls, cache_dir, raster_path, window, search_mask, origin_pixel, **kwargs):
+        """Abre las superficies guardadas para el origen, o devuelve None si no existen."""
+        cost_path, backlink_path = surface_paths(cache_dir, raster_path, window, search_mask, origin_pixel)
+        if not (os.path.exists(cost_path) and os.path.exists(backlink_path)):
+            return None
+        return cls(cost_path, backlink_path, origin_pixel, **kwargs)
+
+    def _inside(self, pixel):
+        return 0 <= pixel[0] < self.shape[0] and 0 <= pixel[1] < self.shape[1]
+
+    def cost(self, end_pixel):
+        """Costo acumulado desde el origen hasta 'end_pixel' (inf si no es alcanzable)."""
+        if not self._inside(end_pixel):
+            return np.inf
+        tile, row_off, col_off = self._costs.tile_at(end_pixel[0], end_pixel[1])
+        value = float(tile[end_pixel[0] - row_off, end_pixel[1] - col_off])
+        return np.inf if value == UNREACHED_COST else value
+
+    def trace(self, end_pixel):
+        """Ruta origen -> 'end_pixel' como array (fila, columna), o None si no es alcanzable."""
+        if not self._inside(end_pixel):
+            return None
+        path = np.empty((4096, 2), dtype=np.int32)
+        r, c, count = int(end_pixel[0]), int(end_pixel[1]), 0
+        while True:
+            tile, row_off, col_off = self._backlinks.tile_at(r, c)
+            r, c, count, status = trace_in_tile(tile, row_off, col_off, r, c, self.origin_pixel, path, count)
+            if status == 1:
+                return path[:count][::-1]
+            if status == -1:
+                if count < path.shape[0]:
+                    return None
+                # Sin espacio: se amplía el buffer y se continúa desde el último píxel escrito
+                r, c = int(path[count - 1, 0]), int(path[count - 1, 1])
+                count -= 1
+                path = np.concatenate((path, np.empty_like(path)))
+
+    def close(self):
+        self._cost_src.close()
+        self._backlink_src.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
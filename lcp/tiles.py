@@ -0,0 +1,79 @@
+# lcp/tiles.py
+
+import numpy as np
+from collections import OrderedDict
+
+# rasterio se importa al leer, no al importar el módulo.
+
+class TiledRaster:
+    """
+    Acceso por ventanas a una banda de un dataset rasterio, con caché LRU de teselas.
+
+    Solo se leen del disco las teselas que cubren las ventanas pedidas, y las más
+    recientes se conservan en memoria hasta agotar 'memory_budget_mb'. Así las búsquedas
+    trabajan sobre rasters que no caben completos en RAM.
+    """
+
+    def __init__(self, src_dataset, tile_size=512, memory_budget_mb=1024, band=1):
+        self.src = src_dataset
+        self.band = band
+        self.tile_size = tile_size
+        self.memory_budget = int(memory_budget_mb * 2**20)
+        self.shape = (src_dataset.height, src_dataset.width)
+        self.dtype = np.dtype(src_dataset.dtypes[band - 1])
+        self.nodata = src_dataset.nodata
+        self._tiles = OrderedDict()
+        self._cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _tile(self, tile_row, tile_col):
+        """Devuelve una tesela desde la caché o desde el disco, descartando las menos usadas."""
+        key = (tile_row, tile_col)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+        from rasterio.windows import Window
+        self.misses += 1
+        row_off, col_off = tile_row * self.tile_size, tile_col * self.tile_size
+        window = Window(col_off, row_off,
+                        min(self.tile_size, self.shape[1] - col_off),
+                        min(self.tile_size, self.shape[0] - row_off))
+        tile = self.src.read(self.band, window=window)
+        self._tiles[key] = tile
+        self._cached_bytes += tile.nbytes
+        while self._cached_bytes > self.memory_budget and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self._cached_bytes -= evicted.nbytes
+        return tile
+
+    def tile_at(self, row, col):
+        """Devuelve (tesela, fila inicial, columna inicial) de la tesela que contiene el píxel (row, col)."""
+        tile_row, tile_col = row // self.tile_size, col // self.tile_size
+        return self._tile(tile_row, tile_col), tile_row * self.tile_size, tile_col * self.tile_size
+
+    def read_window(self, window):
+        """Lee una ventana (rasterio Window) ensamblándola a partir de las teselas que la cubren."""
+        row_off, col_off = int(window.row_off), int(window.col_off)
+        height, width = int(window.height), int(window.width)
+        if row_off < 0 or col_off < 0 or row_off + height > self.shape[0] or col_off + width > self.shape[1]:
+            raise ValueError(f"La ventana {window} excede los límites del raster {self.shape}.")
+
+        out = np.empty((height, width), dtype=self.dtype)
+        ts = self.tile_size
+        for tile_row in range(row_off // ts, (row_off + height - 1) // ts + 1):
+            for tile_col in range(col_off // ts, (col_off + width - 1) // ts + 1):
+                tile = self._tile(tile_row, tile_col)
+                r0, r1 = max(row_off, tile_row * ts), min(row_off + height, tile_row * ts + tile.shape[0])
+                c0, c1 = max(col_off, tile_col * ts), min(col_off + width, tile_col * ts + tile.shape[1])
+                out[r0 - row_off:r1 - row_off, c0 - col_off:c1 - col_off] = \
+                    tile[r0 - tile_row * ts:r1 - tile_row * ts, c0 - tile_col * ts:c1 - tile_col * ts]
+        return out
+
+    def full_window(self):
+        """Ventana que cubre el raster completo."""
+        from rasterio.windows import Window
+        return Window(0, 0, self.shape[1], self.shape[0])
@@ -1,21 +1,30 @@
 # lcp/utils.py
 
-import fiona
+import numpy as np
 import os
-from fiona.crs import CRS
-from shapely.geometry import LineString, mapping
+
+# fiona y shapely se importan al guardar la primera ruta, no al importar el módulo.
+
+def pixels_to_world(pixel_path, transform):
+    """Centros de los píxeles (fila, columna) de una ruta en coordenadas del mundo, como array N x 2."""
+    pixels = np.asarray(pixel_path, dtype=np.float64)
+    xs, ys = transform * (pixels[:, 1] + 0.5, pixels[:, 0] + 0.5)
+    return np.column_stack((xs, ys))
 
 def save_path_to_shapefile(pixel_path, transform, crs, output_path):
     """
     Guarda una ruta de píxeles en un archivo shapefile.
     Fiel a la implementación original.
     """
+    import fiona
+    from fiona.crs import CRS
+    from shapely.geometry import LineString, mapping
     if pixel_path is None or len(pixel_path) == 0:
         print(f"No se guardará {os.path.basename(output_path)}, la ruta está vacía o es inválida.")
         return
         
     # Convierte el centro de cada píxel a coordenadas del mundo
-    world_coords = [transform * (p[1] + 0.5, p[0] + 0.5) for p in pixel_path]
+    world_coords = pixels_to_world(pixel_path, transform)
     
     if len(world_coords) < 2:
         print(f"No se guardará {os.path.basename(output_path)}, la ruta necesita al menos 2 puntos.")
@@ -31,4 +40,71 @@ def save_path_to_shapefile(pixel_path, transform, crs, output_path):
             'geometry': mapping(LineString(world_coords)),
             'properties': {'id': os.path.basename(output_path)}
         })
-    print(f"Ruta guardada exitosamente en: {os.path.basename(output_path)}")
\ No newline at end of file
+    print(f"Ruta guardada exitosamente en: {os.path.basename(output_path)}")
+
+# Atributos de cada ruta en la capa de 'RouteWriter'
+ROUTE_SCHEMA = {'geometry': 'LineString',
+                'properties': {'origen': 'int', 'destino': 'int', 'fase': 'str', 'costo': 'float',
+                               'longitud_m': 'float', 'factor': 'int', 'buffer': 'int', 'plan_b': 'bool'}}
+ROUTE_DRIVERS = {'.gpkg': 'GPKG', '.fgb': 'FlatGeobuf'}
+
+class RouteWriter:
+    """
+    Escribe todas las rutas de una ejecución en una sola capa GeoPackage (.gpkg) o
+    FlatGeobuf (.fgb), en lugar de un shapefile por ruta. Las rutas se acumulan y se
+    escriben de a 'batch_size' con 'writerecords' (una transacción por lote en GeoPackage).
+    Cada ruta lleva origen, destino, fase ('final' o 'fase1'), costo acumulado, longitud en
+    metros, factor de remuestreo de la fase 1, buffer (px) del corredor en que se encontró
+    y si hizo falta el PLAN B.
+    """
+
+    def __init__(self, output_path, crs, layer='rutas', batch_size=1000):
+        import fiona
+        from fiona.crs import CRS
+        driver = ROUTE_DRIVERS.get(os.path.splitext(output_path)[1].lower())
+        if driver is None:
+            raise ValueError(f"Formato de rutas no soportado: '{output_path}'. Use {' o '.join(ROUTE_DRIVERS)}.")
+        fiona_crs = CRS.from_wkt(crs.to_wkt()) if crs else None
+        self.output_path = output_path
+        self.batch_size = batch_size
+        self.count = 0
+        self._pending = []
+        self._collection = fiona.open(output_path, 'w', driver, ROUTE_SCHEMA, crs=fiona_crs,
+                                      layer=layer if driver == 'GPKG' else None)
+
+    def add(self, pixel_path, transform, origin_id, dest_id, phase='final', cost=None, factor=None, buffer=None, plan_b=False):
+        """Agrega una ruta de píxeles; devuelve False (y no la guarda) si tiene menos de 2 puntos."""
+        if pixel_path is None or len(pixel_path) < 2:
+            print(f"No se guardará la ruta {phase} {origin_id} -> {dest_id}, la ruta está vacía o es inválida.")
+            return False
+        coords = pixels_to_world(pixel_path, transform)
+        length = float(np.hypot(*np.diff(coords, axis=0).T).sum())
+        self._pending.append({
+            'geometry': {'type': 'LineString', 'coordinates': coords.tolist()},
+            'properties': {'origen': int(origin_id), 'destino': int(dest_id), 'fase': phase,
+                           'costo': None if cost is None else float(cost), 'longitud_m': length,
+                           'factor': None if factor is None else int(factor),
+                           'buffer': None if buffer is None else int(buffer), 'plan_b': bool(plan_b)},
+        })
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        if self._pending:
+            self._collection.writerecords(self._pending)
+            self.count += len(self._pending)
+            self._pending = []
+
+    def close(self):
+        if self._collection.closed:
+            return
+        self.flush()
+        self._collection.close()
+        print(f"{self.count} rutas guardadas en: {os.path.basename(self.output_path)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
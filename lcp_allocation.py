@@ -0,0 +1,73 @@
+# lcp_allocation.py
+# Asignación por costo: para cada píxel, el punto más barato de alcanzar, el costo acumulado y la
+# dirección hacia ese punto, con una sola búsqueda desde todos los puntos a la vez.
+
+import os
+import numpy as np
+from datetime import datetime
+
+# Importar los módulos del paquete lcp
+import lcp.allocation as alloc
+import lcp.data_loader as dl
+import lcp.processing as proc
+import lcp.tiles as tiles
+
+def main():
+    # ==============================================================================
+    # --- PARÁMETROS CONFIGURABLES POR EL USUARIO ---
+    # ==============================================================================
+    BASE_DIR = os.getcwd()
+    DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    OUTPUT_DIR = os.path.join(BASE_DIR, 'output', f'session_asignacion_{timestamp}')
+
+    # --- Rutas a los datos de entrada ---
+    COST_RASTER_PATH = os.path.join(DATA_DIR, 'cost.tif')
+    ALL_POINTS_SHAPEFILE = os.path.join(DATA_DIR, 'points.shp')
+    MASK_SHAPEFILE_PATH = os.path.join(DATA_DIR, 'area-mask.shp') # Puede ser None si no se usa máscara
+
+    # --- Parámetros de cálculo (¡MODIFICAR AQUÍ!) ---
+    ID_FIELD_NAME = 'id' # Valores enteros; son los valores del raster de asignación
+    WINDOW_SIZE = 1024 # Lado (px) de las ventanas que se procesan a la vez; limita la memoria usada
+    TILE_CACHE_MB = 1024 # Memoria máxima para la caché de teselas del raster de costo
+
+    # ==============================================================================
+    # --- EJECUCIÓN DEL ANÁLISIS ---
+    # ==============================================================================
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    print(f"Los resultados se guardarán en: {OUTPUT_DIR}")
+
+    try:
+        site_ids, site_coords, points_crs = dl.load_point_set(ALL_POINTS_SHAPEFILE, ID_FIELD_NAME)
+
+        with dl.load_raster(COST_RASTER_PATH) as src:
+            raster = tiles.TiledRaster(src, memory_budget_mb=TILE_CACHE_MB)
+            if MASK_SHAPEFILE_PATH and os.path.exists(MASK_SHAPEFILE_PATH):
+                search_window = proc.vector_window(MASK_SHAPEFILE_PATH, src)
+                main_search_mask = proc.create_mask_from_vector(MASK_SHAPEFILE_PATH, src, window=search_window)
+            else:
+                print("No se proporcionó máscara de polígono; se asignará todo el raster.")
+                search_window = raster.full_window()
+                main_search_mask = np.ones((int(search_window.height), int(search_window.width)), dtype=bool)
+            search_transform = src.window_transform(search_window)
+
+            validation = dl.validate_points(site_ids, site_coords, search_transform, main_search_mask.shape, main_search_mask)
+            validation.report()
+            valid = validation.valid
+            print(f"\n--- Asignando {int(valid.sum())} puntos en una sola búsqueda ---")
+            summary = alloc.compute_allocation(raster, main_search_mask, search_window, validation.pixels[valid], site_ids[valid].tolist(), src.res[0], abs(src.res[1]),
+                                               search_transform, src.crs, OUTPUT_DIR, tile_size=WINDOW_SIZE)
+            print(f"Ventanas procesadas: {summary['ventanas']} ({summary['reprocesadas']} reprocesadas), "
+                  f"nodos asentados: {summary['nodos_asentados']}.")
+
+    except Exception as e:
+        print(f"\nOcurrió un error fatal en la ejecución: {e}")
+        import traceback
+        traceback.print_exc()
+
+    finally:
+        print("\n--- ANÁLISIS COMPLETADO ---")
+
+if __name__ == '__main__':
+    main()
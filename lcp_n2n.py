@@ -0,0 +1,82 @@
+# lcp_n2n.py
+# Análisis de todos a todos (N2N): calcula la ruta entre cada par de puntos en paralelo.
+
+import os
+import numpy as np
+from datetime import datetime
+
+# Importar los módulos del paquete lcp
+import lcp.data_loader as dl
+import lcp.processing as proc
+import lcp.n2n as n2n
+import lcp.utils as utils
+
+def main():
+    # ==============================================================================
+    # --- PARÁMETROS CONFIGURABLES POR EL USUARIO ---
+    # ==============================================================================
+    BASE_DIR = os.getcwd()
+    DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    OUTPUT_DIR = os.path.join(BASE_DIR, 'output', f'session_n2n_{timestamp}')
+
+    # --- Rutas a los datos de entrada ---
+    COST_RASTER_PATH = os.path.join(DATA_DIR, 'cost.tif')
+    ALL_POINTS_SHAPEFILE = os.path.join(DATA_DIR, 'points.shp')
+    MASK_SHAPEFILE_PATH = os.path.join(DATA_DIR, 'area-mask.shp') # Puede ser None si no se usa máscara
+
+    # --- Parámetros de cálculo (¡MODIFICAR AQUÍ!) ---
+    ID_FIELD_NAME = 'id'
+    PROCESSES = None # None usa todos los núcleos disponibles
+    ROUTES_FILE = 'rutas.gpkg' # Capa única con todas las rutas (.gpkg o .fgb); None guarda un shapefile por ruta
+
+    # ==============================================================================
+    # --- EJECUCIÓN DEL ANÁLISIS ---
+    # ==============================================================================
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    print(f"Los resultados se guardarán en: {OUTPUT_DIR}")
+    route_writer = None
+
+    try:
+        all_points, points_crs = dl.load_points_as_dict(ALL_POINTS_SHAPEFILE, ID_FIELD_NAME)
+
+        with dl.load_raster(COST_RASTER_PATH) as src:
+            print("Cargando superficie de costo a memoria...")
+            cost_data_high_res = src.read(1)
+
+            if MASK_SHAPEFILE_PATH and os.path.exists(MASK_SHAPEFILE_PATH):
+                main_search_mask = proc.create_mask_from_vector(MASK_SHAPEFILE_PATH, src)
+            else:
+                print("No se proporcionó máscara de polígono; se buscará en todo el raster.")
+                main_search_mask = np.ones_like(cost_data_high_res, dtype=bool)
+
+            point_pixels = {point_id: proc.world_to_pixel(src.transform, x, y) for point_id, (x, y) in all_points.items()}
+            if ROUTES_FILE:
+                route_writer = utils.RouteWriter(os.path.join(OUTPUT_DIR, ROUTES_FILE), src.crs)
+
+            def save_route(origin_id, dest_id, path_pixels, cost):
+                if path_pixels is None:
+                    print(f"  ERROR CRÍTICO: No se pudo encontrar ninguna ruta para {origin_id} -> {dest_id}.")
+                    return
+                if route_writer is not None:
+                    route_writer.add(path_pixels, src.transform, origin_id, dest_id, cost=cost)
+                    return
+                path_shp = os.path.join(OUTPUT_DIR, f"ruta_{origin_id}_a_{dest_id}.shp")
+                utils.save_path_to_shapefile(path_pixels, src.transform, src.crs, path_shp)
+
+            n2n.run_all_to_all(cost_data_high_res, src.nodata, main_search_mask, point_pixels,
+                               src.res[0], abs(src.res[1]), processes=PROCESSES, on_route=save_route)
+
+    except Exception as e:
+        print(f"\nOcurrió un error fatal en la ejecución: {e}")
+        import traceback
+        traceback.print_exc()
+
+    finally:
+        if route_writer is not None:
+            route_writer.close()
+        print("\n--- ANÁLISIS COMPLETADO ---")
+
+if __name__ == '__main__':
+    main()